@@ -0,0 +1,146 @@
+"""
+Memória com N sessões simultâneas do dashboard, sem Streamlit: cada sessão é uma thread
+que aplica filtros + ordenação e monta uma página de cards, e segura o que a sessão
+guardaria entre reruns.
+
+Dois modos, para o mesmo dataset (planilhas sintéticas de bench_reparo):
+  copia         como st.cache_data: cada sessão recebe uma cópia desserializada da base
+                e materializa a vista filtrada e ordenada (df.iloc + ordenar);
+  compartilhado a base congelada (core.congelar) é uma só para todas as sessões, que
+                guardam só as posições (memorizadas no motor) e a página de cards.
+
+  python bench/bench_concorrencia.py                        # 10k; 1,4,16,64 sessões
+  python bench/bench_concorrencia.py --tamanho 100k --sessoes 1,8,32
+
+A memória retida e o pico vêm do tracemalloc (numpy/Python) somado ao pool do Arrow
+(textos); no modo compartilhado, devem ficar quase planos conforme N cresce.
+"""
+# ======================== IMPORTS ========================
+import argparse
+import gc
+import json
+import os
+import pickle
+import sys
+import threading
+import time
+import tracemalloc
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import reparo_core as core  # noqa: E402
+from bench_reparo import HOJE, TAMANHOS, _combinacoes_filtros, planilha  # noqa: E402
+
+# ======================== CONFIG ========================
+MODOS = ("copia", "compartilhado")
+ORDENS = ["Retornar até", "Orç/OS", "Status"]
+POR_PAGINA = 60  # mesma página de cards do dashboard (3 colunas × 20 linhas)
+
+
+# ======================== MEMÓRIA ========================
+def _bytes_arrow() -> int:
+    """Bytes no pool do Arrow (buffers de texto), que o tracemalloc não enxerga."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return 0
+    return pa.total_allocated_bytes()
+
+
+# ======================== SESSÕES ========================
+def _sessao_copia(base_pickle: bytes, filtros: dict, ordem: str) -> dict:
+    """Caminho antigo: cópia da base por sessão + vista materializada."""
+    df = pickle.loads(base_pickle)
+    motor = core.construir_motor_filtros(df)
+    df_f = core.ordenar(df.iloc[core.filtrar_posicoes(motor, **filtros)], ordem)
+    return {"df": df, "motor": motor, "vista": df_f, "pagina": df_f.iloc[:POR_PAGINA]}
+
+
+def _sessao_compartilhada(df, motor: dict, filtros: dict, ordem: str) -> dict:
+    """Caminho novo: só posições (memorizadas no motor compartilhado) e a página."""
+    pos = core.filtrar_posicoes(motor, ordem=ordem, **filtros)
+    return {"pos": pos, "pagina": df.iloc[pos[:POR_PAGINA]]}
+
+
+def simular(modo: str, df, n: int) -> dict:
+    """N sessões simultâneas (threads); mede memória retida, pico e tempo de parede."""
+    combos = _combinacoes_filtros(df)
+    if modo == "copia":
+        base_pickle = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+
+        def abrir(i):
+            return _sessao_copia(base_pickle, combos[i % len(combos)], ORDENS[i % len(ORDENS)])
+    else:
+        compartilhada = core.congelar(df)
+        motor = core.construir_motor_filtros(compartilhada)
+
+        def abrir(i):
+            return _sessao_compartilhada(compartilhada, motor, combos[i % len(combos)], ORDENS[i % len(ORDENS)])
+
+    sessoes = [None] * n
+    barreira = threading.Barrier(n)
+
+    def rodar(i):
+        barreira.wait()  # todas começam juntas
+        sessoes[i] = abrir(i)
+
+    gc.collect()
+    arrow_antes = _bytes_arrow()
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=rodar, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    segundos = time.perf_counter() - inicio
+    gc.collect()
+    retido, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    arrow = _bytes_arrow() - arrow_antes
+    assert all(s is not None for s in sessoes)
+    sessoes.clear()  # a closure de rodar ainda referencia a lista
+    gc.collect()
+    return {
+        "sessoes": n,
+        "retido_mb": round((retido + arrow) / 1024**2, 2),
+        "pico_mb": round((pico + arrow) / 1024**2, 2),
+        "segundos": round(segundos, 4),
+    }
+
+
+# ======================== MAIN ========================
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Memória com N sessões simultâneas do dashboard.")
+    parser.add_argument("--tamanho", default="10k", choices=list(TAMANHOS))
+    parser.add_argument("--sessoes", default="1,4,16,64", help="lista separada por vírgula")
+    parser.add_argument("--modos", default=",".join(MODOS))
+    args = parser.parse_args(argv)
+
+    ns = [int(s) for s in args.sessoes.split(",") if s.strip()]
+    modos = [m for m in args.modos.split(",") if m in MODOS]
+    df = core.calcular_prazos(core.carregar_base(planilha(args.tamanho)), HOJE)
+    base_mb = core.memoria_base(df) / 1024**2
+    print(f"[{args.tamanho}] base {base_mb:.1f} MB", file=sys.stderr)
+
+    resultados = {}
+    for modo in modos:
+        resultados[modo] = []
+        for n in ns:
+            r = simular(modo, df, n)
+            resultados[modo].append(r)
+            print(
+                f"  {modo:<14}{n:>4} sessões {r['retido_mb']:>9.1f} MB retidos "
+                f"{r['pico_mb']:>9.1f} MB pico {r['segundos']:>8.3f}s",
+                file=sys.stderr,
+            )
+    json.dump({"tamanho": args.tamanho, "base_mb": round(base_mb, 2), "resultados": resultados},
+              sys.stdout, ensure_ascii=False, indent=1)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
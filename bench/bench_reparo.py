@@ -0,0 +1,625 @@
+"""
+Benchmark do pipeline com planilhas sintéticas no formato da reparo_atual.xlsx
+(mesmas colunas, cabeçalhos com encoding quebrado, datas bagunçadas, variações de OS).
+
+Cada etapa é medida separadamente: tempo de parede (melhor de N repetições) e pico de
+memória (tracemalloc, numa execução extra). O resultado pode virar baseline em JSON e
+execuções seguintes comparam contra ela.
+
+  python bench/bench_reparo.py                              # 1k,10k,100k
+  python bench/bench_reparo.py --tamanhos 1k,10k,100k,1m
+  python bench/bench_reparo.py --salvar bench/baseline.json
+  python bench/bench_reparo.py --comparar bench/baseline.json --tolerancia 1.3
+
+Com o duckdb instalado, mede também as etapas duckdb_* e confere que o motor SQL devolve
+exatamente o mesmo que o caminho pandas (posições, ordem, KPIs e agrupamentos).
+
+As planilhas geradas ficam em bench/_dados/ (reaproveitadas entre execuções).
+"""
+# ======================== IMPORTS ========================
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import reparo_core as core  # noqa: E402
+import reparo_duckdb  # noqa: E402
+
+# ======================== CONFIG ========================
+DADOS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "_dados")
+TAMANHOS = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+GERADOR_VERSAO = 1  # incremente ao mudar o gerador: as planilhas em cache são refeitas
+HOJE = date(2025, 9, 20)  # data fixa: prazos e vistas comparáveis entre execuções
+COLUNAS_DATA = ["Enviar até", "Retornar até"]
+
+# cabeçalho como vem do sistema de origem (acentos viram '?')
+CABECALHO = [
+    "Status", "A", "Sit", "Prefixo", "Or?/OS", "Item", "P/N Compras", "P/N Removido",
+    "S/N Removido", "Insumo", "Grupo", "Dias", "Enviar at?", "Retornar at?", "AWB",
+    "Loca??o", "Motivo", "Condi??o", "Price", "Garantia", "Qtdade", "Vl Unit", "Vl Total",
+    "Vl Cotado", "Fornecedor", "Laudo", "Documento",
+]
+
+
+# ======================== GERADOR ========================
+def _escolher(rng: np.random.Generator, opcoes: list, n: int, p=None) -> np.ndarray:
+    return np.asarray(opcoes, dtype=object)[rng.choice(len(opcoes), size=n, p=p)]
+
+
+def _coluna_os(rng: np.random.Generator, n: int) -> np.ndarray:
+    ano = rng.integers(2022, 2026, n)
+    mes = rng.integers(1, 13, n)
+    seq = rng.integers(1, 2000, n)
+    formato = rng.choice(6, size=n, p=[0.55, 0.15, 0.1, 0.08, 0.07, 0.05])
+    os_ = np.empty(n, dtype=object)
+    for i in range(n):
+        f, a, m, s = formato[i], ano[i], mes[i], seq[i]
+        if f == 0:
+            os_[i] = f"{a}/{m:02d}/{s:04d}"
+        elif f == 1:
+            os_[i] = f"{a}-{m}-{s:03d}"
+        elif f == 2:
+            os_[i] = f" {a} / {m:02d} / {s:03d} "
+        elif f == 3:
+            os_[i] = int(10_000 + s)  # numeração antiga (inválida, é descartada)
+        elif f == 4:
+            os_[i] = f"{a}/{m + 12}/{s:04d}"  # mês inválido
+        else:
+            os_[i] = None
+    return os_
+
+
+def _coluna_datas(rng: np.random.Generator, n: int) -> np.ndarray:
+    base = np.datetime64("2024-06-01")
+    dias = rng.integers(0, 600, n)
+    formato = rng.choice(7, size=n, p=[0.3, 0.2, 0.1, 0.1, 0.05, 0.2, 0.05])
+    datas = np.empty(n, dtype=object)
+    for i in range(n):
+        d = (base + np.timedelta64(int(dias[i]), "D")).astype(datetime)
+        f = formato[i]
+        if f == 0:
+            datas[i] = d.strftime("%Y-%m-%d")
+        elif f == 1:
+            datas[i] = d.strftime("%d/%m/%Y")
+        elif f == 2:
+            datas[i] = d.strftime("%d/%m/%Y") + f" {int(dias[i]) % 24:02d}:30"
+        elif f == 3:
+            datas[i] = datetime(d.year, d.month, d.day)  # célula de data do Excel
+        elif f == 4:
+            datas[i] = (d - date(1899, 12, 30)).days  # serial numérico
+        elif f == 5:
+            datas[i] = None
+        else:
+            datas[i] = "a combinar"
+    return datas
+
+
+def gerar_planilha(n: int, destino: str, semente: int = 42) -> None:
+    """Grava uma planilha sintética de `n` linhas."""
+    rng = np.random.default_rng(semente)
+    prefixos = [f"P{a}-{b}" for a in "PRST" for b in ("".join(rng.choice(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"), 3)) for _ in range(150))]
+    insumos = [f"{p} {q}" for p in ("GENERATOR", "CARD, GRAPHIC", "LIFE VEST", "ANGLE", "MASK, OXYGEN", "STARTER", "VALVE", "PUMP")
+               for q in ("ASSY", "UNS-1E", "CREW", "DC", "HYD", "FUEL", "MAIN", "AUX", "LH", "RH")]
+    colunas = {
+        "Status": _escolher(rng, ["PO 012458 Ativa", "P.O 011619 Fechada", "N?o Comprado", "Não comprado",
+                                  "PO 012476 ativa", "Em cotação", "po 012194 fechada", None], n,
+                            p=[0.3, 0.15, 0.15, 0.1, 0.1, 0.1, 0.05, 0.05]),
+        "Sit": _escolher(rng, ["cPr", "Atv", "Fin", "Can"], n, p=[0.5, 0.3, 0.15, 0.05]),
+        "Prefixo": _escolher(rng, prefixos, n),
+        "Or?/OS": _coluna_os(rng, n),
+        "Item": rng.integers(1, 9000, n),
+        "P/N Compras": np.char.add("PN-", rng.integers(10_000, 99_999, n).astype(str)).astype(object),
+        "S/N Removido": _escolher(rng, ["N/A", "L3594290", 2255, 97695, 1409, "SN-77"], n),
+        "Insumo": _escolher(rng, insumos, n),
+        "Grupo": np.full(n, "Pe?as", dtype=object),
+        "Enviar at?": _coluna_datas(rng, n),
+        "Retornar at?": _coluna_datas(rng, n),
+        "Motivo": _escolher(rng, ["REPARO", "OVERHAUL", "RECERTIFICACAO", "MSG DE CDU FAIL", None], n),
+        "Condi??o": _escolher(rng, ["Repair", "Overhaul"], n),
+        "Price": _escolher(rng, ["Repair", "Overhaul"], n),
+        "Garantia": np.full(n, "REPARO", dtype=object),
+        "Qtdade": _escolher(rng, ["1,00", "2,00", 1, 3], n),
+        "Vl Unit": _escolher(rng, ["0,00", "753,70", "1.076,00"], n),
+        "Fornecedor": _escolher(rng, ["TAM AVIACAO EXECUTIVA E TAXI AEREO S/A", "VMF AERONAUTICA LTDA", None], n),
+    }
+    colunas["P/N Removido"] = colunas["P/N Compras"]
+    colunas["Vl Total"] = colunas["Vl Unit"]
+    vazio = np.full(n, None, dtype=object)
+    ordem = [colunas.get(c, vazio) for c in CABECALHO]
+
+    tmp = destino + ".tmp"
+    _gravar_xlsx(tmp, CABECALHO, zip(*ordem), n)
+    os.replace(tmp, destino)
+
+
+_XLSX_FIXOS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Worksheet" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+        '<Relationship Id="rId3" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/>'
+        "</Relationships>"
+    ),
+    # estilo 1 = data (numFmt 14), usado nas células datetime
+    "xl/styles.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="1"><fill><patternFill patternType="none"/></fill></fills><borders count="1"><border/></borders>'
+        '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+        '<cellXfs count="2"><xf/><xf numFmtId="14" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles></styleSheet>'
+    ),
+}
+
+
+def _letra(i: int) -> str:
+    letras = ""
+    i += 1
+    while i:
+        i, r = divmod(i - 1, 26)
+        letras = chr(65 + r) + letras
+    return letras
+
+
+def _gravar_xlsx(destino: str, cabecalho: list[str], linhas, n: int) -> None:
+    """
+    xlsx mínimo, em streaming, no layout do export real (sharedStrings + <dimension>).
+    O write_only do openpyxl grava strings inline, bem mais lentas de ler que as compartilhadas.
+    """
+    import zipfile
+    from xml.sax.saxutils import escape
+
+    letras = [_letra(i) for i in range(len(cabecalho))]
+    strings: dict[str, int] = {}
+    epoch = datetime(1899, 12, 30)
+    with zipfile.ZipFile(destino, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for nome, conteudo in _XLSX_FIXOS.items():
+            zf.writestr(nome, conteudo)
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as f:
+            f.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                f'<dimension ref="A1:{letras[-1]}{n + 1}"/><sheetData>'
+            ).encode("utf-8"))
+            bloco = []
+            for r, linha in enumerate(_com_cabecalho(cabecalho, linhas), start=1):
+                cels = []
+                for letra, v in zip(letras, linha):
+                    if v is None:
+                        continue
+                    if isinstance(v, np.generic):
+                        v = v.item()
+                    if isinstance(v, str):
+                        cels.append(f'<c r="{letra}{r}" t="s"><v>{strings.setdefault(v, len(strings))}</v></c>')
+                    elif isinstance(v, datetime):
+                        cels.append(f'<c r="{letra}{r}" s="1"><v>{(v - epoch).days}</v></c>')
+                    else:
+                        cels.append(f'<c r="{letra}{r}"><v>{v}</v></c>')
+                bloco.append(f'<row r="{r}">{"".join(cels)}</row>')
+                if len(bloco) >= 5_000:
+                    f.write("".join(bloco).encode("utf-8"))
+                    bloco.clear()
+            f.write(("".join(bloco) + "</sheetData></worksheet>").encode("utf-8"))
+        sst = "".join(f"<si><t>{escape(t)}</t></si>" for t in strings)
+        zf.writestr("xl/sharedStrings.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            f'uniqueCount="{len(strings)}">{sst}</sst>'
+        ))
+
+
+def _com_cabecalho(cabecalho: list[str], linhas):
+    yield cabecalho
+    yield from linhas
+
+
+def planilha(rotulo: str) -> str:
+    os.makedirs(DADOS_DIR, exist_ok=True)
+    destino = os.path.join(DADOS_DIR, f"reparo_{rotulo}_v{GERADOR_VERSAO}.xlsx")
+    if not os.path.exists(destino):
+        inicio = time.perf_counter()
+        gerar_planilha(TAMANHOS[rotulo], destino)
+        print(f"  gerada {os.path.basename(destino)} em {time.perf_counter() - inicio:.1f}s", file=sys.stderr)
+    return destino
+
+
+def versao_alterada(df: pd.DataFrame, semente: int = 7) -> pd.DataFrame:
+    """Cópia com ~1% das linhas removidas, ~1% novas e ~1% com Status/Sit alterados (para o diff)."""
+    rng = np.random.default_rng(semente)
+    n = len(df)
+    k = max(1, n // 100)
+    fica = np.ones(n, dtype=bool)
+    fica[rng.choice(n, k, replace=False)] = False
+    novo = df[fica].reset_index(drop=True)
+    extra = df.sample(k, random_state=semente).reset_index(drop=True)
+    extra["Item"] = extra["Item"].astype(str) + "-novo"
+    novo = pd.concat([novo, extra], ignore_index=True)
+    muda = rng.choice(len(novo), k, replace=False)
+    novo.loc[muda, "Status"] = "P.O Fechada"
+    novo.loc[muda, "Sit"] = "Fin"
+    return novo
+
+
+def bruto_alterado(bruto: pd.DataFrame, semente: int = 7) -> pd.DataFrame:
+    """Planilha lida (sem normalizar) com ~1% das linhas removidas, ~1% novas e ~1% com Status alterado."""
+    rng = np.random.default_rng(semente)
+    n = len(bruto)
+    k = max(1, n // 100)
+    novo = bruto.drop(index=bruto.index[rng.choice(n, k, replace=False)])
+    extra = bruto.sample(k, random_state=semente)
+    extra["Item"] = extra["Item"] + 100_000
+    novo = pd.concat([novo, extra], ignore_index=True)
+    novo.loc[rng.choice(len(novo), k, replace=False), "Status"] = "P.O 012999 Fechada"
+    return novo
+
+
+# ======================== REFERÊNCIA ========================
+def parse_datas_antigo(series: pd.Series) -> pd.Series:
+    """
+    Cópia do parse_mixed_dates anterior à conversão por valor distinto, só para comparação:
+    tudo via str (células de data inclusive), ISO com format e o resto com dayfirst=True.
+    """
+    s = series.astype(str).str.strip()
+    idx = s.index
+    out = pd.Series(pd.NaT, index=idx, dtype="datetime64[ns]")
+
+    iso_mask = s.str.match(r"^\d{4}-\d{2}-\d{2}$")
+    if iso_mask.any():
+        out.loc[iso_mask] = pd.to_datetime(s.loc[iso_mask], format="%Y-%m-%d", errors="coerce")
+    if (~iso_mask).any():
+        out.loc[~iso_mask] = pd.to_datetime(s.loc[~iso_mask], dayfirst=True, errors="coerce")
+    return out
+
+
+def conferir_datas(bruto: pd.DataFrame) -> dict[str, int]:
+    """Datas lidas pelo parser antigo e pelo atual nas mesmas colunas, e quantas divergem."""
+    lidas = {"antigo": 0, "atual": 0, "divergentes": 0}
+    for col in COLUNAS_DATA:
+        antigo, atual = parse_datas_antigo(bruto[col]), core.parse_mixed_dates(bruto[col])
+        lidas["antigo"] += int(antigo.notna().sum())
+        lidas["atual"] += int(atual.notna().sum())
+        lidas["divergentes"] += int((antigo.notna() & atual.notna() & (antigo != atual)).sum())
+    return lidas
+
+
+# ======================== ETAPAS ========================
+def _limpar_memos() -> None:
+    """Zera os memos globais: cada repetição mede o custo 'a frio'."""
+    with core._memo_lock:
+        core._MEMO_STATUS.clear()
+        core._MEMO_OS.clear()
+
+
+def _combinacoes_filtros(df: pd.DataFrame) -> list[dict]:
+    status = sorted(df["Status"].dropna().unique())[:3]
+    meio = pd.Timestamp(HOJE)
+    janela = ((meio - timedelta(days=60)).date(), (meio + timedelta(days=60)).date())
+    combos = [dict(vista=v) for v in ["Todos os itens", *core.VISTAS]]
+    combos += [dict(status=s) for s in status]
+    combos += [dict(sit="cPr", prefixo="PR-"), dict(janela=janela, inclui_sem_data=False)]
+    return combos
+
+
+def etapas(arquivo: str) -> list[tuple[str, callable]]:
+    """(nome, função) na ordem do pipeline; cada função guarda em `estado` o que as seguintes usam."""
+    estado = {}
+
+    def ler_planilha():
+        estado["bruto"] = core._ler_planilha(arquivo)
+
+    def parse_datas():
+        for col in COLUNAS_DATA:
+            core.parse_mixed_dates(estado["bruto"][col])
+
+    def parse_datas_ref():
+        for col in COLUNAS_DATA:
+            parse_datas_antigo(estado["bruto"][col])
+
+    def limpar_status():
+        _limpar_memos()
+        core.limpar_status_serie(estado["bruto"]["Status"])
+
+    def normalizar_os():
+        _limpar_memos()
+        core.normalizar_os_serie(estado["bruto"]["Orç/OS"])
+
+    def carregar_dados():
+        _limpar_memos()
+        estado["base"] = core._normalizar_planilha(arquivo)
+
+    def normalizar_incremental():
+        if "carga" not in estado:
+            estado["carga"] = core._normalizar_incremental(estado["bruto"], None)
+            estado["bruto_alterado"] = bruto_alterado(estado["bruto"])
+        _limpar_memos()
+        estado["carga_nova"] = core._normalizar_incremental(estado["bruto_alterado"], estado["carga"])
+
+    def carregar_cache():
+        core._gravar_cache(core.chave_fonte(arquivo), estado["base"])
+        core.carregar_base(arquivo)
+
+    def calcular_prazos():
+        estado["df"] = core.calcular_prazos(estado["base"], HOJE)
+
+    def motor_filtros():
+        estado["motor"] = core.construir_motor_filtros(estado["df"])
+
+    def filtros():
+        estado["motor"]["memo"].clear()
+        for combo in _combinacoes_filtros(estado["df"]):
+            pos = core.filtrar_posicoes(estado["motor"], **combo)
+        estado["pos"] = pos
+
+    def filtros_faixas():
+        # janelas de datas e faixas de OS: buscas binárias nos índices ordenados do motor
+        estado["motor"]["memo"].clear()
+        meses = core.meses_os(estado["motor"])
+        meio = pd.Timestamp(HOJE)
+        for dias in (7, 30, 180):
+            janela = ((meio - timedelta(days=dias)).date(), (meio + timedelta(days=dias)).date())
+            core.filtrar_posicoes(estado["motor"], janela=janela, inclui_sem_data=False)
+        for k in range(0, len(meses), 6):
+            core.filtrar_posicoes(estado["motor"], faixa_os=(meses[k], meses[min(k + 5, len(meses) - 1)]))
+
+    def filtros_ordenados():
+        # "Ordenar por" Retornar até/Orç/OS: postos pré-calculados por dataset
+        estado["motor"]["memo"].clear()
+        for combo in _combinacoes_filtros(estado["df"]):
+            for ordem in ("Retornar até", "Orç/OS"):
+                core.filtrar_posicoes(estado["motor"], ordem=ordem, crescente=False, **combo)
+
+    def cubo():
+        estado["cubo"] = core.construir_cubo(estado["df"])
+
+    def kpis_cubo():
+        for combo in _combinacoes_filtros(estado["df"]):
+            if "janela" not in combo:  # janela de datas não é dimensão do cubo
+                core.kpis_cubo(estado["cubo"], core.fatiar_cubo(estado["cubo"], **combo))
+
+    def indice_busca():
+        estado["indice"] = core.construir_indice_busca(estado["df"])
+
+    def busca():
+        estado["indice"]["memo"].clear()
+        for texto in ["GENERATOR", "pr-a", "2024/0", "vest crew", "zzzz"]:
+            core.buscar(estado["indice"], texto)
+
+    def ordenar():
+        estado["ordenado"] = core.ordenar(estado["df"], "Retornar até", True)
+
+    def render_cards():
+        core.html_cards(estado["ordenado"].head(48), cols_por_linha=3)
+
+    def exportar(formato):
+        return lambda: core.exportar(estado["ordenado"], formato).close()
+
+    def duckdb_banco():
+        estado["banco"] = reparo_duckdb.construir_banco(estado["df"])
+
+    def duckdb_filtros():
+        for combo in _combinacoes_filtros(estado["df"]):
+            reparo_duckdb.consultar_posicoes(estado["banco"], ordem="Retornar até", **combo)
+
+    def duckdb_kpis():
+        for combo in _combinacoes_filtros(estado["df"]):
+            reparo_duckdb.calcular_kpis(estado["banco"], **combo)
+
+    def diferencas():
+        if "antigo" not in estado:
+            estado["antigo"] = versao_alterada(estado["base"])
+        core.calcular_diferencas(estado["df"], estado["antigo"])
+
+    def diferencas_incremental():
+        core.diferencas_incrementais(estado["carga_nova"], estado["carga"])
+
+    return [
+        ("ler_planilha", ler_planilha),
+        ("parse_mixed_dates", parse_datas),
+        ("parse_mixed_dates_antigo", parse_datas_ref),
+        ("limpar_status", limpar_status),
+        ("normalizar_os", normalizar_os),
+        ("carregar_dados", carregar_dados),
+        ("normalizar_incremental", normalizar_incremental),
+        ("carregar_dados_cache", carregar_cache),
+        ("calcular_prazos", calcular_prazos),
+        ("motor_filtros", motor_filtros),
+        ("filtros", filtros),
+        ("filtros_faixas", filtros_faixas),
+        ("filtros_ordenados", filtros_ordenados),
+        ("cubo", cubo),
+        ("kpis_cubo", kpis_cubo),
+        ("indice_busca", indice_busca),
+        ("busca", busca),
+        ("ordenar", ordenar),
+        ("render_cards", render_cards),
+        *[(f"exportar_{formato}", exportar(formato)) for formato in core.FORMATOS_EXPORTACAO],
+        *([
+            ("duckdb_banco", duckdb_banco),
+            ("duckdb_filtros", duckdb_filtros),
+            ("duckdb_kpis", duckdb_kpis),
+        ] if reparo_duckdb.disponivel() else []),
+        ("calcular_diferencas", diferencas),
+        ("diferencas_incremental", diferencas_incremental),
+    ]
+
+
+def conferir_duckdb(df: pd.DataFrame) -> int:
+    """Compara o motor DuckDB com o caminho pandas em todas as combinações; devolve quantas conferiu."""
+    motor, banco, cubo = core.construir_motor_filtros(df), reparo_duckdb.construir_banco(df), core.construir_cubo(df)
+    indice = core.construir_indice_busca(df)
+    combos = _combinacoes_filtros(df) + [dict(busca="generator", prefixo="PR-"), dict(prefixo="[")]
+    meses = core.meses_os(motor)
+    if meses:
+        combos.append(dict(faixa_os=(meses[0], meses[len(meses) // 2]), vista="Atrasados"))
+    conferidas = 0
+    for combo in combos:
+        filtros = dict(combo, indice=indice)
+        pos = core.filtrar_posicoes(motor, **filtros)
+        for ordem, crescente in [("Retornar até", True), ("Orç/OS", False), ("Status", True), ("Em atraso", False)]:
+            esperado = core.ordenar(df.iloc[pos].reset_index(drop=True), ordem, crescente).index.to_numpy()
+            obtido = reparo_duckdb.consultar_posicoes(banco, ordem=ordem, crescente=crescente, **filtros)
+            assert np.array_equal(pos[esperado], obtido), f"posições/ordem divergem: {combo} {ordem}"
+        kpis = reparo_duckdb.calcular_kpis(banco, **filtros)
+        assert kpis == core.calcular_kpis(df.iloc[pos]), f"KPIs divergem: {combo}"
+        if not {"janela", "busca", "faixa_os"} & combo.keys():
+            fatia = core.fatiar_cubo(cubo, **combo)
+            for por, colunas in [("Status", None), ("Sit", None), ("Prefixo", "faixa"), ("semana", "faixa")]:
+                esperado = core.agregar_cubo(cubo, fatia, por, colunas)
+                obtido = reparo_duckdb.agregar(banco, por, colunas, **combo)
+                if por != "semana":
+                    esperado.index = esperado.index.astype(str)
+                esperado, obtido = esperado.sort_index(), obtido.sort_index()
+                iguais = esperado.index.equals(obtido.index) and np.array_equal(esperado.to_numpy(), obtido.to_numpy())
+                assert iguais, f"agrupamento diverge: {combo} {por}×{colunas}"
+        conferidas += 1
+    return conferidas
+
+
+def medir(funcao, repeticoes: int) -> dict:
+    tempos = []
+    for _ in range(repeticoes):
+        gc.collect()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    gc.collect()
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"segundos": round(min(tempos), 5), "pico_mb": round(pico / 1024**2, 2)}
+
+
+def rodar(rotulos: list[str], repeticoes: int, etapas_sel: set[str] | None) -> tuple[dict, dict]:
+    """Tempos por etapa e MB ocupados pelo dataset final (com prazos) de cada tamanho."""
+    resultados, memoria = {}, {}
+    with tempfile.TemporaryDirectory() as tmp:
+        core.configurar_diretorios(snap_dir=os.path.join(tmp, "snapshots"), cache_dir=os.path.join(tmp, "cache"))
+        for rotulo in rotulos:
+            arquivo = planilha(rotulo)
+            print(f"[{rotulo}]", file=sys.stderr)
+            # etapas grandes repetem menos: o tempo absoluto já é estável
+            reps = repeticoes if TAMANHOS[rotulo] <= 100_000 else 1
+            resultados[rotulo] = {}
+            for nome, funcao in etapas(arquivo):
+                if etapas_sel and nome not in etapas_sel:
+                    funcao()  # ainda prepara o estado das etapas seguintes
+                    continue
+                r = medir(funcao, reps)
+                resultados[rotulo][nome] = r
+                print(f"  {nome:<26}{r['segundos']:>10.4f}s {r['pico_mb']:>9.1f} MB", file=sys.stderr)
+            novo, antigo = (resultados[rotulo].get(n) for n in ("parse_mixed_dates", "parse_mixed_dates_antigo"))
+            if novo and antigo:
+                datas = conferir_datas(core._ler_planilha(arquivo))
+                print(
+                    f"  {'datas (antigo ÷ atual)':<26}{antigo['segundos'] / max(novo['segundos'], 1e-9):>9.1f}x "
+                    f"({datas['atual']} × {datas['antigo']} lidas, {datas['divergentes']} divergentes)",
+                    file=sys.stderr,
+                )
+            df = core.calcular_prazos(core.carregar_base(arquivo), HOJE)
+            memoria[rotulo] = round(core.memoria_base(df) / 1024**2, 2)
+            print(f"  {'dataset em memória':<26}{memoria[rotulo]:>21.2f} MB", file=sys.stderr)
+            if reparo_duckdb.disponivel():
+                print(f"  {'paridade duckdb':<26}{conferir_duckdb(df):>10} combinações ok", file=sys.stderr)
+    return resultados, memoria
+
+
+def comparar(atual: dict, baseline: dict, tolerancia: float) -> list[str]:
+    """Etapas mais lentas que baseline × tolerância (ignora medidas abaixo de 5 ms: ruído)."""
+    regressoes = []
+    for rotulo, por_etapa in atual.items():
+        for nome, r in por_etapa.items():
+            ref = baseline.get("resultados", {}).get(rotulo, {}).get(nome)
+            if not ref or max(r["segundos"], ref["segundos"]) < 0.005:
+                continue
+            if r["segundos"] > ref["segundos"] * tolerancia:
+                regressoes.append(f"{rotulo}/{nome}: {ref['segundos']:.4f}s -> {r['segundos']:.4f}s")
+    return regressoes
+
+
+# ======================== MAIN ========================
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline do Controle de Reparos.")
+    parser.add_argument("--tamanhos", default="1k,10k,100k", help=f"lista separada por vírgula de {', '.join(TAMANHOS)}")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--etapas", help="mede só estas etapas (separadas por vírgula)")
+    parser.add_argument("--salvar", help="grava o resultado como baseline JSON")
+    parser.add_argument("--comparar", help="baseline JSON para detectar regressões")
+    parser.add_argument("--tolerancia", type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    rotulos = [t.strip().lower() for t in args.tamanhos.split(",") if t.strip()]
+    desconhecidos = [t for t in rotulos if t not in TAMANHOS]
+    if desconhecidos:
+        parser.error(f"tamanhos desconhecidos: {', '.join(desconhecidos)}")
+    etapas_sel = set(args.etapas.split(",")) if args.etapas else None
+
+    resultados, memoria = rodar(rotulos, args.repeticoes, etapas_sel)
+    saida = {
+        "meta": {
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "plataforma": platform.platform(),
+            "repeticoes": args.repeticoes,
+        },
+        "resultados": resultados,
+        "memoria_mb": memoria,
+    }
+    if args.salvar:
+        with open(args.salvar, "w", encoding="utf-8") as f:
+            json.dump(saida, f, ensure_ascii=False, indent=1)
+            f.write("\n")
+    else:
+        json.dump(saida, sys.stdout, ensure_ascii=False, indent=1)
+        sys.stdout.write("\n")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            regressoes = comparar(resultados, json.load(f), args.tolerancia)
+        for r in regressoes:
+            print(f"REGRESSÃO {r}", file=sys.stderr)
+        return 1 if regressoes else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
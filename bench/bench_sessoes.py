@@ -0,0 +1,330 @@
+"""
+Teste de carga do dashboard com N sessões abertas ao mesmo tempo, via streamlit.testing.v1.AppTest
+(sem navegador, sem rede): cada sessão é um AppTest próprio numa thread, todas no mesmo
+processo, então os caches st.cache_resource e os vigias são compartilhados como no servidor.
+
+Limite: o AppTest instala e remove um Runtime global a cada rerun, então dois reruns não
+podem rodar ao mesmo tempo e todos passam por um lock global: as sessões se intercalam, um
+rerun por vez. Isto NÃO mede concorrência (contenção de GIL, locks dos caches, threads do
+vigia disputando CPU); mede latência e memória por sessão com N sessões vivas. A latência
+de cada rerun inclui a espera nessa fila; a execução em si sai separada (exec_p50/exec_p95).
+
+Cada sessão segue um roteiro de interações (um rerun por passo) sobre as planilhas
+sintéticas de bench_reparo:
+  consulta     troca as vistas rápidas e digita na "Busca livre", letra a letra
+  diferencas   abre a aba Diferenças, salva um snapshot e volta para os cards
+  upload       envia a planilha pelo file_uploader e filtra o arquivo enviado
+
+  python bench/bench_sessoes.py                                   # 10k; 1,4,8 sessões
+  python bench/bench_sessoes.py --tamanho 100k --sessoes 1,8,16 --rodadas 2
+  python bench/bench_sessoes.py --salvar bench/sessoes.json
+  python bench/bench_sessoes.py --comparar bench/sessoes.json --tolerancia 1.5
+
+Relata latência dos reruns (p50/p95/máx, geral e por tipo de passo), vazão (reruns/s) e
+RSS do processo (antes, pico e depois). Os N rodam em sequência no mesmo processo: só o
+primeiro paga a leitura a frio da planilha; os seguintes medem o servidor já aquecido.
+Cada execução roda num diretório temporário (planilha como reparo_atual.xlsx, snapshots e
+cache em data/), sem tocar nos do projeto.
+"""
+# ======================== IMPORTS ========================
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from datetime import datetime
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import reparo_core as core  # noqa: E402
+from bench_reparo import TAMANHOS, planilha  # noqa: E402
+
+# ======================== CONFIG ========================
+DASHBOARD = os.path.join(RAIZ, "dashboard_reparo.py")
+ROTEIROS = ("consulta", "diferencas", "upload")
+VISTAS = ["Atrasados", "Próx. 7 dias", "Sem data", "Todos os itens"]
+DIGITACAO = ["G", "GE", "GEN", "GENE", "GENERATOR", ""]  # um rerun por tecla (campo sem debounce)
+ABA_DIFERENCAS = "🔍 Diferenças"
+ABA_CARDS = "📋 Itens (cards)"
+TIMEOUT = 300  # segundos por rerun (datasets grandes na primeira leitura)
+AMOSTRA_RSS = 0.05  # segundos entre leituras do RSS
+_RERUN = threading.Lock()  # AppTest.run troca o Runtime global: um rerun por vez
+EXECUCAO = "reruns serializados (um por vez, lock global)"  # vai no relatório: não é concorrência
+
+
+# ======================== MEMÓRIA ========================
+def _rss_mb() -> float:
+    """RSS atual do processo (Linux: /proc; nos demais, o pico do getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+    except OSError:
+        import resource
+
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico / 1024**2 if sys.platform == "darwin" else pico / 1024
+
+
+def _monitorar_rss() -> dict:
+    """Amostra o RSS numa thread em segundo plano enquanto as sessões rodam."""
+    monitor = {"pico": _rss_mb(), "parar": threading.Event()}
+
+    def amostrar():
+        while not monitor["parar"].wait(AMOSTRA_RSS):
+            monitor["pico"] = max(monitor["pico"], _rss_mb())
+
+    monitor["thread"] = threading.Thread(target=amostrar, daemon=True)
+    monitor["thread"].start()
+    return monitor
+
+
+def _pico_rss(monitor: dict) -> float:
+    """Para o monitor e devolve o maior RSS visto (MB)."""
+    monitor["parar"].set()
+    monitor["thread"].join()
+    return max(monitor["pico"], _rss_mb())
+
+
+# ======================== ROTEIROS ========================
+def _por_rotulo(widgets, rotulo: str):
+    for w in widgets:
+        if w.label == rotulo:
+            return w
+    raise LookupError(f"widget não encontrado: {rotulo!r}")
+
+
+def _passos(roteiro: str, upload: tuple[str, bytes, str]) -> list[tuple[str, callable]]:
+    """(tipo, ação) de cada passo; a ação mexe nos widgets e o rerun é medido por quem chama."""
+
+    def vista(nome):
+        return lambda at: _por_rotulo(at.radio, "Seleção").set_value(nome)
+
+    def digitar(texto):
+        return lambda at: _por_rotulo(at.text_input, "Busca livre (qualquer coluna)").set_value(texto)
+
+    def aba(nome):
+        def acao(at):
+            at.session_state["aba"] = nome
+        return acao
+
+    passos = [("abrir", lambda at: None)]
+    if roteiro == "consulta":
+        passos += [("vista", vista(v)) for v in VISTAS]
+        passos += [("busca", digitar(t)) for t in DIGITACAO]
+    elif roteiro == "diferencas":
+        passos += [
+            ("diferencas", aba(ABA_DIFERENCAS)),
+            ("snapshot", lambda at: _por_rotulo(at.button, "💾 Salvar snapshot agora").click()),
+            ("diferencas", lambda at: None),  # rerun já com o snapshot novo no histórico
+            ("vista", aba(ABA_CARDS)),
+        ]
+    elif roteiro == "upload":
+        passos += [
+            ("upload", lambda at: at.get("file_uploader")[0].set_value(upload)),
+            ("vista", vista("Atrasados")),
+            ("busca", digitar("GEN")),
+            ("vista", vista("Todos os itens")),
+        ]
+    return passos
+
+
+def _sessao(roteiro: str, rodadas: int, upload: tuple, inicio: threading.Barrier, saida: list) -> None:
+    """Uma sessão: roda o roteiro `rodadas` vezes, guardando (tipo, latência, execução, erro) de cada rerun."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(DASHBOARD, default_timeout=TIMEOUT)
+    inicio.wait()  # todas as sessões abrem juntas (troca de turno)
+    for rodada in range(rodadas):
+        for tipo, acao in _passos(roteiro, upload):
+            if tipo == "abrir" and rodada:
+                continue  # a sessão continua aberta entre rodadas
+            t0 = time.perf_counter()
+            execucao, erro = 0.0, None
+            try:
+                acao(at)
+                with _RERUN:
+                    t1 = time.perf_counter()
+                    try:
+                        at.run()
+                    finally:
+                        execucao = time.perf_counter() - t1
+                if at.exception:
+                    erro = at.exception[0].message
+            except Exception as e:  # timeout do AppTest ou widget que sumiu
+                erro = f"{type(e).__name__}: {e}"
+            saida.append((tipo, time.perf_counter() - t0, execucao, erro))
+            if erro and tipo in ("abrir", "upload"):
+                return  # sem dados, os passos seguintes não dizem nada
+
+
+# ======================== CARGA ========================
+def _percentis(segundos: list[float]) -> dict:
+    ms = np.asarray(segundos) * 1000
+    return {
+        "reruns": len(ms),
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p95_ms": round(float(np.percentile(ms, 95)), 1),
+        "max_ms": round(float(ms.max()), 1),
+    }
+
+
+def rodar_carga(n: int, rodadas: int, roteiros: list[str], upload: tuple) -> dict:
+    """N sessões vivas (reruns serializados), roteiros em rodízio; latência, vazão e RSS."""
+    registros = [[] for _ in range(n)]
+    barreira = threading.Barrier(n + 1)
+    threads = [
+        threading.Thread(target=_sessao, args=(roteiros[i % len(roteiros)], rodadas, upload, barreira, registros[i]))
+        for i in range(n)
+    ]
+    rss_antes = _rss_mb()
+    monitor = _monitorar_rss()
+    for t in threads:
+        t.start()
+    barreira.wait()
+    inicio = time.perf_counter()
+    for t in threads:
+        t.join()
+    segundos = time.perf_counter() - inicio
+    rss_pico = _pico_rss(monitor)
+
+    todos = [r for sessao in registros for r in sessao]
+    erros = [r[3] for r in todos if r[3]]
+    execucao = _percentis([r[2] for r in todos])
+    resultado = {
+        "sessoes": n,
+        **_percentis([r[1] for r in todos]),
+        "exec_p50_ms": execucao["p50_ms"],
+        "exec_p95_ms": execucao["p95_ms"],
+        "reruns_por_s": round(len(todos) / segundos, 2),
+        "segundos": round(segundos, 3),
+        "rss_antes_mb": round(rss_antes, 1),
+        "rss_pico_mb": round(rss_pico, 1),
+        "rss_depois_mb": round(_rss_mb(), 1),
+        "erros": len(erros),
+        "por_passo": {
+            tipo: _percentis([r[1] for r in todos if r[0] == tipo])
+            for tipo in dict.fromkeys(r[0] for r in todos)
+        },
+    }
+    if erros:
+        resultado["primeiro_erro"] = erros[0][:300]
+    return resultado
+
+
+def comparar(atual: dict, baseline: dict, tolerancia: float) -> list[str]:
+    """N de sessões cujo p95 ficou acima de baseline × tolerância (ou que passaram a ter erros)."""
+    ref = {r["sessoes"]: r for r in baseline.get("resultados", [])}
+    regressoes = []
+    for r in atual["resultados"]:
+        antigo = ref.get(r["sessoes"])
+        if not antigo:
+            continue
+        if r["p95_ms"] > antigo["p95_ms"] * tolerancia:
+            regressoes.append(f"{r['sessoes']} sessões: p95 {antigo['p95_ms']:.0f} ms -> {r['p95_ms']:.0f} ms")
+        if r["erros"] > antigo["erros"]:
+            regressoes.append(f"{r['sessoes']} sessões: {r['erros']} erros (antes {antigo['erros']})")
+    return regressoes
+
+
+def _silenciar() -> None:
+    """
+    AppTest fora de `streamlit run` avisa sobre contexto ausente a cada widget; exceções do
+    app também não vão para o log: entram na contagem de erros (e o primeiro, no relatório).
+    """
+    warnings.filterwarnings("ignore")
+    logging.disable(logging.CRITICAL)
+
+
+# ======================== MAIN ========================
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Teste de carga do dashboard (AppTest, N sessões com reruns serializados).")
+    parser.add_argument("--tamanho", default="10k", choices=list(TAMANHOS))
+    parser.add_argument("--sessoes", default="1,4,8", help="lista separada por vírgula")
+    parser.add_argument("--rodadas", type=int, default=1, help="repetições do roteiro por sessão")
+    parser.add_argument("--roteiros", default=",".join(ROTEIROS), help=f"subconjunto de {', '.join(ROTEIROS)}")
+    parser.add_argument("--salvar", help="grava o resultado como baseline JSON")
+    parser.add_argument("--comparar", help="baseline JSON para detectar regressões de p95/erros")
+    parser.add_argument("--tolerancia", type=float, default=1.5)
+    args = parser.parse_args(argv)
+
+    ns = [int(s) for s in args.sessoes.split(",") if s.strip()]
+    roteiros = [r.strip() for r in args.roteiros.split(",") if r.strip()]
+    desconhecidos = [r for r in roteiros if r not in ROTEIROS]
+    if desconhecidos:
+        parser.error(f"roteiros desconhecidos: {', '.join(desconhecidos)}")
+    _silenciar()
+
+    arquivo = planilha(args.tamanho)
+    with open(arquivo, "rb") as f:
+        upload = (f"reparo_{args.tamanho}.xlsx", f.read(),
+                  "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    resultados = []
+    cwd, diretorios = os.getcwd(), (core.SNAP_DIR, core.CACHE_DIR)
+    # o dashboard abre reparo_atual.xlsx (caminho relativo) e grava snapshots/cache em data/:
+    # tudo vai para um diretório temporário
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copyfile(arquivo, os.path.join(tmp, "reparo_atual.xlsx"))
+        os.chdir(tmp)
+        core.configurar_diretorios(os.path.join(tmp, "data", "snapshots"), os.path.join(tmp, "data", "_cache"))
+        try:
+            print(f"[{args.tamanho}] roteiros: {', '.join(roteiros)}; {args.rodadas} rodada(s)", file=sys.stderr)
+            print(f"  {EXECUCAO}: latência e memória por sessão, não concorrência", file=sys.stderr)
+            for n in ns:
+                r = rodar_carga(n, args.rodadas, roteiros, upload)
+                resultados.append(r)
+                print(
+                    f"  {n:>3} sessões {r['reruns']:>5} reruns  p50 {r['p50_ms']:>8.1f} ms  "
+                    f"p95 {r['p95_ms']:>8.1f} ms (execução p95 {r['exec_p95_ms']:.1f} ms)  {r['reruns_por_s']:>7.2f} reruns/s  "
+                    f"RSS {r['rss_antes_mb']:.0f} -> {r['rss_pico_mb']:.0f} MB  erros {r['erros']}",
+                    file=sys.stderr,
+                )
+                for tipo, p in r["por_passo"].items():
+                    print(f"      {tipo:<12}{p['reruns']:>5}  p50 {p['p50_ms']:>8.1f} ms  p95 {p['p95_ms']:>8.1f} ms",
+                          file=sys.stderr)
+                if r["erros"]:
+                    print(f"      primeiro erro: {r['primeiro_erro']}", file=sys.stderr)
+        finally:
+            os.chdir(cwd)
+            core.configurar_diretorios(*diretorios)
+
+    saida = {
+        "meta": {
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "tamanho": args.tamanho,
+            "rodadas": args.rodadas,
+            "roteiros": roteiros,
+            "execucao": EXECUCAO,
+        },
+        "resultados": resultados,
+    }
+    if args.salvar:
+        with open(args.salvar, "w", encoding="utf-8") as f:
+            json.dump(saida, f, ensure_ascii=False, indent=1)
+            f.write("\n")
+    else:
+        json.dump(saida, sys.stdout, ensure_ascii=False, indent=1)
+        sys.stdout.write("\n")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            regressoes = comparar(saida, json.load(f), args.tolerancia)
+        for r in regressoes:
+            print(f"REGRESSÃO {r}", file=sys.stderr)
+        return 1 if regressoes else 0
+    return 1 if any(r["erros"] for r in resultados) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,54 @@
 # ======================== IMPORTS ========================
+import cProfile
+import json
 import os
-import re
-import unicodedata
-from datetime import datetime
-from io import BytesIO
+import pstats
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime
+from io import BytesIO, StringIO
 
-import numpy as np
 import pandas as pd
 import streamlit as st
 
+import reparo_duckdb
+from reparo_core import (
+    COLUNAS_BUSCA,
+    FORMATOS_EXPORTACAO,
+    SNAP_RETER_DIARIOS,
+    SNAP_RETER_DIAS,
+    VIGIA_INTERVALO,
+    XLSX_MAX_LINHAS,
+    agregar_cubo,
+    calcular_diferencas,
+    calcular_prazos,
+    carregar_base,
+    carregar_snapshot,
+    carregar_upload,
+    carregar_varias,
+    chave_bytes,
+    chave_fonte,
+    chave_fontes,
+    construir_cubo,
+    construir_indice_busca,
+    congelar,
+    construir_motor_filtros,
+    expandir_fontes,
+    exportar,
+    fatiar_cubo,
+    filtrar_posicoes,
+    iniciar_vigia,
+    html_cards,
+    kpis_cubo,
+    listar_snapshots,
+    memoria_base,
+    meses_os,
+    parar_vigia,
+    rotulo_snapshot,
+    salvar_snapshot,
+)
+
 # ======================== CONFIG & TEMA ========================
 st.set_page_config(
     page_title="Controle de Reparos",
@@ -98,257 +138,182 @@ h3 { font-size: 1.18rem; letter-spacing:.2px; }
 .card-danger{ border-color: var(--danger-bd); background: linear-gradient(0deg, var(--card-bg), var(--card-bg)), var(--danger-bg); }
 .card-warn  { border-color: var(--warn-bd);   background: linear-gradient(0deg, var(--card-bg), var(--card-bg)), var(--warn-bg); }
 
+.cards-grid{ display:grid; grid-template-columns:repeat(var(--cols,3), minmax(0,1fr)); gap:1rem; align-items:stretch; }
+@media (max-width: 900px){ .cards-grid{ grid-template-columns:1fr; } }
+
 /* Gráficos com moldura */
 [data-testid="stVegaLiteChart"]{ border-radius: 12px; overflow: hidden; border:1px solid var(--border); }
 </style>
 """
 st.markdown(BASE_CSS, unsafe_allow_html=True)
 
-# ======================== SNAPSHOT CONFIG ========================
-SNAP_PATH = "data/_ultimo_snapshot.parquet"
-_snapshot_dir = os.path.dirname(SNAP_PATH)
-if _snapshot_dir:
-    os.makedirs(_snapshot_dir, exist_ok=True)
-
-# ======================== HELPERS ========================
-def _norm(s: str) -> str:
-    s = str(s)
-    s = unicodedata.normalize("NFKD", s)
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
-    return re.sub(r"\s+", " ", s).strip()
-
-
-def _choose_engine(path: str | BytesIO | None) -> str | None:
-    if isinstance(path, str):
-        low = path.lower()
-        if low.endswith(".xlsb"):
-            return "pyxlsb"
-        if low.endswith(".xlsx"):
-            return "openpyxl"
-        if low.endswith(".xls"):
-            return "xlrd"
-    return None
-
-
-def parse_mixed_dates(series: pd.Series) -> pd.Series:
-    """ISO (YYYY-MM-DD) com format + demais com dayfirst=True (sem warnings)."""
-    s = series.astype(str).str.strip()
-    idx = s.index
-    out = pd.Series(pd.NaT, index=idx, dtype="datetime64[ns]")
-
-    iso_mask = s.str.match(r"^\d{4}-\d{2}-\d{2}$")
-    if iso_mask.any():
-        out.loc[iso_mask] = pd.to_datetime(s.loc[iso_mask], format="%Y-%m-%d", errors="coerce")
-    if (~iso_mask).any():
-        out.loc[~iso_mask] = pd.to_datetime(s.loc[~iso_mask], dayfirst=True, errors="coerce")
-    return out
-
-
-def limpar_status(valor: str) -> str:
-    """
-    Exibição do Status:
-      - PO/P.O + 'fechad' -> 'P.O Fechada'
-      - PO/P.O -> 'P.O'
-      - 'não/nao/n?o comprad' -> 'Não comprado'
-      - senão, mantém
-    """
-    if pd.isna(valor):
-        return valor
-    raw = str(valor).strip()
-    n = _norm(raw).lower()
-    has_po = bool(re.search(r"\b(?:p\s*\.?\s*o|po)\b", n))
-    closed = "fechad" in n
-    nao_comprado = ("nao comprad" in n) or ("não comprad" in raw.lower()) or ("n?o comprad" in raw.lower())
-    if nao_comprado:
-        return "Não comprado"
-    if has_po and closed:
-        return "P.O Fechada"
-    if has_po:
-        return "P.O"
-    return raw
-
-
-def normalizar_os(val) -> str | None:
-    """
-    Aceita variações de OS como: 2025/08/0053, 2025-8-53, ' 2025 / 08 / 53 '
-    e normaliza para 'YYYY/MM/NNNN'. Retorna None se não for um formato válido.
-    """
-    if pd.isna(val):
-        return None
-    s = str(val).strip()
-    m = re.match(r"^\s*(\d{4})\s*[/-]\s*(\d{1,2})\s*[/-]\s*(\d{3,5})\s*$", s)
-    if not m:
-        return None
-    ano = int(m.group(1))
-    mes = int(m.group(2))
-    seq = m.group(3)
-    if not (1 <= mes <= 12):
-        return None
-    try:
-        seq_int = int(seq)
-    except ValueError:
-        return None
-    return f"{ano:04d}/{mes:02d}/{seq_int:04d}"
+# ======================== PERFIL (DIAGNÓSTICO) ========================
+# Tempos por etapa desta execução do script. Os controles ficam no fim da sidebar; o estado
+# é lido do session_state aqui no topo, antes dos widgets existirem nesta execução.
+PERF_LOG = "data/_perf.jsonl"
+PERF_ATIVO = st.session_state.get("perf_ativo", False)
+_SEM_MEDICAO = nullcontext({})  # desligado: 'with medir(...)' não custa nada além da chamada
+_perf = {"inicio": time.perf_counter(), "etapas": []}
+_perfil = cProfile.Profile() if st.session_state.pop("perf_capturar", False) else None  # uma única execução
 
 
-# ======================== LOAD ========================
-@st.cache_data(show_spinner=False)
-def carregar_dados(path: str | BytesIO) -> pd.DataFrame:
-    """Lê xls/xlsx/xlsb, normaliza colunas, datas, status e prazos."""
-    engine = _choose_engine(path)
+@contextmanager
+def _medir(etapa: str):
+    registro = {"etapa": etapa, "linhas": None}
+    inicio = time.perf_counter()
     try:
-        df = pd.read_excel(path, sheet_name="Worksheet", engine=engine)
-    except Exception:
-        xls = pd.ExcelFile(path, engine=engine)
-        df = pd.read_excel(xls, sheet_name=xls.sheet_names[0])
-
-    colunas_importantes = [
-        "Status","Sit","Prefixo","Orç/OS","Item",
-        "P/N Compras","P/N Removido","S/N Removido",
-        "Insumo","Enviar até","Retornar até",
-        "Motivo","Condição","Qtdade"
-    ]
-
-    # renomes comuns por encoding
-    mapa_renome = {
-        "Or?/OS":"Orç/OS","Orc/OS":"Orç/OS",
-        "Enviar at?":"Enviar até","Retornar at?":"Retornar até",
-        "Condi??o":"Condição","Condicao":"Condição",
-    }
-    df = df.rename(columns=mapa_renome)
-
-    # aproxima por nomes normalizados
-    norm_cols = {c: _norm(c) for c in df.columns}
-    alvo_norm = {a: _norm(a) for a in colunas_importantes}
-    ren_extra = {}
-    for col_atual, n_atual in norm_cols.items():
-        for alvo, n_alvo in alvo_norm.items():
-            if n_atual == n_alvo and col_atual != alvo:
-                ren_extra[col_atual] = alvo
-    if ren_extra:
-        df = df.rename(columns=ren_extra)
-
-    keep = [c for c in colunas_importantes if c in df.columns]
-    df = df[keep].copy()
-
-    # datas
-    for col in ["Enviar até","Retornar até"]:
-        if col in df.columns:
-            df[col] = parse_mixed_dates(df[col])
-
-    # textos e qtd
-    for col in df.select_dtypes(include=["object"]).columns:
-        df[col] = df[col].astype(str).str.strip()
-
-    if "Qtdade" in df.columns:
-        df["Qtdade"] = pd.to_numeric(df["Qtdade"], errors="coerce").fillna(0).astype(int)
-
-    # status limpo
-    if "Status" in df.columns:
-        df["Status"] = df["Status"].apply(limpar_status)
-
-    # prazos
-    hoje = pd.Timestamp(datetime.now().date())
-    if "Retornar até" in df.columns:
-        df["Dias para devolver"] = (df["Retornar até"] - hoje).dt.days
-        df["Em atraso"] = df["Dias para devolver"].apply(lambda x: bool(pd.notna(x) and x < 0))
-        df["Vence em 7 dias"] = df["Dias para devolver"].apply(lambda x: bool(pd.notna(x) and 0 <= x <= 7))
-        df["Sem data"] = df["Retornar até"].isna()
-    else:
-        df["Dias para devolver"] = pd.NA
-        df["Em atraso"] = False
-        df["Vence em 7 dias"] = False
-        df["Sem data"] = True
-
-    # OS normalizada (mantém só OS válidas)
-    if "Orç/OS" in df.columns:
-        df["__OS_norm"] = df["Orç/OS"].map(normalizar_os)
-        df = df[df["__OS_norm"].notna()].copy()
-        df["Orç/OS"] = df["__OS_norm"]
-        df.drop(columns="__OS_norm", inplace=True)
-
-    return df
-
-
-# ======================== SNAPSHOT + DIFF HELPERS ========================
-def _chave_itens(df: pd.DataFrame) -> pd.Series:
+        yield registro
+    finally:
+        registro["ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+        _perf["etapas"].append(registro)
+
+
+def medir(etapa: str):
+    """Cronometra o bloco (quando o diagnóstico está ligado); o dict do 'as' aceita 'linhas'."""
+    return _medir(etapa) if PERF_ATIVO else _SEM_MEDICAO
+
+
+def _gravar_perf(registro: dict) -> None:
+    pasta = os.path.dirname(PERF_LOG)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    with open(PERF_LOG, "a", encoding="utf-8") as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+
+def _relatorio_perfil(perfil: cProfile.Profile, n: int = 30) -> str:
+    saida = StringIO()
+    pstats.Stats(perfil, stream=saida).sort_stats("cumulative").print_stats(n)
+    return saida.getvalue()
+
+
+def painel_diagnostico(fonte: str | None, df: pd.DataFrame | None = None) -> None:
+    """Controles e resultados do diagnóstico (chamado no fim do script, depois de tudo medido)."""
+    total_ms = round((time.perf_counter() - _perf["inicio"]) * 1000, 2)
+
+    with st.sidebar.expander("🛠️ Diagnóstico", expanded=False):
+        st.checkbox("Medir tempos por etapa", key="perf_ativo")
+        st.checkbox(f"Gravar em {PERF_LOG}", key="perf_log", disabled=not PERF_ATIVO)
+        if st.button("Perfilar a próxima execução (cProfile)"):
+            st.session_state["perf_capturar"] = True
+            st.rerun()
+
+        if PERF_ATIVO:
+            st.caption(f"Execução atual: {total_ms:.0f} ms no total")
+            if df is not None:
+                st.caption(f"Dataset em memória: {memoria_base(df) / 1024**2:.1f} MB ({len(df):,} linhas)")
+            etapas = pd.DataFrame(_perf["etapas"], columns=["etapa", "ms", "linhas"]).astype({"linhas": "Int64"})
+            st.dataframe(etapas, use_container_width=True, hide_index=True)
+            if st.session_state.get("perf_log"):
+                _gravar_perf({
+                    "ts": datetime.now().isoformat(timespec="seconds"),
+                    "sessao": st.session_state.setdefault("perf_sessao", uuid.uuid4().hex[:12]),
+                    "fonte": fonte,
+                    "total_ms": total_ms,
+                    "etapas": _perf["etapas"],
+                })
+        relatorio = st.session_state.get("perf_relatorio")
+        if relatorio:
+            st.caption("cProfile da última execução capturada (tempo acumulado)")
+            st.code(relatorio, language=None)
+            st.download_button("⬇️ Baixar relatório", relatorio.encode("utf-8"), "perfil.txt", "text/plain")
+
+
+# ======================== CACHE (STREAMLIT) ========================
+# A lógica fica em reparo_core (sem Streamlit); aqui só os caches por sessão/processo.
+# Datasets em cache_resource: um objeto por versão, compartilhado (st.cache_data entregaria
+# uma cópia desserializada a cada sessão, a cada rerun).
+@st.cache_resource(show_spinner=False, max_entries=4)
+def carregar_dados(path: str | BytesIO) -> pd.DataFrame:
+    """Carrega a base normalizada (cache em disco quando possível), sem os prazos."""
+    return carregar_base(path)
+
+
+@st.cache_resource(show_spinner="Carregando planilha...", max_entries=4, on_release=parar_vigia)
+def vigia_planilha(path_abs: str) -> dict:
+    """Um vigia (thread de releitura) por arquivo local, compartilhado por todas as sessões;
+    ao sair do cache (evicção ou clear), a thread é parada."""
+    return iniciar_vigia(path_abs)
+
+
+@st.cache_resource(show_spinner="Lendo planilhas em paralelo...", max_entries=2)
+def carregar_dados_varias(chave: str | None, arquivos: tuple[str, ...]) -> pd.DataFrame:
+    """Várias planilhas/abas juntas (coluna 'Fonte'), por versão do conjunto."""
+    return carregar_varias(list(arquivos))
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def carregar_dados_do_dia(chave: str | None, dia: date, _base: pd.DataFrame) -> pd.DataFrame:
     """
-    Gera uma chave estável para identificar itens entre execuções.
-    Ajuste a lista de colunas conforme a sua realidade.
+    Base com prazos, memorizada por versão e dia: virar a data recalcula só os prazos, sem reler
+    a planilha. Somente leitura (congelar): as sessões filtram por posições, sem copiar a base.
     """
-    candidatos = [c for c in ["Orç/OS", "Item", "P/N Removido", "S/N Removido", "Prefixo"] if c in df.columns]
-    if not candidatos:
-        # Fallback: usa o índice atual (não ideal, mas evita quebrar)
-        return df.index.astype(str)
-    return df[candidatos].astype(str).agg(" | ".join, axis=1)
+    return congelar(calcular_prazos(_base, dia))
 
 
-def salvar_snapshot(df: pd.DataFrame) -> None:
-    cols = [c for c in df.columns if not c.startswith("__")]  # evita colunas técnicas
-    try:
-        df[cols].to_parquet(SNAP_PATH, index=False)
-    except Exception:
-        # caso seu ambiente não tenha parquet, salve como CSV
-        csv_fallback = SNAP_PATH.replace(".parquet", ".csv")
-        df[cols].to_csv(csv_fallback, index=False)
-
-
-def carregar_snapshot() -> pd.DataFrame | None:
-    if os.path.exists(SNAP_PATH):
-        try:
-            return pd.read_parquet(SNAP_PATH)
-        except Exception:
-            csv_path = SNAP_PATH.replace(".parquet", ".csv")
-            if os.path.exists(csv_path):
-                return pd.read_csv(csv_path)
-    return None
-
-
-def calcular_diferencas(
-    df_atual: pd.DataFrame,
-    df_antigo: pd.DataFrame
-) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+@st.fragment(run_every=VIGIA_INTERVALO)
+def aviso_vigia(vigia: dict, chave_vista: str | None) -> None:
+    """Mostra o estado do vigia e reexecuta a página quando ele publica uma versão nova."""
+    if vigia["atual"][0] != chave_vista:
+        st.rerun(scope="app")
+    st.caption(f"🔄 Planilha lida às {vigia['atualizado_em']:%H:%M:%S} de {vigia['atualizado_em']:%d/%m}; "
+               "alterações no arquivo são recarregadas automaticamente.")
+    if vigia["mudancas"] is not None:
+        adicionados, removidos, alterados = vigia["mudancas"]
+        st.caption(f"Última releitura: +{len(adicionados)} itens, −{len(removidos)} itens, "
+                   f"{len(alterados)} campos alterados (detalhes na aba Diferenças).")
+    if vigia["erro"]:
+        st.warning(f"A última releitura falhou (mantida a versão anterior): {vigia['erro']}")
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def indice_busca(chave: str | None, _base: pd.DataFrame) -> dict:
+    """Índice da busca por versão do dataset (compartilhado entre sessões)."""
+    return construir_indice_busca(_base)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def snapshot_versao(versao: str, arquivo: str) -> pd.DataFrame | None:
+    """Uma versão do histórico, lida do disco uma vez (versões são imutáveis)."""
+    return carregar_snapshot(versao)
+
+
+def impressao_snapshot(entrada: dict) -> str:
+    """Fingerprint do conteúdo da versão (manifestos remontados não têm: usa a versão)."""
+    return entrada.get("conteudo") or entrada["versao"]
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def diferencas_memo(chave_nova, chave_antiga: str, _novo: pd.DataFrame, _antigo: pd.DataFrame) -> tuple:
+    """Diferenças memorizadas pelo par (fingerprint do dataset novo, fingerprint do antigo)."""
+    return calcular_diferencas(_novo, _antigo)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def cubo_agregado(chave: str | None, dia: date, _df: pd.DataFrame) -> dict:
+    """Cubo de agregação por versão do dataset e dia (as faixas de prazo dependem da data)."""
+    return construir_cubo(_df)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def motor_filtros(chave: str | None, dia: date, _df: pd.DataFrame) -> dict:
+    """Motor de filtros por versão do dataset e dia (as vistas dependem da data)."""
+    return construir_motor_filtros(_df)
+
+
+@st.cache_resource(show_spinner="Carregando dados no DuckDB...", max_entries=2)
+def banco_duckdb(chave: str | None, dia: date, _df: pd.DataFrame) -> dict:
+    """Banco DuckDB em memória por versão do dataset e dia (compartilhado entre sessões)."""
+    return reparo_duckdb.construir_banco(_df)
+
+
+def por_versao(memorizada, chave: str | None, *args):
     """
-    Retorna (adicionados, removidos, alterados_por_campo)
-      - 'adicionados' e 'removidos' são linhas inteiras
-      - 'alterados_por_campo' é um DF com col/old/new por chave
+    Chama uma das funções acima pelo cache só quando há chave de versão: o frame (argumento
+    com '_') não entra no hash, então sem chave (fonte que não deu para identificar) todos os
+    datasets dividiriam a entrada None. Nesse caso roda direto, sem memorizar.
     """
-    a = df_atual.copy()
-    b = df_antigo.copy()
-
-    a["__key"] = _chave_itens(a)
-    b["__key"] = _chave_itens(b)
-
-    comparar_cols = sorted(set(a.columns).intersection(b.columns) - {"__key"})
-
-    # adicionados / removidos
-    adicionados = a[~a["__key"].isin(b["__key"])].drop(columns=["__key"], errors="ignore")
-    removidos  = b[~b["__key"].isin(a["__key"])].drop(columns=["__key"], errors="ignore")
-
-    # alterados: apenas chaves em comum
-    a_comum = a[a["__key"].isin(b["__key"])][["__key"] + comparar_cols]
-    b_comum = b[b["__key"].isin(a["__key"])][["__key"] + comparar_cols]
-
-    m = a_comum.merge(b_comum, on="__key", suffixes=("_new", "_old"))
-
-    diffs = []
-    for col in comparar_cols:
-        left = f"{col}_new"
-        right = f"{col}_old"
-        mask = m[left].astype(str).fillna("") != m[right].astype(str).fillna("")
-        if mask.any():
-            chunk = pd.DataFrame({
-                "Chave": m.loc[mask, "__key"].values,
-                "Coluna": col,
-                "Valor antigo": m.loc[mask, right].values,
-                "Valor novo": m.loc[mask, left].values,
-            })
-            diffs.append(chunk)
-
-    alterados = pd.concat(diffs, ignore_index=True) if diffs else pd.DataFrame(
-        columns=["Chave","Coluna","Valor antigo","Valor novo"]
-    )
-    return adicionados, removidos, alterados
+    return memorizada(chave, *args) if chave is not None else memorizada.__wrapped__(chave, *args)
 
 
 # ======================== RENDER DE CARDS ========================
@@ -359,304 +324,378 @@ def card_badge(texto: str, tone: str = "gray") -> str:
     return f'<span class="badge {tone_cls}">{texto}</span>'
 
 
-def render_cards(dfv: pd.DataFrame, cols_por_linha: int = 3):
-    """Renderiza itens como cartões; fallback evita 'tela branca'."""
-    if dfv.empty:
+CARDS_POR_PAGINA = [24, 48, 96, 192]
+
+
+def render_cards(df: pd.DataFrame, pos, colunas: list[str], cols_por_linha: int = 3):
+    """
+    Renderiza as linhas `pos` de `df` como cartões, paginados: cada página vai num único
+    st.markdown e só as linhas dela são copiadas, então o custo (servidor e navegador)
+    depende do tamanho da página, não do resultado. Fallback evita 'tela branca'.
+    """
+    if not len(pos):
         st.info("Nenhum item encontrado com os filtros atuais.")
         return
 
     cols_por_linha = max(2, min(int(cols_por_linha), 6))
-    try:
-        cols = st.columns(cols_por_linha)
-        i = 0
-        for _, row in dfv.iterrows():
-            # estilo do card pelo prazo
-            card_cls = "card"
-            if row.get("Em atraso", False):
-                card_cls = "card card-danger"
-            elif row.get("Vence em 7 dias", False):
-                card_cls = "card card-warn"
-
-            # ===== CAMPOS EXIGIDOS =====
-            titulo = (str(row.get("Item","")).strip() or "—")  # Título: Número do Item
-            insumo = (str(row.get("Insumo","")).strip() or "—") # Subtítulo: Insumo (descrição)
-            sit_txt = str(row.get("Sit","")).strip()
-            status = str(row.get("Status","")).strip()
-            prefixo = str(row.get("Prefixo","")).strip()
-
-            b_sit = card_badge(f"Situação: {sit_txt}") if sit_txt else ""
-            b_status = card_badge(
-                f"Status: {status}",
-                "blue" if "P.O" in status else ("red" if status.lower().startswith("n") else "gray")
-            ) if status else ""
-            b_prefixo = card_badge(f"Prefixo: {prefixo}") if prefixo else ""
-
-            # Prazo (se existir)
-            dt_ret = row.get("Retornar até", pd.NaT)
-            dias = row.get("Dias para devolver", None)
-            if pd.notna(dt_ret):
-                when = dt_ret.strftime("%d/%m/%Y")
-                tone = "amber" if (isinstance(dias,(int,float,np.integer,np.floating)) and 0 <= dias <= 7) \
-                       else ("red" if isinstance(dias,(int,float,np.integer,np.floating)) and dias < 0 else "gray")
-                prazo_badge = card_badge(f"Retornar até: {when}", tone)
-            else:
-                prazo_badge = card_badge("Sem data", "gray")
-
-            prazo_txt = ""
-            if isinstance(dias,(int,float,np.integer,np.floating)) and not pd.isna(dias):
-                d = int(dias)
-                if d < 0:
-                    prazo_txt = f"<span class='muted'>Atrasado há {abs(d)} dia(s)</span>"
-                elif d == 0:
-                    prazo_txt = "<span class='muted'>Vence hoje</span>"
-                else:
-                    prazo_txt = f"<span class='muted'>Faltam {d} dia(s)</span>"
-
-            with cols[i % cols_por_linha]:
-                st.markdown(
-                    f"""
-                    <div class="{card_cls}">
-                      <div class="card-header">
-                        <div>
-                          <div class="card-title">{titulo}</div>
-                          <div class="card-sub">{insumo}</div>
-                        </div>
-                      </div>
-                      <div class="card-row">
-                        {b_sit}{b_status}{b_prefixo}{prazo_badge}
-                      </div>
-                      <div class="card-row">{prazo_txt}</div>
-                    </div>
-                    """,
-                    unsafe_allow_html=True,
-                )
-            i += 1
+    total = len(pos)
+    c1, c2, c3 = st.columns([1, 1, 2])
+    por_pagina = c1.selectbox("Cards por página", CARDS_POR_PAGINA, index=1, key="cards_por_pagina")
+    n_paginas = max(1, -(-total // por_pagina))
+    # a página vive só no session_state (o widget não recebe value=): limitada aqui quando
+    # os filtros reduzem o resultado
+    st.session_state["cards_pagina"] = min(st.session_state.setdefault("cards_pagina", 1), n_paginas)
+    pagina = int(c2.number_input("Página", min_value=1, max_value=n_paginas, step=1, key="cards_pagina"))
+    inicio = (pagina - 1) * por_pagina
+    c3.caption(f"Itens {inicio + 1}–{min(inicio + por_pagina, total)} de {total} · página {pagina} de {n_paginas}")
+    dfp = df.iloc[pos[inicio:inicio + por_pagina]][colunas]
 
+    try:
+        st.markdown(html_cards(dfp, cols_por_linha), unsafe_allow_html=True)
     except Exception as e:
         st.error(f"Falha ao renderizar os cartões ({type(e).__name__}). Mostrando visão alternativa simples.")
-        for _, row in dfv.iterrows():
-            st.write({
-                "Item": row.get("Item",""),
-                "Insumo": row.get("Insumo",""),
-                "Situação": row.get("Sit",""),
-                "Status": row.get("Status",""),
-                "Prefixo": row.get("Prefixo",""),
-                "Retornar até": row.get("Retornar até",""),
-                "Dias p/ devolver": row.get("Dias para devolver",""),
-            })
-
-
-# ======================== SIDEBAR (FILTROS) ========================
-st.sidebar.title("📌 Filtros")
-
-with st.sidebar.expander("Fonte de dados", expanded=True):
-    up = st.file_uploader("Enviar arquivo (.xlsx/.xls/.xlsb)", type=["xlsx","xls","xlsb"])
-    if up is not None:
-        path = BytesIO(up.read())
-    else:
-        path = st.text_input("Ou caminho local do Excel", value="reparo_atual.xlsx")
-
-df = carregar_dados(path)
-
-st.sidebar.markdown("### Vistas rápidas")
-vista = st.sidebar.radio(
-    label="Seleção",
-    options=["Todos os itens", "Atrasados", "Próx. 7 dias", "Sem data"],
-    index=0,
-)
+        st.dataframe(dfp, use_container_width=True, hide_index=True)
 
-f_status = st.sidebar.selectbox(
-    "Status",
-    ["(Todos)"] + sorted(df["Status"].dropna().astype(str).unique()) if "Status" in df else ["(Todos)"]
-)
-f_sit = st.sidebar.selectbox(
-    "Situação (Sit)",
-    ["(Todos)"] + sorted(df["Sit"].dropna().astype(str).unique()) if "Sit" in df else ["(Todos)"]
-)
-f_prefixo = st.sidebar.text_input("Prefixo (contém)")
-busca = st.sidebar.text_input("Busca livre (qualquer coluna)")
-
-st.sidebar.markdown("---")
-inclui_sem_data = st.sidebar.checkbox("Incluir itens sem data", value=True)
-habilitar_filtro_datas = st.sidebar.checkbox("Filtrar por 'Retornar até'", value=False)
-
-date_range = None
-if habilitar_filtro_datas and "Retornar até" in df.columns:
-    min_d, max_d = df["Retornar até"].min(), df["Retornar até"].max()
-    if pd.notna(min_d) and pd.notna(max_d):
-        date_range = st.sidebar.date_input(
-            "Janela de 'Retornar até'",
-            value=(min_d.date(), max_d.date())
-        )
-    else:
-        st.sidebar.info("Não há datas válidas em 'Retornar até'.")
-
-st.sidebar.markdown("---")
-ordem = st.sidebar.selectbox(
-    "Ordenar por",
-    [c for c in [
-        "Em atraso","Vence em 7 dias","Dias para devolver","Retornar até",
-        "Item","Insumo","Prefixo","Status","Sit","Qtdade","Orç/OS"
-    ] if c in df.columns]
-)
-ordem_cresc = st.sidebar.toggle("Ordem crescente", value=False if ordem in ["Em atraso","Vence em 7 dias"] else True)
-
-# ======================== FILTRAGEM ========================
-df_f = df.copy()
-
-# vistas rápidas
-if vista == "Atrasados" and "Em atraso" in df_f:
-    df_f = df_f[df_f["Em atraso"]]
-elif vista == "Próx. 7 dias" and "Vence em 7 dias" in df_f:
-    df_f = df_f[df_f["Vence em 7 dias"]]
-elif vista == "Sem data" and "Sem data" in df_f:
-    df_f = df_f[df_f["Sem data"]]
-# "Todos os itens": sem restrição por data
-
-# filtros básicos
-if f_status != "(Todos)" and "Status" in df_f:
-    df_f = df_f[df_f["Status"].astype(str) == f_status]
-if f_sit != "(Todos)" and "Sit" in df_f:
-    df_f = df_f[df_f["Sit"].astype(str) == f_sit]
-if f_prefixo and "Prefixo" in df_f:
-    df_f = df_f[df_f["Prefixo"].astype(str).str.contains(f_prefixo, case=False, na=False)]
-
-# busca livre
-if busca:
-    txt = busca.strip().lower()
-    mask = pd.Series(False, index=df_f.index)
-    for col in df_f.columns:
-        mask |= df_f[col].astype(str).str.lower().str.contains(txt, na=False)
-    df_f = df_f[mask]
-
-# filtro por datas (opcional)
-if habilitar_filtro_datas and date_range and "Retornar até" in df_f and len(date_range) == 2:
-    ini, fim = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1]) + pd.Timedelta(days=1)
-    mask_data = (df_f["Retornar até"] >= ini) & (df_f["Retornar até"] < fim)
-    if inclui_sem_data:
-        mask_data |= df_f["Retornar até"].isna()
-    df_f = df_f[mask_data]
-elif not inclui_sem_data and "Retornar até" in df_f:
-    df_f = df_f[~df_f["Retornar até"].isna()]
-
-# ordenação
-if ordem in df_f.columns:
-    secund = "Retornar até" if ("Retornar até" in df_f.columns and ordem != "Retornar até") else None
-    if secund:
-        df_f = df_f.sort_values(by=[ordem, secund], ascending=[ordem_cresc, True])
-    else:
-        df_f = df_f.sort_values(by=[ordem], ascending=[ordem_cresc])
-
-# ======================== HEADER & KPIs ========================
-st.title("⚒️ Controle de Reparos")
-
-k1, k2, k3, k4, k5 = st.columns(5)
-total_itens = len(df_f)
-atrasados = int(df_f["Em atraso"].sum()) if "Em atraso" in df_f else 0
-prox7 = int(df_f["Vence em 7 dias"].sum()) if "Vence em 7 dias" in df_f else 0
-sem_data = int(df_f["Sem data"].sum()) if "Sem data" in df_f else 0
-qtd_total = int(df_f["Qtdade"].sum()) if "Qtdade" in df_f else total_itens
-
-for col, title, value in [
-    (k1,"Itens filtrados", total_itens),
-    (k2,"Em atraso", atrasados),
-    (k3,"Vencem em 7 dias", prox7),
-    (k4,"Sem data", sem_data),
-    (k5,"Qtdade total (soma)", qtd_total),
-]:
-    with col:
-        st.markdown(
-            f"""
+
+# ======================== EXPORTAÇÃO ========================
+def botao_exportar(rotulo: str, dfx: pd.DataFrame, nome: str, formato: str, key: str, pos=None) -> None:
+    """
+    Download gerado só no clique (callable, fora do rerun), em blocos, no formato escolhido.
+    Com `pos`, exporta essas linhas de `dfx` (copiadas só no clique).
+    """
+    n = len(dfx) if pos is None else len(pos)
+    grande = formato == "xlsx" and n > XLSX_MAX_LINHAS
+    st.download_button(
+        f"⬇️ {rotulo} ({formato.upper()})",
+        lambda: exportar(dfx if pos is None else dfx.iloc[pos], formato).read(),
+        f"{nome}.{formato}",
+        FORMATOS_EXPORTACAO[formato],
+        key=key,
+        on_click="ignore",
+        disabled=grande or not n,
+        help=f"xlsx comporta até {XLSX_MAX_LINHAS:,} linhas; use csv ou parquet" if grande else None,
+    )
+
+
+if _perfil is not None:
+    _perfil.enable()  # só o corpo do script; o finally desliga mesmo com st.rerun()/st.stop()/erro
+try:
+    # ======================== SIDEBAR (FILTROS) ========================
+    st.sidebar.title("📌 Filtros")
+
+    with st.sidebar.expander("Fonte de dados", expanded=True):
+        up = st.file_uploader("Enviar arquivo (.xlsx/.xls/.xlsb)", type=["xlsx","xls","xlsb"])
+        if up is not None:
+            # digest calculado uma vez por arquivo enviado; os reruns seguintes só reaproveitam
+            envio = st.session_state.get("upload")
+            if envio is None or envio["file_id"] != up.file_id:
+                envio = {"file_id": up.file_id, "chave": chave_bytes(up.getbuffer())}
+                st.session_state["upload"] = envio
+            path = up
+        else:
+            path = st.text_input(
+                "Ou caminho local do Excel", value="reparo_atual.xlsx",
+                help="Vários arquivos: separe por ';', indique uma pasta ou um padrão (ex.: exports/*.xlsx).",
+            )
+        todas_abas = st.checkbox("Ler todas as abas", value=False, disabled=up is not None)
+
+    hoje = date.today()
+    fontes = [f.strip() for f in path.split(";") if f.strip()] if isinstance(path, str) else []
+    varias = bool(fontes) and (
+        todas_abas or len(fontes) > 1 or any(ch in fontes[0] for ch in "*?[") or os.path.isdir(fontes[0])
+    )
+    with medir("carregar dados") as m:
+        if varias:
+            vigia = None
+            arquivos = tuple(expandir_fontes(fontes))
+            chave_dados = chave_fontes(list(arquivos))
+            base = carregar_dados_varias(chave_dados, arquivos)
+        elif isinstance(path, str) and os.path.isfile(path):
+            # arquivo local: a leitura acontece na thread do vigia; aqui só pega a versão publicada
+            vigia = vigia_planilha(os.path.abspath(path))
+            chave_dados, base = vigia["atual"]
+        elif up is not None:
+            vigia = None
+            chave_dados = st.session_state["upload"]["chave"]
+            base = carregar_upload(up, chave_dados)
+        else:
+            vigia = None
+            base = carregar_dados(path)
+            chave_dados = chave_fonte(path)
+        df = por_versao(carregar_dados_do_dia, chave_dados, hoje, base)
+        m["linhas"] = len(df)
+    if vigia is not None:
+        with st.sidebar:
+            aviso_vigia(vigia, chave_dados)
+    with medir("motor de filtros"):
+        motor = por_versao(motor_filtros, chave_dados, hoje, df)
+
+    st.sidebar.markdown("### Vistas rápidas")
+    vista = st.sidebar.radio(
+        label="Seleção",
+        options=["Todos os itens", "Atrasados", "Próx. 7 dias", "Sem data"],
+        index=0,
+    )
+
+    f_status = st.sidebar.selectbox(
+        "Status",
+        ["(Todos)"] + sorted(motor["status"]) if motor["status"] is not None else ["(Todos)"]
+    )
+    f_sit = st.sidebar.selectbox(
+        "Situação (Sit)",
+        ["(Todos)"] + sorted(motor["sit"]) if motor["sit"] is not None else ["(Todos)"]
+    )
+    f_prefixo = st.sidebar.text_input("Prefixo (contém)")
+    busca = st.sidebar.text_input("Busca livre (qualquer coluna)")
+    colunas_busca = st.sidebar.multiselect(
+        "Buscar em",
+        [c for c in COLUNAS_BUSCA if c in df.columns],  # as mesmas colunas do índice
+        placeholder="Todas as colunas",
+    )
+
+    st.sidebar.markdown("---")
+    inclui_sem_data = st.sidebar.checkbox("Incluir itens sem data", value=True)
+    habilitar_filtro_datas = st.sidebar.checkbox("Filtrar por 'Retornar até'", value=False)
+
+    date_range = None
+    if habilitar_filtro_datas and "Retornar até" in df.columns:
+        datas = motor["intervalos"]["Retornar até"]["chaves"]  # já ordenadas: mínimo e máximo nas pontas
+        if len(datas):
+            date_range = st.sidebar.date_input(
+                "Janela de 'Retornar até'",
+                value=(pd.Timestamp(datas[0]).date(), pd.Timestamp(datas[-1]).date())
+            )
+        else:
+            st.sidebar.info("Não há datas válidas em 'Retornar até'.")
+
+    faixa_os = None
+    meses = meses_os(motor)
+    if meses and st.sidebar.checkbox("Filtrar por Orç/OS (ano/mês)", value=False):
+        os_de, os_ate = st.sidebar.select_slider("Faixa de OS", options=meses, value=(meses[0], meses[-1]))
+        faixa_os = (os_de, os_ate)
+
+    st.sidebar.markdown("---")
+    ordem = st.sidebar.selectbox(
+        "Ordenar por",
+        [c for c in [
+            "Em atraso","Vence em 7 dias","Dias para devolver","Retornar até",
+            "Item","Insumo","Prefixo","Status","Sit","Qtdade","Orç/OS"
+        ] if c in df.columns]
+    )
+    ordem_cresc = st.sidebar.toggle("Ordem crescente", value=False if ordem in ["Em atraso","Vence em 7 dias"] else True)
+    formato_exp = st.sidebar.selectbox("Formato de exportação", list(FORMATOS_EXPORTACAO))
+    usar_duckdb = reparo_duckdb.disponivel() and st.sidebar.toggle(
+        "Consultar via DuckDB", value=False,
+        help="Filtros, ordenação, KPIs e agrupamentos em SQL (multi-thread); mesmos resultados.",
+    )
+
+    # ======================== FILTRAGEM ========================
+    # bitmasks pré-calculados + memo das combinações recentes; só o resultado final vira DataFrame
+    janela = None
+    if habilitar_filtro_datas and date_range and "Retornar até" in df and len(date_range) == 2:
+        janela = (date_range[0], date_range[1])
+
+    filtros = dict(
+        vista=vista,
+        status=f_status,
+        sit=f_sit,
+        prefixo=f_prefixo,
+        busca=busca,
+        colunas_busca=colunas_busca,
+        indice=por_versao(indice_busca, chave_dados, df) if busca else None,
+        janela=janela,
+        inclui_sem_data=inclui_sem_data,
+        faixa_os=faixa_os,
+    )
+    if usar_duckdb:
+        banco = por_versao(banco_duckdb, chave_dados, hoje, df)
+
+    # a vista filtrada e ordenada são só posições em `df` (memorizadas e compartilhadas entre
+    # sessões); linhas são copiadas apenas para a página de cards e para exportar
+    with medir("filtros + ordenação") as m:
+        if usar_duckdb:
+            pos_f = reparo_duckdb.consultar_posicoes(banco, ordem=ordem, crescente=ordem_cresc, **filtros)
+        else:
+            pos_f = filtrar_posicoes(motor, ordem=ordem, crescente=ordem_cresc, **filtros)
+        m["linhas"] = len(pos_f)
+
+    # ======================== HEADER & KPIs ========================
+    st.title("⚒️ Controle de Reparos")
+
+    k1, k2, k3, k4, k5 = st.columns(5)
+    with medir("KPIs"):
+        if usar_duckdb:
+            kpis = reparo_duckdb.calcular_kpis(banco, **filtros)
+
+            def agregar(por, colunas=None):
+                return reparo_duckdb.agregar(banco, por, colunas, **filtros)
+        else:
+            # fatia do cubo pré-calculado; busca livre, janela de datas e faixa de OS não são
+            # dimensões do cubo, então nesses casos ele é montado só com as linhas já filtradas
+            if busca or janela is not None or faixa_os is not None:
+                cubo = construir_cubo(df, pos_f)
+                fatia = fatiar_cubo(cubo)
+            else:
+                cubo = por_versao(cubo_agregado, chave_dados, hoje, df)
+                fatia = fatiar_cubo(cubo, vista, f_status, f_sit, f_prefixo, inclui_sem_data)
+            kpis = kpis_cubo(cubo, fatia)
+
+            def agregar(por, colunas=None):
+                return agregar_cubo(cubo, fatia, por, colunas)
+
+    for col, title, value in [
+        (k1,"Itens filtrados", kpis["itens"]),
+        (k2,"Em atraso", kpis["em_atraso"]),
+        (k3,"Vencem em 7 dias", kpis["vence_7_dias"]),
+        (k4,"Sem data", kpis["sem_data"]),
+        (k5,"Qtdade total (soma)", kpis["qtd_total"]),
+    ]:
+        with col:
+            st.markdown(
+                f"""
             <div class="kpi">
               <div class="kpi-title">{title}</div>
               <div class="kpi-value">{value}</div>
             </div>
             """, unsafe_allow_html=True
-        )
+            )
 
-st.markdown(
-    f"""
+    st.markdown(
+        f"""
     <div style="margin:.5rem 0 .75rem 0;">
       <span class="badge badge-blue">Vista: {vista}</span>
       <span class="badge badge-gray">Ordenado por: {ordem} {'↑' if ordem_cresc else '↓'}</span>
       <span class="badge badge-amber">{'Incluindo' if inclui_sem_data else 'Excluindo'} sem data</span>
+      {f'<span class="badge badge-gray">OS: {faixa_os[0]} a {faixa_os[1]}</span>' if faixa_os else ''}
       <span class="badge badge-gray">Atualizado: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}</span>
     </div>
     """,
-    unsafe_allow_html=True,
-)
-st.markdown("---")
-
-# ======================== ABAS ========================
-snap_antigo = carregar_snapshot()
-tab1, tab2, tab3 = st.tabs(["📋 Itens (cards)", "📊 Agrupamentos", "🔍 Diferenças"])
-
-with tab1:
-    cols_keep = [c for c in [
-        "Item","Insumo","Sit","Status","Prefixo",
-        "Retornar até","Dias para devolver","Em atraso","Vence em 7 dias","Sem data"
-    ] if c in df_f.columns]
-    render_cards(df_f[cols_keep], cols_por_linha=3)
-
-with tab2:
-    cA, = st.columns(1)
-    with cA:
-        if "Status" in df_f.columns and not df_f.empty:
-            st.subheader("Distribuição por Status")
-            st.bar_chart(df_f["Status"].value_counts().sort_values(ascending=False))
-        if "Sit" in df_f.columns and not df_f.empty:
-            st.subheader("Distribuição por Sit")
-            st.bar_chart(df_f["Sit"].value_counts().sort_values(ascending=False))
-
-with tab3:
-    st.subheader("Comparação com a execução anterior")
-    if snap_antigo is None:
-        st.info("Nenhum snapshot encontrado ainda. Salve um snapshot para habilitar a comparação.")
-    else:
-        adicionados, removidos, alterados = calcular_diferencas(df, snap_antigo)
-
-        c1, c2, c3 = st.columns(3)
-        c1.metric("Adicionados", len(adicionados))
-        c2.metric("Removidos", len(removidos))
-        c3.metric("Alterações de campos", len(alterados))
-
-        st.markdown("**Adicionados**")
-        st.dataframe(adicionados, use_container_width=True, hide_index=True)
-
-        st.markdown("**Removidos**")
-        st.dataframe(removidos, use_container_width=True, hide_index=True)
-
-        st.markdown("**Alterados (por campo)**")
-        st.dataframe(alterados, use_container_width=True, hide_index=True)
-
-        # Downloads
-        st.download_button(
-            "⬇️ Baixar adicionados (CSV)",
-            adicionados.to_csv(index=False).encode("utf-8"),
-            "adicionados.csv",
-            "text/csv",
-        )
-        st.download_button(
-            "⬇️ Baixar removidos (CSV)",
-            removidos.to_csv(index=False).encode("utf-8"),
-            "removidos.csv",
-            "text/csv",
-        )
-        st.download_button(
-            "⬇️ Baixar alterados (CSV)",
-            alterados.to_csv(index=False).encode("utf-8"),
-            "alterados.csv",
-            "text/csv",
-        )
-
+        unsafe_allow_html=True,
+    )
     st.markdown("---")
-    colA, colB = st.columns([1,2])
-    with colA:
-        if st.button("💾 Salvar snapshot agora"):
-            salvar_snapshot(df)
-            st.success("Snapshot salvo. Na próxima execução a comparação estará disponível.")
-    with colB:
-        st.caption(
-            "A chave de comparação usa: Orç/OS, Item, P/N Removido, S/N Removido, Prefixo (quando existirem). "
-            "Ajuste em `_chave_itens` conforme necessário."
-        )
+
+    # ======================== ABAS ========================
+    # abas com estado: o conteúdo caro (diferenças) só roda quando a aba está aberta
+    tab1, tab2, tab3 = st.tabs(["📋 Itens (cards)", "📊 Agrupamentos", "🔍 Diferenças"], key="aba", on_change="rerun")
+
+    with tab1, medir("aba: cards") as m:
+        m["linhas"] = len(pos_f)
+        cols_keep = [c for c in [
+            "Item","Insumo","Sit","Status","Prefixo",
+            "Retornar até","Dias para devolver","Em atraso","Vence em 7 dias","Sem data"
+        ] if c in df.columns]
+        botao_exportar("Exportar vista filtrada", df, "itens_filtrados", formato_exp, "exp_vista", pos=pos_f)
+        render_cards(df, pos_f, cols_keep, cols_por_linha=3)
+
+    with tab2, medir("aba: agrupamentos"):
+        cA, = st.columns(1)
+        with cA:
+            if "Status" in df.columns and len(pos_f):
+                st.subheader("Distribuição por Status")
+                st.bar_chart(agregar("Status").sort_values(ascending=False))
+            if "Sit" in df.columns and len(pos_f):
+                st.subheader("Distribuição por Sit")
+                st.bar_chart(agregar("Sit").sort_values(ascending=False))
+            if "Prefixo" in df.columns and kpis["em_atraso"]:
+                st.subheader("Em atraso por Prefixo (20 maiores)")
+                por_prefixo = agregar("Prefixo", colunas="faixa")
+                st.bar_chart(por_prefixo["atrasado"].loc[lambda s: s > 0].nlargest(20))
+            if "Retornar até" in df.columns and kpis["itens"] > kpis["sem_data"]:
+                st.subheader("Vencimentos por semana ('Retornar até')")
+                st.bar_chart(agregar("semana", colunas="faixa"))
+            fonte = df["Fonte"].iloc[pos_f] if "Fonte" in df.columns else None
+            if fonte is not None and fonte.nunique() > 1:
+                st.subheader("Distribuição por Fonte")
+                st.bar_chart(fonte.value_counts(sort=True).loc[lambda s: s > 0])
+
+    with tab3, medir("aba: diferenças") as m:
+        st.subheader("Comparação entre versões")
+        if tab3.open:  # manifesto lido só com a aba aberta, não a cada rerun das outras abas
+            snapshots = listar_snapshots()
+            if not snapshots:
+                st.info("Nenhum snapshot encontrado ainda. Salve um snapshot para habilitar a comparação.")
+            else:
+                por_versao = {e["versao"]: e for e in snapshots}
+                rotulos = {v: rotulo_snapshot(e) for v, e in por_versao.items()}
+                ATUAL = "__atual__"
+                cN, cA = st.columns(2)
+                with cN:
+                    versao_nova = st.selectbox(
+                        "Versão nova", [ATUAL] + list(rotulos), index=0,
+                        format_func=lambda v: "Dados atuais" if v == ATUAL else rotulos[v],
+                    )
+                with cA:
+                    anteriores = [v for v in rotulos if versao_nova == ATUAL or v < versao_nova]
+                    versao_antiga = st.selectbox(
+                        "Comparar com", anteriores or list(rotulos), index=0, format_func=rotulos.get,
+                    )
+                antiga = por_versao[versao_antiga]
+                if versao_nova == ATUAL:
+                    # prazos entram no diff: o dataset atual é identificado pela versão da fonte e pelo dia
+                    chave_nova = (chave_dados, hoje) if chave_dados else None
+                    snap_novo = df
+                else:
+                    nova = por_versao[versao_nova]
+                    chave_nova, snap_novo = impressao_snapshot(nova), snapshot_versao(versao_nova, nova["arquivo"])
+                snap_antigo = snapshot_versao(versao_antiga, antiga["arquivo"])
+                if snap_novo is None or snap_antigo is None:
+                    st.error("Não foi possível ler a versão escolhida.")
+                else:
+                    if chave_nova is None:  # dataset sem chave de versão: não há o que memorizar
+                        adicionados, removidos, alterados = calcular_diferencas(snap_novo, snap_antigo)
+                    else:
+                        adicionados, removidos, alterados = diferencas_memo(
+                            chave_nova, impressao_snapshot(antiga), snap_novo, snap_antigo
+                        )
+                    m["linhas"] = len(adicionados) + len(removidos) + len(alterados)
+
+                    c1, c2, c3 = st.columns(3)
+                    c1.metric("Adicionados", len(adicionados))
+                    c2.metric("Removidos", len(removidos))
+                    c3.metric("Alterações de campos", len(alterados))
+
+                    st.markdown("**Adicionados**")
+                    st.dataframe(adicionados, use_container_width=True, hide_index=True)
+
+                    st.markdown("**Removidos**")
+                    st.dataframe(removidos, use_container_width=True, hide_index=True)
+
+                    st.markdown("**Alterados (por campo)**")
+                    st.dataframe(alterados, use_container_width=True, hide_index=True)
+
+                    # Downloads (gerados só no clique)
+                    for nome, tabela in [("adicionados", adicionados), ("removidos", removidos), ("alterados", alterados)]:
+                        botao_exportar(f"Baixar {nome}", tabela, nome, formato_exp, f"exp_{nome}")
+
+                if usar_duckdb and reparo_duckdb.registrar_historico(banco, snapshots):
+                    with st.expander("Itens por Status em cada versão (DuckDB sobre o histórico)"):
+                        st.dataframe(reparo_duckdb.contagens_historico(banco, "Status"), use_container_width=True)
+
+            if vigia is not None and vigia["mudancas"] is not None:
+                # subproduto da releitura incremental: nada a calcular aqui
+                with st.expander(f"Mudanças da última releitura do arquivo ({vigia['atualizado_em']:%d/%m %H:%M:%S})"):
+                    for nome, tabela in zip(["Adicionados", "Removidos", "Alterados (por campo)"], vigia["mudancas"]):
+                        st.markdown(f"**{nome}** ({len(tabela)})")
+                        st.dataframe(tabela, use_container_width=True, hide_index=True)
+
+            st.markdown("---")
+            colA, colB = st.columns([1,2])
+            with colA:
+                if st.button("💾 Salvar snapshot agora"):
+                    entrada = salvar_snapshot(df)
+                    st.success(f"Snapshot salvo: {rotulo_snapshot(entrada)}.")
+            with colB:
+                em_disco = sum(e.get("bytes") or 0 for e in snapshots) / 1024**2
+                st.caption(
+                    "A chave de comparação usa: Orç/OS, Item, P/N Removido, S/N Removido, Prefixo (quando existirem). "
+                    "Ajuste em `COLUNAS_CHAVE` conforme necessário. "
+                    f"Histórico: {len(snapshots)} versões ({em_disco:.1f} MB); mantém tudo dos últimos "
+                    f"{SNAP_RETER_DIAS} dias e a última de cada dia até {SNAP_RETER_DIARIOS} dias."
+                )
+finally:
+    if _perfil is not None:
+        _perfil.disable()
+        st.session_state["perf_relatorio"] = _relatorio_perfil(_perfil)
+
+# ======================== DIAGNÓSTICO ========================
+painel_diagnostico(chave_dados, df)
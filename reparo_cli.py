@@ -0,0 +1,196 @@
+"""
+Linha de comando do Controle de Reparos (sem Streamlit), para rodar em lote/cron.
+
+Exemplos:
+  python reparo_cli.py processar reparo_atual.xlsx --snapshot --saida saida/
+  python reparo_cli.py processar planilhas/ --formato parquet --saida saida/ --snap-dir "data/snapshots/{nome}" --snapshot
+  python reparo_cli.py processar "exports/*.xlsx" arquivo/2025-*.xlsx --juntar frota --snapshot
+  python reparo_cli.py versoes
+  python reparo_cli.py diff --de 20261001T080000000000 --para reparo_atual.xlsx --saida saida/
+"""
+# ======================== IMPORTS ========================
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date
+
+import pandas as pd
+
+import reparo_core as core
+
+TABELAS_DIFF = ("adicionados", "removidos", "alterados")
+
+
+# ======================== HELPERS ========================
+def _nome(arquivo: str) -> str:
+    return os.path.splitext(os.path.basename(arquivo))[0]
+
+
+def _gravar_tabela(df: pd.DataFrame, destino: str, formato: str) -> None:
+    if formato == "json":
+        df.to_json(destino, orient="records", date_format="iso", force_ascii=False, indent=1)
+        return
+    # csv/parquet/xlsx em blocos; tipos misturados (ex.: 'Valor antigo' do diff) viram texto
+    with open(destino, "wb") as f:
+        core.exportar(df, formato, f)
+
+
+def _carregar(arquivo: str, hoje: date) -> pd.DataFrame:
+    return core.calcular_prazos(core.carregar_base(arquivo), hoje)
+
+
+def _lotes(args) -> list[tuple[str, str, list[str]]]:
+    """
+    (nome, rótulo, fontes) de cada dataset: uma planilha por vez ou, com --juntar, tudo num só.
+    Pastas e globs expandem como no dashboard (core.expandir_fontes), com ou sem --juntar.
+    """
+    if args.juntar:
+        return [(args.juntar, ";".join(args.entradas), args.entradas)]
+    return [(_nome(arquivo), arquivo, [arquivo]) for arquivo in core.expandir_fontes(args.entradas)]
+
+
+def _filtrar(df: pd.DataFrame, args) -> pd.DataFrame:
+    motor = core.construir_motor_filtros(df)
+    pos = core.filtrar_posicoes(
+        motor,
+        vista=args.vista,
+        status=args.status,
+        sit=args.sit,
+        prefixo=args.prefixo,
+        busca=args.busca,
+        indice=core.construir_indice_busca(df) if args.busca else None,
+        faixa_os=tuple(args.faixa_os) if args.faixa_os else None,
+    )
+    return df.iloc[pos]
+
+
+def _resumo_diff(tabelas: dict[str, pd.DataFrame]) -> dict[str, int]:
+    return {nome: len(t) for nome, t in tabelas.items()}
+
+
+def _emitir(resultado, tabelas: dict[str, pd.DataFrame], nome: str, args) -> None:
+    """Grava KPIs/diffs em --saida (um arquivo por tabela) quando pedido."""
+    if not args.saida:
+        return
+    os.makedirs(args.saida, exist_ok=True)
+    ext = args.formato
+    _gravar_tabela(pd.DataFrame([resultado]), os.path.join(args.saida, f"{nome}.kpis.{ext}"), ext)
+    for tabela, df in tabelas.items():
+        _gravar_tabela(df, os.path.join(args.saida, f"{nome}.{tabela}.{ext}"), ext)
+
+
+# ======================== COMANDOS ========================
+def cmd_processar(args) -> int:
+    """Lê cada planilha, calcula KPIs e, com --snapshot, compara com a última versão e salva outra."""
+    hoje = date.fromisoformat(args.hoje) if args.hoje else date.today()
+    lotes = _lotes(args)
+    if not lotes:
+        print("nenhuma planilha em: " + " ".join(args.entradas), file=sys.stderr)
+        return 2
+    resumo, falhas = [], 0
+    for nome, arquivo, fontes in lotes:
+        inicio = time.perf_counter()
+        try:
+            core.configurar_diretorios(snap_dir=args.snap_dir.format(nome=nome))
+            if args.juntar:
+                df = core.calcular_prazos(core.carregar_varias(fontes, args.processos), hoje)
+            else:
+                df = _carregar(arquivo, hoje)
+            resultado = {"arquivo": arquivo, "hoje": hoje.isoformat(), "linhas": len(df)}
+            resultado.update(core.calcular_kpis(_filtrar(df, args)))
+            tabelas = {}
+            if args.snapshot:
+                anterior = core.carregar_snapshot()
+                if anterior is not None:
+                    tabelas = dict(zip(TABELAS_DIFF, core.calcular_diferencas(df, anterior)))
+                    resultado["diff"] = _resumo_diff(tabelas)
+                resultado["snapshot"] = core.salvar_snapshot(df)["versao"]
+            resultado["segundos"] = round(time.perf_counter() - inicio, 3)
+            _emitir({k: v for k, v in resultado.items() if k != "diff"}, tabelas, nome, args)
+        except Exception as e:
+            falhas += 1
+            resultado = {"arquivo": arquivo, "erro": f"{type(e).__name__}: {e}"}
+        resumo.append(resultado)
+    json.dump(resumo, sys.stdout, ensure_ascii=False, indent=1)
+    sys.stdout.write("\n")
+    return 1 if falhas else 0
+
+
+def cmd_versoes(args) -> int:
+    core.configurar_diretorios(snap_dir=args.snap_dir)
+    json.dump(core.listar_snapshots(), sys.stdout, ensure_ascii=False, indent=1)
+    sys.stdout.write("\n")
+    return 0
+
+
+def cmd_diff(args) -> int:
+    """Compara duas versões do histórico (ou uma planilha atual com uma versão)."""
+    core.configurar_diretorios(snap_dir=args.snap_dir)
+    antigo = core.carregar_snapshot(args.de)
+    if args.para and os.path.exists(args.para):
+        hoje = date.fromisoformat(args.hoje) if args.hoje else date.today()
+        novo = _carregar(args.para, hoje)
+    else:
+        novo = core.carregar_snapshot(args.para)
+    if antigo is None or novo is None:
+        print("versão não encontrada no histórico", file=sys.stderr)
+        return 2
+    tabelas = dict(zip(TABELAS_DIFF, core.calcular_diferencas(novo, antigo)))
+    if args.saida:
+        os.makedirs(args.saida, exist_ok=True)
+        for tabela, df in tabelas.items():
+            _gravar_tabela(df, os.path.join(args.saida, f"{tabela}.{args.formato}"), args.formato)
+    json.dump(_resumo_diff(tabelas), sys.stdout, ensure_ascii=False)
+    sys.stdout.write("\n")
+    return 0
+
+
+# ======================== ARGUMENTOS ========================
+def montar_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Controle de Reparos em lote (sem interface).")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    def comuns(p):
+        p.add_argument("--snap-dir", default=core.SNAP_DIR,
+                       help="histórico de snapshots; aceita {nome} (nome da planilha) para um histórico por arquivo")
+        p.add_argument("--saida", help="diretório onde gravar KPIs/diferenças")
+        p.add_argument("--formato", choices=["json", *core.FORMATOS_EXPORTACAO], default="json")
+        p.add_argument("--hoje", help="data de referência dos prazos (AAAA-MM-DD); padrão: hoje")
+
+    p = sub.add_parser("processar", help="ingere planilhas (arquivos ou diretórios) e emite KPIs")
+    p.add_argument("entradas", nargs="+")
+    p.add_argument("--snapshot", action="store_true", help="compara com a última versão e salva um snapshot")
+    p.add_argument("--juntar", metavar="NOME",
+                   help="junta todas as abas de todas as entradas (globs aceitos) num único dataset NOME, lido em paralelo")
+    p.add_argument("--processos", type=int, help="processos para --juntar (padrão: núcleos disponíveis)")
+    p.add_argument("--vista", default="Todos os itens", choices=["Todos os itens", *core.VISTAS])
+    p.add_argument("--status", default="(Todos)")
+    p.add_argument("--sit", default="(Todos)")
+    p.add_argument("--prefixo", default="")
+    p.add_argument("--busca", default="")
+    p.add_argument("--faixa-os", nargs=2, metavar=("DE", "ATE"),
+                   help="só OS entre DE e ATE, inclusive (AAAA/MM ou AAAA/MM/NNNN)")
+    comuns(p)
+    p.set_defaults(func=cmd_processar)
+
+    p = sub.add_parser("diff", help="diferenças entre duas versões do histórico")
+    p.add_argument("--de", required=True, help="versão antiga")
+    p.add_argument("--para", help="versão nova ou caminho de planilha; padrão: a versão mais recente")
+    comuns(p)
+    p.set_defaults(func=cmd_diff)
+
+    p = sub.add_parser("versoes", help="lista as versões do histórico")
+    p.add_argument("--snap-dir", default=core.SNAP_DIR)
+    p.set_defaults(func=cmd_versoes)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = montar_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
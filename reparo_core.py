@@ -0,0 +1,2184 @@
+"""
+Núcleo do Controle de Reparos, sem Streamlit: leitura e normalização das planilhas,
+prazos, busca, filtros, diferenças e histórico de snapshots.
+Usado pelo dashboard (dashboard_reparo.py) e pela linha de comando (reparo_cli.py).
+"""
+# ======================== IMPORTS ========================
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from io import BytesIO
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+
+# ======================== SNAPSHOT CONFIG ========================
+# Histórico append-only: data/snapshots/dia=AAAA-MM-DD/<versao>.parquet + manifest.json
+SNAP_DIR = "data/snapshots"
+SNAP_MANIFESTO = os.path.join(SNAP_DIR, "manifest.json")
+SNAP_LEGADO = "data/_ultimo_snapshot.parquet"  # formato antigo (um único arquivo), migrado na 1ª leitura
+SNAP_RETER_DIAS = 14       # até aqui, todas as versões
+SNAP_RETER_DIARIOS = 90    # até aqui, só a última versão de cada dia; depois disso, nada
+SNAP_MAX_VERSOES = 200     # teto absoluto (as mais novas ficam)
+
+# ======================== CACHE EM DISCO CONFIG ========================
+# Frames já normalizados (sem prazos), em parquet, indexados pela versão da fonte.
+CACHE_DIR = "data/_cache"
+CACHE_MAX_ARQUIVOS = 32
+_CACHE_VERSAO = 3  # incremente ao mudar a normalização: invalida o que já está em disco
+
+
+def configurar_diretorios(snap_dir: str | None = None, cache_dir: str | None = None) -> None:
+    """Troca os diretórios do histórico de snapshots e do cache em disco (criados na 1ª gravação)."""
+    global SNAP_DIR, SNAP_MANIFESTO, CACHE_DIR
+    if snap_dir is not None:
+        SNAP_DIR = snap_dir
+        SNAP_MANIFESTO = os.path.join(SNAP_DIR, "manifest.json")
+    if cache_dir is not None:
+        CACHE_DIR = cache_dir
+
+
+# ======================== HELPERS ========================
+def _norm(s: str) -> str:
+    s = str(s)
+    s = unicodedata.normalize("NFKD", s)
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return re.sub(r"\s+", " ", s).strip()
+
+
+def _choose_engine(path: str | BytesIO | None) -> str | None:
+    if isinstance(path, str):
+        low = path.lower()
+        if low.endswith(".xlsb"):
+            return "pyxlsb"
+        if low.endswith(".xlsx"):
+            return "openpyxl"
+        if low.endswith(".xls"):
+            return "xlrd"
+    elif isinstance(path, BytesIO):
+        # upload sem nome: identifica pelo conteúdo (OLE2 = xls; zip = xlsx ou xlsb)
+        with path.getbuffer() as buf:
+            cabecalho = bytes(buf[:8])
+        if cabecalho.startswith(b"\xd0\xcf\x11\xe0"):
+            return "xlrd"
+        if cabecalho.startswith(b"PK"):
+            try:
+                with zipfile.ZipFile(path) as z:
+                    return "pyxlsb" if "xl/workbook.bin" in z.namelist() else "openpyxl"
+            except zipfile.BadZipFile:
+                return None
+            finally:
+                path.seek(0)
+    return None
+
+
+# (regex do texto, formato explícito) — testados em ordem, cada valor distinto entra na 1ª classe que casar
+_FORMATOS_DATA = [
+    (r"^\d{4}-\d{2}-\d{2}$", "%Y-%m-%d"),
+    (r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?$", "ISO8601"),
+    (r"^\d{1,2}/\d{1,2}/\d{4}$", "%d/%m/%Y"),
+    (r"^\d{1,2}/\d{1,2}/\d{2}$", "%d/%m/%y"),
+    (r"^\d{1,2}/\d{1,2}/\d{4} \d{1,2}:\d{2}:\d{2}$", "%d/%m/%Y %H:%M:%S"),
+    (r"^\d{1,2}/\d{1,2}/\d{4} \d{1,2}:\d{2}$", "%d/%m/%Y %H:%M"),
+]
+_EXCEL_EPOCH = pd.Timestamp("1899-12-30")
+# seriais fora desta janela (1954..2119) não são datas de reparo: um '1' ou '12345' perdido
+# na coluna vira NaT ("Sem data"), não 31/12/1899 ("Em atraso")
+_EXCEL_SERIAL_MIN = 20_000  # 03/10/1954
+_EXCEL_SERIAL_MAX = 80_000  # 11/01/2119
+_NAO_DATA = {"", "nan", "NaN", "NaT", "None", "<NA>"}
+
+
+def _datas_unicas(valores: np.ndarray) -> np.ndarray:
+    """Converte valores distintos (não nulos) em datetime64[ns], por classe de formato."""
+    out = np.full(len(valores), np.datetime64("NaT"), dtype="datetime64[ns]")
+    if not len(valores):
+        return out
+    s = pd.Series(valores, dtype=object)
+    eh_data = s.map(lambda v: isinstance(v, (datetime, date, np.datetime64))).to_numpy(bool)
+    eh_num = s.map(lambda v: isinstance(v, (int, float, np.number)) and not isinstance(v, bool)).to_numpy(bool)
+    texto = s.astype(str).str.strip()
+    # seriais do Excel gravados como texto (5 dígitos; valem só dentro da janela acima)
+    eh_num_txt = texto.str.match(r"^\d{5}(\.\d+)?$").to_numpy(bool) & ~eh_data & ~eh_num
+
+    if eh_data.any():
+        out[eh_data] = pd.to_datetime(s[eh_data], errors="coerce").to_numpy("datetime64[ns]")
+
+    serial_mask = eh_num | eh_num_txt
+    if serial_mask.any():
+        serial = pd.to_numeric(texto[serial_mask], errors="coerce").to_numpy(float, copy=True)
+        serial[(serial < _EXCEL_SERIAL_MIN) | (serial > _EXCEL_SERIAL_MAX)] = np.nan
+        out[serial_mask] = (_EXCEL_EPOCH + pd.to_timedelta(serial, unit="D")).to_numpy("datetime64[ns]")
+
+    resto = ~(eh_data | serial_mask) & ~texto.isin(_NAO_DATA).to_numpy(bool)
+    for regex, fmt in _FORMATOS_DATA:
+        if not resto.any():
+            break
+        mask = resto & texto.str.match(regex).to_numpy(bool)
+        if mask.any():
+            out[mask] = pd.to_datetime(texto[mask], format=fmt, errors="coerce").to_numpy("datetime64[ns]")
+            resto &= ~mask
+    if resto.any():
+        # formatos fora das classes conhecidas: parser genérico, valor a valor
+        out[resto] = pd.to_datetime(
+            texto[resto], dayfirst=True, format="mixed", errors="coerce"
+        ).to_numpy("datetime64[ns]")
+    return out
+
+
+def parse_mixed_dates(series: pd.Series) -> pd.Series:
+    """
+    Datas mistas (datetime, serial do Excel, ISO, dd/mm/aaaa, dd/mm/aa) -> datetime64[ns].
+    Cada string distinta é convertida uma única vez, com formato explícito por classe.
+
+    Células de data do Excel (datetime/date/Timestamp) valem como estão: a versão antiga as
+    passava por str + dayfirst e trocava dia e mês quando o dia era <= 12 (12/11/2025 virava
+    11/12/2025). Seriais do Excel (número, ou texto de 5 dígitos) e dd/mm/aa, que saíam NaT
+    ("Sem data"), agora viram data; seriais só dentro de [_EXCEL_SERIAL_MIN, _EXCEL_SERIAL_MAX],
+    fora disso continuam NaT. Um caso por classe em tests/test_datas.py.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.astype("datetime64[ns]")
+    codigos, unicos = pd.factorize(series, use_na_sentinel=True)
+    tabela = np.append(_datas_unicas(np.asarray(unicos, dtype=object)), np.datetime64("NaT", "ns"))
+    return pd.Series(tabela.take(codigos), index=series.index, name=series.name)
+
+
+def limpar_status(valor: str) -> str:
+    """
+    Exibição do Status:
+      - PO/P.O + 'fechad' -> 'P.O Fechada'
+      - PO/P.O -> 'P.O'
+      - 'não/nao/n?o comprad' -> 'Não comprado'
+      - senão, mantém
+    """
+    if pd.isna(valor):
+        return valor
+    raw = str(valor).strip()
+    n = _norm(raw).lower()
+    has_po = bool(re.search(r"\b(?:p\s*\.?\s*o|po)\b", n))
+    closed = "fechad" in n
+    nao_comprado = ("nao comprad" in n) or ("não comprad" in raw.lower()) or ("n?o comprad" in raw.lower())
+    if nao_comprado:
+        return "Não comprado"
+    if has_po and closed:
+        return "P.O Fechada"
+    if has_po:
+        return "P.O"
+    return raw
+
+
+def normalizar_os(val) -> str | None:
+    """
+    Aceita variações de OS como: 2025/08/0053, 2025-8-53, ' 2025 / 08 / 53 '
+    e normaliza para 'YYYY/MM/NNNN'. Retorna None se não for um formato válido.
+    """
+    if pd.isna(val):
+        return None
+    s = str(val).strip()
+    m = re.match(r"^\s*(\d{4})\s*[/-]\s*(\d{1,2})\s*[/-]\s*(\d{3,5})\s*$", s)
+    if not m:
+        return None
+    ano = int(m.group(1))
+    mes = int(m.group(2))
+    seq = m.group(3)
+    if not (1 <= mes <= 12):
+        return None
+    try:
+        seq_int = int(seq)
+    except ValueError:
+        return None
+    return f"{ano:04d}/{mes:02d}/{seq_int:04d}"
+
+
+# ======================== NORMALIZAÇÃO POR VALORES ÚNICOS ========================
+# Status e Orç/OS têm poucas centenas de valores distintos: normaliza só os únicos
+# e guarda o resultado num memo limitado, compartilhado entre cargas.
+MEMO_MAX = 50_000
+_MEMO_STATUS: dict = {}
+_MEMO_OS: dict = {}
+_memo_lock = threading.Lock()
+
+_RE_OS = r"^\s*(\d{4})\s*[/-]\s*(\d{1,2})\s*[/-]\s*(\d{3,5})\s*$"
+
+
+def _os_unicos(valores: list) -> list:
+    """Versão vetorizada de normalizar_os para uma lista de valores não nulos."""
+    s = pd.Series(valores, dtype=object).astype(str).str.strip()
+    partes = s.str.extract(_RE_OS)
+    out = [None] * len(valores)
+    achados = partes.dropna()
+    for i, ano, mes, seq in zip(np.flatnonzero(partes[0].notna().to_numpy()), achados[0], achados[1], achados[2]):
+        mes = int(mes)
+        if 1 <= mes <= 12:
+            out[i] = f"{int(ano):04d}/{mes:02d}/{int(seq):04d}"
+    return out
+
+
+def _status_unicos(valores: list) -> list:
+    return [limpar_status(v) for v in valores]
+
+
+def _normalizar_por_unicos(serie: pd.Series, memo: dict, funcao, vazio=None, manter_nulos=False) -> pd.Series:
+    """
+    Aplica `funcao` (lista de valores -> lista de resultados) apenas aos valores únicos
+    ainda fora do memo e espalha o resultado pelos códigos do factorize.
+    Nulos recebem `vazio` (ou o próprio valor, com manter_nulos=True).
+    """
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=True)
+    unicos = list(unicos)
+    with _memo_lock:  # acertos copiados aqui: outra carga pode descartá-los do memo depois
+        conhecidos = {u: memo[u] for u in unicos if u in memo}
+    faltando = [u for u in unicos if u not in conhecidos]
+    if faltando:
+        novos = funcao(faltando)
+        conhecidos.update(zip(faltando, novos))
+        with _memo_lock:
+            memo.update(zip(faltando, novos))
+            excesso = len(memo) - MEMO_MAX
+            if excesso > 0:  # descarta os mais antigos (ordem de inserção)
+                for k in list(memo)[:excesso]:
+                    del memo[k]
+    resultado = [conhecidos[u] for u in unicos]
+    tabela = np.empty(len(resultado) + 1, dtype=object)
+    tabela[:-1] = resultado
+    tabela[-1] = vazio
+    valores = tabela.take(codigos)
+    if manter_nulos:
+        nulos = codigos == -1
+        valores[nulos] = serie.to_numpy(dtype=object)[nulos]
+    return pd.Series(valores, index=serie.index, name=serie.name).infer_objects()
+
+
+def limpar_status_serie(serie: pd.Series) -> pd.Series:
+    """Equivalente a serie.apply(limpar_status), calculado por valor único."""
+    return _normalizar_por_unicos(serie, _MEMO_STATUS, _status_unicos, manter_nulos=True)
+
+
+def normalizar_os_serie(serie: pd.Series) -> pd.Series:
+    """Equivalente a serie.map(normalizar_os), com regex vetorizada sobre os únicos."""
+    return _normalizar_por_unicos(serie, _MEMO_OS, _os_unicos)
+
+
+# ======================== CACHE EM DISCO ========================
+def chave_fonte(path: str | BytesIO, aba: str | None = None) -> str | None:
+    """
+    Identifica a versão da fonte como '<origem>_<versao>':
+      - arquivo local: hash do caminho absoluto (+ aba, se indicada) + (mtime, tamanho)
+      - upload (BytesIO): SHA-256 do conteúdo
+    Retorna None quando a fonte não pode ser identificada (sem cache).
+    """
+    if isinstance(path, str):
+        try:
+            info = os.stat(path)
+        except OSError:
+            return None
+        origem = os.path.abspath(path) if aba is None else f"{os.path.abspath(path)}\x00{aba}"
+        origem = hashlib.sha1(origem.encode("utf-8")).hexdigest()[:16]
+        versao = f"{info.st_mtime_ns}:{info.st_size}:{_CACHE_VERSAO}"
+        return f"{origem}_{hashlib.sha1(versao.encode()).hexdigest()[:16]}"
+    if isinstance(path, BytesIO):
+        with path.getbuffer() as buf:
+            return chave_bytes(buf)
+    return None
+
+
+def chave_bytes(dados) -> str:
+    """Chave de um upload: SHA-256 do conteúdo (bytes ou memoryview, sem cópia)."""
+    return f"up{hashlib.sha256(dados).hexdigest()[:32]}_v{_CACHE_VERSAO}"
+
+
+def _arquivo_cache(chave: str) -> str:
+    return os.path.join(CACHE_DIR, f"{chave}.parquet")
+
+
+def _ler_cache(chave: str | None) -> pd.DataFrame | None:
+    if chave is None:
+        return None
+    arquivo = _arquivo_cache(chave)
+    if not os.path.exists(arquivo):
+        return None
+    try:
+        df = pd.read_parquet(arquivo, memory_map=True)
+    except Exception:
+        return None
+    try:
+        os.utime(arquivo)  # marca uso recente (LRU por mtime)
+    except OSError:
+        pass
+    return df
+
+
+def _limpar_cache(chave_atual: str) -> None:
+    """Remove versões antigas da mesma origem e mantém no máximo CACHE_MAX_ARQUIVOS."""
+    origem = chave_atual.split("_", 1)[0]
+    restantes = []
+    for nome in os.listdir(CACHE_DIR):
+        arquivo = os.path.join(CACHE_DIR, nome)
+        if not nome.endswith(".parquet"):
+            continue
+        if nome.split("_", 1)[0] == origem and nome != f"{chave_atual}.parquet":
+            try:
+                os.remove(arquivo)
+            except OSError:
+                pass
+            continue
+        try:
+            restantes.append((os.path.getmtime(arquivo), arquivo))
+        except OSError:
+            pass
+    restantes.sort(reverse=True)
+    for _, arquivo in restantes[CACHE_MAX_ARQUIVOS:]:
+        try:
+            os.remove(arquivo)
+        except OSError:
+            pass
+
+
+def _gravar_cache(chave: str | None, df: pd.DataFrame) -> None:
+    if chave is None:
+        return
+    arquivo = _arquivo_cache(chave)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, arquivo)  # escrita atômica: leitores nunca veem arquivo parcial
+    except Exception:
+        # sem parquet (ou tipos não suportados): segue sem cache em disco
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return
+    _limpar_cache(chave)
+
+
+# ======================== ESQUEMA COMPACTO ========================
+# Textos repetitivos (Status, Sit, Prefixo, Insumo...) viram category: códigos int8/int16
+# + uma cópia de cada valor. Textos quase únicos (P/N, Orç/OS) seguem como texto (Arrow).
+LIMIAR_CATEGORIA = 0.5  # fração máxima de valores distintos para virar category
+_INTEIROS = (np.int16, np.int32, np.int64)
+
+
+def _inteiro_compacto(valores: np.ndarray) -> type:
+    """Menor inteiro (a partir de int16) que comporta `valores`."""
+    if not len(valores):
+        return np.int16
+    lo, hi = valores.min(), valores.max()
+    for tipo in _INTEIROS:
+        info = np.iinfo(tipo)
+        if info.min <= lo and hi <= info.max:
+            return tipo
+    return np.int64
+
+
+def empacotar_os(serie: pd.Series) -> pd.Series:
+    """
+    'YYYY/MM/NNNN' -> ano * 10**7 + mês * 10**5 + sequência (int64, ordena igual à OS).
+    Converte só os valores distintos; nulos/inválidos viram -1.
+    """
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=True)
+    partes = pd.Series(unicos, dtype=object).astype(str).str.extract(r"^(\d{4})/(\d{2})/(\d+)$")
+    ok = partes.notna().all(axis=1).to_numpy()
+    num = np.full(len(unicos) + 1, -1, dtype=np.int64)
+    if ok.any():
+        p = partes[ok].astype(np.int64)
+        num[:-1][ok] = p[0].to_numpy() * 10**7 + p[1].to_numpy() * 10**5 + p[2].to_numpy()
+    return pd.Series(num.take(codigos), index=serie.index, name="__os_num")
+
+
+def compactar_base(df: pd.DataFrame, empacotar: bool = True) -> pd.DataFrame:
+    """
+    Esquema compacto em memória (altera `df`): textos com poucos valores distintos -> category,
+    inteiros -> menor tipo a partir de int16, e 'Orç/OS' empacotada em '__os_num'
+    (com empacotar=False, quem chama já preencheu '__os_num').
+    """
+    n = len(df)
+    for col in df.columns:
+        serie = df[col]
+        if col.startswith("__") or isinstance(serie.dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.is_object_dtype(serie.dtype) or pd.api.types.is_string_dtype(serie.dtype):
+            if n and serie.nunique(dropna=False) <= LIMIAR_CATEGORIA * n:
+                df[col] = serie.astype("category")
+        elif pd.api.types.is_integer_dtype(serie.dtype) and isinstance(serie.dtype, np.dtype):
+            tipo = _inteiro_compacto(serie.to_numpy())
+            if np.dtype(tipo).itemsize < serie.dtype.itemsize:
+                df[col] = serie.astype(tipo)
+    if empacotar and "Orç/OS" in df.columns:
+        df["__os_num"] = empacotar_os(df["Orç/OS"])
+    return df
+
+
+def memoria_base(df: pd.DataFrame) -> int:
+    """Bytes ocupados pelo frame (colunas + índice, contando os buffers de texto)."""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def _somente_leitura(valores: np.ndarray) -> np.ndarray:
+    valores = valores.view()  # a flag vale para esta visão; os dados não são copiados
+    valores.flags.writeable = False
+    return valores
+
+
+def congelar(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    O mesmo frame sobre buffers somente leitura, sem copiar os dados, para ser compartilhado
+    entre sessões/threads: escrever em colunas numéricas, datas e category levanta erro em vez
+    de alterar a base de todo mundo (textos ficam em buffers Arrow, já imutáveis). Filtros,
+    iloc e colunas derivadas continuam funcionando (viram objetos novos).
+    """
+    colunas = {}
+    for col in df.columns:
+        valores = df[col].array
+        if isinstance(valores, pd.Categorical):
+            valores = pd.Categorical.from_codes(_somente_leitura(valores.codes), dtype=valores.dtype)
+        elif isinstance(valores, pd.arrays.IntegerArray):
+            valores = pd.arrays.IntegerArray(_somente_leitura(valores._data), _somente_leitura(valores._mask))
+        elif isinstance(valores, (pd.arrays.NumpyExtensionArray, pd.arrays.DatetimeArray)):
+            valores = _somente_leitura(df[col].to_numpy())
+        colunas[col] = valores
+    return pd.DataFrame(colunas, index=df.index, copy=False)
+
+
+# ======================== LOAD ========================
+COLUNAS_IMPORTANTES = [
+    "Status","Sit","Prefixo","Orç/OS","Item",
+    "P/N Compras","P/N Removido","S/N Removido",
+    "Insumo","Enviar até","Retornar até",
+    "Motivo","Condição","Qtdade"
+]
+
+# renomes comuns por encoding
+MAPA_RENOME = {
+    "Or?/OS":"Orç/OS","Orc/OS":"Orç/OS",
+    "Enviar at?":"Enviar até","Retornar at?":"Retornar até",
+    "Condi??o":"Condição","Condicao":"Condição",
+}
+
+LEITURA_CHUNK = 5_000  # linhas por bloco na leitura em streaming
+
+
+def _mapear_colunas(cabecalho) -> dict[int, str]:
+    """
+    Posição -> nome final para as colunas de COLUNAS_IMPORTANTES presentes no cabeçalho
+    (MAPA_RENOME primeiro, depois aproximação por nome normalizado). A primeira ocorrência vence.
+    """
+    alvo_norm = {_norm(a): a for a in COLUNAS_IMPORTANTES}
+    posicoes: dict[int, str] = {}
+    usados = set()
+    for i, nome in enumerate(cabecalho):
+        if nome is None:
+            continue
+        nome = MAPA_RENOME.get(str(nome), str(nome))
+        alvo = nome if nome in COLUNAS_IMPORTANTES else alvo_norm.get(_norm(nome))
+        if alvo and alvo not in usados:
+            posicoes[i] = alvo
+            usados.add(alvo)
+    return posicoes
+
+
+def _escolher_aba(nomes: list[str], aba: str | None) -> str:
+    """A aba pedida; senão 'Worksheet' (nome do export); senão a primeira."""
+    if aba is not None:
+        return aba
+    return "Worksheet" if "Worksheet" in nomes else nomes[0]
+
+
+def _linhas_openpyxl(path: str | BytesIO, aba: str | None = None):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[_escolher_aba(wb.sheetnames, aba)]
+        ws.reset_dimensions()  # não confia na dimensão gravada pelo exportador
+        yield from ws.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _linhas_pyxlsb(path: str | BytesIO, aba: str | None = None):
+    from pyxlsb import open_workbook
+
+    with open_workbook(path) as wb:
+        with wb.get_sheet(_escolher_aba(wb.sheets, aba)) as sheet:
+            for row in sheet.rows():
+                yield tuple(c.v for c in row)
+
+
+def _linhas_xlrd(path: str | BytesIO, aba: str | None = None):
+    import xlrd
+
+    if isinstance(path, BytesIO):
+        wb = xlrd.open_workbook(file_contents=path.getvalue(), on_demand=True)
+    else:
+        wb = xlrd.open_workbook(path, on_demand=True)
+    try:
+        sheet = wb.sheet_by_name(_escolher_aba(wb.sheet_names(), aba))
+        for r in range(sheet.nrows):
+            valores = sheet.row_values(r)
+            for c, tipo in enumerate(sheet.row_types(r)):
+                if tipo == xlrd.XL_CELL_DATE:
+                    valores[c] = xlrd.xldate_as_datetime(valores[c], wb.datemode)
+                elif tipo in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+                    valores[c] = None
+            yield tuple(valores)
+    finally:
+        wb.release_resources()
+
+
+_LEITORES = {"openpyxl": _linhas_openpyxl, "pyxlsb": _linhas_pyxlsb, "xlrd": _linhas_xlrd}
+
+
+def _valor_celula(v):
+    # mesmas conversões do read_excel: vazio -> "" (vira NaN no parser), float inteiro -> int
+    if v is None:
+        return ""
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return v
+
+
+def _ler_planilha_streaming(path: str | BytesIO, aba: str | None = None) -> pd.DataFrame:
+    """Resolve o cabeçalho e lê, em blocos, apenas as colunas de COLUNAS_IMPORTANTES."""
+    from pandas.io.parsers import TextParser
+
+    engine = _choose_engine(path) or "openpyxl"
+    linhas = _LEITORES[engine](path, aba)
+    try:
+        posicoes = _mapear_colunas(next(linhas, ()))
+        nomes = list(posicoes.values())
+        idx = list(posicoes.keys())
+        blocos = []
+        bloco = []
+        for row in linhas:
+            n = len(row)
+            bloco.append([_valor_celula(row[i]) if i < n else "" for i in idx])
+            if len(bloco) >= LEITURA_CHUNK:
+                blocos.append(TextParser(bloco, header=None, names=nomes).read())
+                bloco = []
+        if bloco:
+            blocos.append(TextParser(bloco, header=None, names=nomes).read())
+    finally:
+        linhas.close()
+
+    if not blocos:
+        return pd.DataFrame(columns=[c for c in COLUNAS_IMPORTANTES if c in nomes])
+    df = pd.concat(blocos, ignore_index=True) if len(blocos) > 1 else blocos[0]
+    return df[[c for c in COLUNAS_IMPORTANTES if c in df.columns]]
+
+
+def _ler_planilha_pandas(path: str | BytesIO, aba: str | None = None) -> pd.DataFrame:
+    engine = _choose_engine(path)
+    try:
+        df = pd.read_excel(path, sheet_name=aba or "Worksheet", engine=engine)
+    except Exception:
+        if aba is not None:
+            raise
+        xls = pd.ExcelFile(path, engine=engine)
+        df = pd.read_excel(xls, sheet_name=xls.sheet_names[0])
+
+    posicoes = _mapear_colunas(df.columns)
+    df = df.iloc[:, list(posicoes.keys())].copy()
+    df.columns = list(posicoes.values())
+    return df[[c for c in COLUNAS_IMPORTANTES if c in df.columns]]
+
+
+def _ler_planilha(path: str | BytesIO, aba: str | None = None) -> pd.DataFrame:
+    """Lê só as colunas importantes; cai no read_excel se o leitor em streaming falhar."""
+    try:
+        return _ler_planilha_streaming(path, aba)
+    except Exception:
+        if isinstance(path, BytesIO):
+            path.seek(0)
+        return _ler_planilha_pandas(path, aba)
+
+
+def listar_abas(path: str | BytesIO) -> list[str]:
+    """Nomes das abas, na ordem do arquivo."""
+    if _choose_engine(path) in (None, "openpyxl"):
+        # xlsx: basta o workbook.xml; o openpyxl carregaria todas as sharedStrings só para isso
+        try:
+            with zipfile.ZipFile(path) as z:
+                raiz = ElementTree.fromstring(z.read("xl/workbook.xml"))
+            return [e.get("name") for e in raiz.iter() if e.tag.endswith("}sheet")]
+        except (KeyError, zipfile.BadZipFile, ElementTree.ParseError):
+            if isinstance(path, BytesIO):
+                path.seek(0)
+    with pd.ExcelFile(path, engine=_choose_engine(path)) as xls:
+        return list(xls.sheet_names)
+
+
+def _normalizar_bruto(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normaliza datas, textos, Qtdade, status e OS das linhas lidas (sem compactar). Linha a
+    linha: cada linha normalizada depende só dela mesma e dos tipos das colunas lidas.
+    """
+    # datas
+    for col in ["Enviar até","Retornar até"]:
+        if col in df.columns:
+            df[col] = parse_mixed_dates(df[col])
+
+    # textos e qtd
+    for col in df.select_dtypes(include=["object"]).columns:
+        df[col] = df[col].astype(str).str.strip()
+
+    if "Qtdade" in df.columns:
+        df["Qtdade"] = pd.to_numeric(df["Qtdade"], errors="coerce").fillna(0).astype(int)
+
+    # status limpo
+    if "Status" in df.columns:
+        df["Status"] = limpar_status_serie(df["Status"])
+
+    # OS normalizada (mantém só OS válidas)
+    if "Orç/OS" in df.columns:
+        df["__OS_norm"] = normalizar_os_serie(df["Orç/OS"])
+        df = df[df["__OS_norm"].notna()].copy()
+        df["Orç/OS"] = df["__OS_norm"]
+        df.drop(columns="__OS_norm", inplace=True)
+    return df
+
+
+def _normalizar_planilha(path: str | BytesIO, aba: str | None = None) -> pd.DataFrame:
+    """Lê xls/xlsx/xlsb (a aba `aba`, ou a padrão) e normaliza colunas, datas, status e OS (sem prazos)."""
+    return compactar_base(_normalizar_bruto(_ler_planilha(path, aba)))
+
+
+def carregar_base(path: str | BytesIO, chave: str | None = None) -> pd.DataFrame:
+    """
+    Carrega a base normalizada (cache em disco quando possível), sem os prazos.
+    `chave` evita recalcular chave_fonte quando quem chama já a conhece (ex.: digest do upload).
+    """
+    chave = chave or chave_fonte(path)
+    df = _ler_cache(chave)
+    if df is None:
+        df = _normalizar_planilha(path)
+        _gravar_cache(chave, df)
+    return df
+
+
+# ======================== CARGA INCREMENTAL ========================
+# Uma releitura da mesma planilha costuma mudar poucas centenas de linhas: cada linha lida
+# é identificada pelo hash do seu conteúdo bruto, e só as linhas novas ou alteradas passam
+# pela normalização; as demais são reaproveitadas da carga anterior.
+def _esquema_bruto(bruto: pd.DataFrame) -> list[tuple[str, str]]:
+    return [(str(c), str(t)) for c, t in bruto.dtypes.items()]
+
+
+def _descompactar(df: pd.DataFrame) -> pd.DataFrame:
+    """Desfaz as category de compactar_base ('__os_num' fica: é da própria linha)."""
+    df = df.copy()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(df[col].cat.categories.dtype)
+    return df
+
+
+def carregar_incremental(path: str | BytesIO, anterior: dict | None = None, aba: str | None = None) -> dict:
+    """
+    Lê `path` e normaliza só as linhas brutas que não existiam na carga `anterior` (retorno
+    anterior desta função). Resultado igual ao de _normalizar_planilha, em:
+      - "base": base normalizada e compacta (índice = posição da linha na planilha)
+      - "hashes" / "esquema": hash de cada linha bruta e tipos das colunas lidas
+      - "chaves": hash da chave do item (_chave_itens) de cada linha da base
+      - "delta": linhas da base que entraram ("novas") e linhas da base anterior que saíram
+        ("saiu"), por posição; None quando não há carga anterior comparável
+    Se os tipos das colunas lidas mudarem, a normalização é refeita por inteiro.
+    """
+    return _normalizar_incremental(_ler_planilha(path, aba), anterior)
+
+
+def _normalizar_incremental(bruto: pd.DataFrame, anterior: dict | None) -> dict:
+    bruto = bruto.reset_index(drop=True)
+    hashes = pd.util.hash_pandas_object(bruto, index=False).to_numpy()
+    esquema = _esquema_bruto(bruto)
+    if anterior is None or anterior["esquema"] != esquema:
+        return _carga(compactar_base(_normalizar_bruto(bruto)), hashes, esquema, None)
+
+    # casa linhas idênticas por (hash, nº da ocorrência): linhas repetidas não se multiplicam
+    h_ant = anterior["hashes"]
+    m = pd.DataFrame({"h": hashes, "o": _ocorrencia(hashes)}).merge(
+        pd.DataFrame({"h": h_ant, "o": _ocorrencia(h_ant), "p": np.arange(len(h_ant))}),
+        on=["h", "o"], how="left", sort=False,
+    )
+    p_ant = m["p"].to_numpy(np.float64)
+    casada = ~np.isnan(p_ant)
+    base_ant = anterior["base"]
+    linha_ant = np.full(len(h_ant), -1, dtype=np.int64)  # linha bruta anterior -> linha da base (-1: descartada)
+    linha_ant[base_ant.index.to_numpy()] = np.arange(len(base_ant))
+    reaproveitadas = np.flatnonzero(casada)
+    origem = linha_ant[p_ant[casada].astype(np.int64)]
+    mantidas = origem >= 0
+
+    novas = np.flatnonzero(~casada)
+    saiu = np.setdiff1d(np.arange(len(h_ant)), p_ant[casada].astype(np.int64))
+    if not mantidas.any():  # nada a reaproveitar
+        carga = _carga(compactar_base(_normalizar_bruto(bruto)), hashes, esquema, None)
+        carga["delta"] = {"novas": np.arange(len(carga["base"])), "saiu": np.arange(len(base_ant))}
+        return carga
+    partes = [_descompactar(base_ant.iloc[origem[mantidas]]).set_axis(reaproveitadas[mantidas])]
+    chaves = [anterior["chaves"][origem[mantidas]]]
+    normalizadas = _normalizar_bruto(bruto.iloc[novas])
+    if len(normalizadas):
+        if "Orç/OS" in normalizadas.columns:
+            normalizadas["__os_num"] = empacotar_os(normalizadas["Orç/OS"])
+        partes.append(normalizadas)
+        chaves.append(_hash_chaves(normalizadas))
+    base = pd.concat(partes) if len(partes) > 1 else partes[0]
+    ordem = np.argsort(base.index.to_numpy(), kind="stable")  # volta à ordem da planilha
+    base, chaves = base.iloc[ordem], np.concatenate(chaves)[ordem]
+    for col in base.columns:
+        if pd.api.types.is_object_dtype(base[col].dtype):
+            base[col] = base[col].infer_objects()  # o concat de str com só-nulos vira object
+    delta = {
+        "novas": np.flatnonzero(np.isin(base.index.to_numpy(), novas)),
+        "saiu": linha_ant[saiu][linha_ant[saiu] >= 0],
+    }
+    return _carga(compactar_base(base, empacotar=False), hashes, esquema, delta, chaves)
+
+
+def _hash_chaves(base: pd.DataFrame) -> np.ndarray:
+    return pd.util.hash_pandas_object(_chave_itens(base), index=False).to_numpy()
+
+
+def _carga(base: pd.DataFrame, hashes: np.ndarray, esquema: list, delta: dict | None,
+           chaves: np.ndarray | None = None) -> dict:
+    chaves = _hash_chaves(base) if chaves is None else chaves  # hash da chave do item, por linha
+    return {"base": base, "hashes": hashes, "esquema": esquema, "chaves": chaves, "delta": delta}
+
+
+def diferencas_incrementais(carga: dict, anterior: dict) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    calcular_diferencas(carga["base"], anterior["base"]) a partir do delta: compara só os itens
+    cujas chaves aparecem em linhas novas ou que saíram (todas as ocorrências dessas chaves,
+    para casar repetições na mesma ordem), em vez das duas bases inteiras.
+    """
+    base, base_ant = carga["base"], anterior["base"]
+    if carga["delta"] is None:
+        return calcular_diferencas(base, base_ant)
+    tocadas = np.union1d(carga["chaves"][carga["delta"]["novas"]], anterior["chaves"][carga["delta"]["saiu"]])
+    em_a = np.flatnonzero(np.isin(carga["chaves"], tocadas))
+    em_b = np.flatnonzero(np.isin(anterior["chaves"], tocadas))
+    return calcular_diferencas(base.iloc[em_a], base_ant.iloc[em_b])
+
+
+# ======================== VÁRIAS PLANILHAS (PARALELO) ========================
+EXTENSOES_PLANILHA = (".xlsx", ".xlsm", ".xls", ".xlsb")
+
+
+def expandir_fontes(fontes: list[str]) -> list[str]:
+    """Arquivos, pastas e padrões glob -> planilhas (caminhos absolutos, sem repetição nem '~$' do Excel)."""
+    arquivos = []
+    for fonte in fontes:
+        fonte = os.path.expanduser(fonte.strip())
+        if not fonte:
+            continue
+        if os.path.isdir(fonte):
+            candidatos = [os.path.join(fonte, nome) for nome in os.listdir(fonte)]
+        elif any(ch in fonte for ch in "*?["):
+            candidatos = glob.glob(fonte, recursive=True)
+        else:
+            arquivos.append(os.path.abspath(fonte))  # caminho explícito: se não existir, o erro vem na leitura
+            continue
+        arquivos += sorted(
+            os.path.abspath(c) for c in candidatos
+            if os.path.isfile(c)
+            and c.lower().endswith(EXTENSOES_PLANILHA)
+            and not os.path.basename(c).startswith("~$")
+        )
+    return list(dict.fromkeys(arquivos))
+
+
+def chave_fontes(arquivos: list[str]) -> str | None:
+    """Versão de um conjunto de planilhas: muda se qualquer uma mudar (ou entrar/sair do conjunto)."""
+    chaves = [chave_fonte(a) for a in arquivos]
+    if not chaves or None in chaves:
+        return None
+    return "multi" + hashlib.sha1("\n".join(chaves).encode()).hexdigest()[:32]
+
+
+def _nucleos() -> int:
+    try:
+        return len(os.sched_getaffinity(0))  # respeita limites de CPU do container
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _ler_aba(arquivo: str, aba: str, cache_dir: str) -> pd.DataFrame:
+    """Tarefa do pool: uma aba normalizada, com o cache em disco de quem chamou."""
+    if cache_dir != CACHE_DIR:
+        configurar_diretorios(cache_dir=cache_dir)
+    chave = chave_fonte(arquivo, aba)
+    df = _ler_cache(chave)
+    if df is None:
+        df = _normalizar_planilha(arquivo, aba)
+        _gravar_cache(chave, df)
+    return df
+
+
+def _deduplicar_fontes(base: pd.DataFrame) -> pd.DataFrame:
+    """
+    Item (mesma chave de _chave_itens) presente em mais de uma fonte: fica o da última fonte
+    (a mais recente). Repetições dentro de uma mesma fonte são itens distintos e ficam todas.
+    """
+    chave = _chave_itens(base)
+    ocorrencia = chave.groupby([base["Fonte"].to_numpy(), chave.to_numpy()]).cumcount()
+    repetido = pd.DataFrame({"k": chave, "o": ocorrencia}).duplicated(keep="last").to_numpy()
+    return base[~repetido].reset_index(drop=True)
+
+
+def carregar_varias(fontes: list[str], processos: int | None = None) -> pd.DataFrame:
+    """
+    Lê todas as abas de todas as planilhas em `fontes` (arquivos, pastas ou globs) num pool de
+    processos (o parse do openpyxl é CPU-bound e preso ao GIL) e junta tudo com a coluna 'Fonte'.
+    Abas sem nenhuma coluna de chave (resumos, gráficos...) são ignoradas.
+    """
+    arquivos = sorted(expandir_fontes(fontes), key=os.path.getmtime)  # antigas primeiro: a recente vence
+    if not arquivos:
+        raise FileNotFoundError(f"nenhuma planilha em: {', '.join(fontes)}")
+    tarefas = [(arquivo, aba) for arquivo in arquivos for aba in listar_abas(arquivo)]
+    frames = [_ler_cache(chave_fonte(arquivo, aba)) for arquivo, aba in tarefas]
+    pendentes = [i for i, df in enumerate(frames) if df is None]  # só o que não está no cache em disco
+    # as maiores primeiro, para não sobrar um arquivo grande sozinho no fim
+    pendentes.sort(key=lambda i: -os.path.getsize(tarefas[i][0]))
+    n = min(processos or _nucleos(), len(pendentes))
+    if n > 1:
+        # spawn: o processo pai tem threads (Streamlit, vigia), e fork com threads não é seguro
+        contexto = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(n, mp_context=contexto) as pool:
+            futuros = {i: pool.submit(_ler_aba, *tarefas[i], CACHE_DIR) for i in pendentes}
+            for i, futuro in futuros.items():
+                frames[i] = futuro.result()
+    else:
+        for i in pendentes:
+            frames[i] = _ler_aba(*tarefas[i], CACHE_DIR)
+
+    partes = [
+        df.assign(Fonte=f"{os.path.basename(arquivo)} › {aba}")
+        for (arquivo, aba), df in zip(tarefas, frames)
+        if len(df) and any(c in df.columns for c in COLUNAS_CHAVE)
+    ]
+    if not partes:
+        return pd.DataFrame(columns=[*COLUNAS_IMPORTANTES, "Fonte"])
+    base = pd.concat(partes, ignore_index=True)
+    base["Fonte"] = base["Fonte"].astype("category")
+    base = _deduplicar_fontes(base)
+    base["Fonte"] = base["Fonte"].cat.remove_unused_categories()
+    return compactar_base(base)  # o concat desfaz as category com categorias diferentes
+
+
+# ======================== UPLOADS EM MEMÓRIA ========================
+# Bases de uploads já lidas, por digest do conteúdo, em LRU limitado pelo tamanho em memória.
+UPLOAD_CACHE_MAX_MB = 512
+_UPLOADS: OrderedDict[str, tuple[pd.DataFrame, int]] = OrderedDict()
+_uploads_lock = threading.Lock()
+
+
+def carregar_upload(arquivo: BytesIO, chave: str) -> pd.DataFrame:
+    """Base do upload `chave`; lê `arquivo` (ou o cache em disco) só na primeira vez."""
+    with _uploads_lock:
+        if chave in _UPLOADS:
+            _UPLOADS.move_to_end(chave)
+            return _UPLOADS[chave][0]
+    arquivo.seek(0)
+    df = carregar_base(arquivo, chave=chave)
+    tamanho = int(df.memory_usage(deep=True).sum())
+    with _uploads_lock:
+        _UPLOADS[chave] = (df, tamanho)
+        total = sum(t for _, t in _UPLOADS.values())
+        while total > UPLOAD_CACHE_MAX_MB * 1024**2 and len(_UPLOADS) > 1:
+            _, (_, liberado) = _UPLOADS.popitem(last=False)
+            total -= liberado
+    return df
+
+
+# ======================== VIGIA DE ARQUIVO ========================
+VIGIA_INTERVALO = 5.0  # segundos entre verificações de (mtime, tamanho)
+VIGIA_ESTAVEL = 2.0    # o arquivo precisa ficar este tempo sem mudar antes de ser relido
+
+
+def _assinatura(path: str) -> tuple[int, int] | None:
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return info.st_mtime_ns, info.st_size
+
+
+def _recarregar(vigia: dict, assinatura: tuple[int, int]) -> bool:
+    """
+    Lê a versão `assinatura` do arquivo e a publica. Se o arquivo mudar durante a leitura
+    (export ainda gravando), descarta o resultado sem tocar no cache em disco.
+    Vinda do cache em disco, a versão não traz hashes de linha nem diferenças: a carga é
+    refeita depois, na thread do vigia (_preparar_carga).
+    """
+    path = vigia["path"]
+    chave = chave_fonte(path)
+    df = _ler_cache(chave)
+    novo = df is None
+    if novo:
+        # só as linhas novas/alteradas desde a última leitura passam pela normalização
+        carga = carregar_incremental(path, vigia["carga"])
+        df = carga["base"]
+    if _assinatura(path) != assinatura:
+        return False
+    if novo:
+        _gravar_cache(chave, df)
+        anterior = vigia["carga"]
+        vigia["mudancas"] = diferencas_incrementais(carga, anterior) if anterior is not None else None
+        vigia["carga"] = carga
+    else:
+        vigia["mudancas"] = None  # diferenças da leitura anterior não valem para esta versão
+        vigia["carga"] = None
+        vigia["carga_tentada"] = None
+    vigia["atual"] = (chave, df)  # troca atômica: quem lê pega a tupla inteira, velha ou nova
+    vigia["assinatura"] = assinatura
+    vigia["atualizado_em"] = datetime.now()
+    vigia["erro"] = None
+    return True
+
+
+def _preparar_carga(vigia: dict) -> None:
+    """
+    Hashes de linha da versão publicada, quando ela veio do cache em disco: sem eles a
+    próxima releitura normalizaria tudo e não teria diferenças. Uma tentativa por versão.
+    """
+    assinatura = vigia["assinatura"]
+    if vigia["carga"] is not None or vigia["carga_tentada"] == assinatura:
+        return
+    vigia["carga_tentada"] = assinatura
+    try:
+        carga = carregar_incremental(vigia["path"])
+    except Exception:
+        return  # ilegível agora: a próxima releitura faz a carga completa
+    if _assinatura(vigia["path"]) == assinatura == vigia["assinatura"]:
+        vigia["carga"] = carga
+
+
+def _vigiar(vigia: dict, intervalo: float, estavel: float) -> None:
+    pendente, desde = None, 0.0
+    _preparar_carga(vigia)
+    while not vigia["parar"].wait(intervalo):
+        _preparar_carga(vigia)
+        assinatura = _assinatura(vigia["path"])
+        if assinatura is None or assinatura == vigia["assinatura"]:
+            pendente = None
+            continue
+        agora = time.monotonic()
+        if assinatura != pendente:  # mudou (de novo): espera estabilizar
+            pendente, desde = assinatura, agora
+            continue
+        if agora - desde < estavel:
+            continue
+        try:
+            if _recarregar(vigia, assinatura):
+                vigia["recargas"] += 1
+                pendente = None
+        except Exception as e:
+            # arquivo estável, mas ilegível: mantém a versão anterior e tenta de novo na próxima mudança
+            vigia["erro"] = f"{type(e).__name__}: {e}"
+            vigia["assinatura"] = assinatura
+            pendente = None
+
+
+def iniciar_vigia(path: str, intervalo: float = VIGIA_INTERVALO, estavel: float = VIGIA_ESTAVEL) -> dict:
+    """
+    Carrega `path` agora e inicia uma thread (daemon) que relê o arquivo, fora de qualquer
+    requisição, sempre que (mtime, tamanho) mudar e ficar estável por `estavel` segundos.
+    O dataset corrente fica em vigia["atual"] = (chave_fonte, base normalizada); releituras
+    normalizam só as linhas alteradas e deixam em vigia["mudancas"] as diferenças
+    (adicionados, removidos, alterados) em relação à leitura anterior.
+    """
+    vigia = {
+        "path": path,
+        "atual": None,
+        "carga": None,  # último retorno de carregar_incremental (hashes das linhas lidas)
+        "carga_tentada": None,  # assinatura da última tentativa de _preparar_carga
+        "mudancas": None,
+        "assinatura": None,
+        "atualizado_em": None,
+        "recargas": 0,
+        "erro": None,
+        "parar": threading.Event(),
+    }
+    assinatura = _assinatura(path)
+    while not _recarregar(vigia, assinatura):  # primeira carga: síncrona
+        time.sleep(estavel)
+        assinatura = _assinatura(path)
+    vigia["thread"] = threading.Thread(
+        target=_vigiar, args=(vigia, intervalo, estavel), name=f"vigia:{os.path.basename(path)}", daemon=True
+    )
+    vigia["thread"].start()
+    return vigia
+
+
+def parar_vigia(vigia: dict) -> None:
+    vigia["parar"].set()
+
+
+# ======================== PRAZOS ========================
+def calcular_prazos(base: pd.DataFrame, hoje: date) -> pd.DataFrame:
+    """
+    Acrescenta 'Dias para devolver', 'Em atraso', 'Vence em 7 dias' e 'Sem data'
+    em relação a `hoje`, com aritmética de datas em NumPy (base não é alterada).
+    """
+    df = base.copy(deep=False)
+    if "Retornar até" in df.columns:
+        retorno = df["Retornar até"].to_numpy("datetime64[D]")
+        sem_data = np.isnat(retorno)
+        dias = (retorno - np.datetime64(hoje, "D")).astype(np.int64)
+        dias[sem_data] = 0
+        tipo = _inteiro_compacto(dias)
+        df["Dias para devolver"] = pd.arrays.IntegerArray(dias.astype(tipo), sem_data)  # Int16 com nulos
+        df["Em atraso"] = ~sem_data & (dias < 0)
+        df["Vence em 7 dias"] = ~sem_data & (dias >= 0) & (dias <= 7)
+        df["Sem data"] = sem_data
+    else:
+        df["Dias para devolver"] = pd.array([pd.NA] * len(df), dtype="Int16")
+        df["Em atraso"] = False
+        df["Vence em 7 dias"] = False
+        df["Sem data"] = True
+    return df
+
+
+# ======================== BUSCA LIVRE (ÍNDICE) ========================
+BUSCA_MEMO_MAX = 128
+
+
+def _texto_busca(serie: pd.Series) -> pd.Series:
+    """Representação pesquisável da coluna (datas também em dd/mm/aaaa, como nos cards)."""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.dt.strftime("%Y-%m-%d %d/%m/%Y")
+    return serie.astype(object).where(serie.notna())
+
+
+# colunas lidas da planilha + 'Fonte' (arquivo/aba de origem, em carregar_varias)
+COLUNAS_BUSCA = [*COLUNAS_IMPORTANTES, "Fonte"]
+
+
+def _trigramas(texto: str) -> set[str]:
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def construir_indice_busca(base: pd.DataFrame) -> dict:
+    """
+    Índice invertido para a 'Busca livre': cada texto distinto (minúsculo, sem acento via _norm)
+    ganha um id global; trigramas -> ids de texto; por coluna, linhas ordenadas por id de texto.
+    """
+    textos: list[str] = []
+    id_texto: dict[str, int] = {}
+    colunas = {}
+    for col in [c for c in COLUNAS_BUSCA if c in base.columns]:
+        serie = base[col]
+        if isinstance(serie.dtype, pd.CategoricalDtype):  # os códigos já são o factorize
+            codigos, unicos = serie.cat.codes.to_numpy(), serie.cat.categories.astype(str)
+        else:
+            codigos, unicos = pd.factorize(_texto_busca(serie), use_na_sentinel=True)
+        gids = np.empty(len(unicos) + 1, dtype=np.int64)
+        gids[-1] = -1
+        for i, u in enumerate(unicos):
+            t = _norm(u).lower()
+            gid = id_texto.get(t)
+            if gid is None:
+                gid = id_texto[t] = len(textos)
+                textos.append(t)
+            gids[i] = gid
+        gid_linha = gids.take(codigos)
+        ordem = np.argsort(gid_linha, kind="stable")
+        colunas[col] = {"ordem": ordem, "gids": gid_linha[ordem]}
+
+    postings: dict[str, list[int]] = {}
+    for gid, t in enumerate(textos):
+        for tri in _trigramas(t):
+            postings.setdefault(tri, []).append(gid)
+    return {
+        "textos": textos,
+        "trigramas": {tri: np.asarray(g, dtype=np.int64) for tri, g in postings.items()},
+        "colunas": colunas,
+        "memo": OrderedDict(),  # (consulta, colunas) -> posições, LRU
+        "lock": threading.Lock(),
+    }
+
+
+def _linhas_com(col_idx: dict, gids: np.ndarray) -> np.ndarray:
+    """Posições das linhas cujo id de texto está em `gids` (busca binária nas listas ordenadas)."""
+    ini = np.searchsorted(col_idx["gids"], gids, "left")
+    tam = np.searchsorted(col_idx["gids"], gids, "right") - ini
+    ok = tam > 0
+    ini, tam = ini[ok], tam[ok]
+    if not len(ini):
+        return np.empty(0, dtype=np.int64)
+    desloc = np.repeat(ini - np.concatenate(([0], np.cumsum(tam)[:-1])), tam)
+    return col_idx["ordem"][desloc + np.arange(tam.sum())]
+
+
+def buscar(indice: dict, texto: str, colunas: list[str] | None = None) -> np.ndarray | None:
+    """
+    Posições (ordenadas) das linhas que contêm `texto` em alguma das `colunas` (todas, se vazio).
+    Interseção das listas de trigramas + conferência de substring só nos textos candidatos.
+    Retorna None quando não há o que buscar; coluna fora do índice levanta ValueError.
+    """
+    q = _norm(texto).lower()
+    if not q:
+        return None
+    fora = [c for c in (colunas or ()) if c not in indice["colunas"]]
+    if fora:
+        raise ValueError(f"colunas fora do índice de busca: {', '.join(fora)}")
+    cols = tuple(colunas or indice["colunas"])
+    memo_key = (q, cols)
+    with indice["lock"]:
+        if memo_key in indice["memo"]:
+            indice["memo"].move_to_end(memo_key)
+            return indice["memo"][memo_key]
+
+    textos = indice["textos"]
+    if len(q) >= 3:
+        listas = []
+        for tri in _trigramas(q):
+            lista = indice["trigramas"].get(tri)
+            if lista is None:
+                listas = None
+                break
+            listas.append(lista)
+        if listas is None:
+            candidatos = np.empty(0, dtype=np.int64)
+        else:
+            listas.sort(key=len)  # menor lista primeiro; poucos candidatos -> confere direto
+            candidatos = listas[0]
+            for lista in listas[1:]:
+                if len(candidatos) <= 64:
+                    break
+                candidatos = np.intersect1d(candidatos, lista, assume_unique=True)
+    else:
+        candidatos = range(len(textos))
+    achados = np.fromiter((g for g in candidatos if q in textos[g]), dtype=np.int64)
+    partes = [_linhas_com(indice["colunas"][c], achados) for c in cols]
+    pos = np.sort(np.concatenate(partes)) if partes else np.empty(0, dtype=np.int64)
+    if len(pos) > 1:
+        pos = pos[np.concatenate(([True], pos[1:] != pos[:-1]))]
+    pos.flags.writeable = False  # compartilhado entre sessões via memo
+
+    with indice["lock"]:
+        indice["memo"][memo_key] = pos
+        while len(indice["memo"]) > BUSCA_MEMO_MAX:
+            indice["memo"].popitem(last=False)
+    return pos
+
+
+# ======================== ÍNDICES ORDENADOS ========================
+# Posições ordenadas pela chave ("Retornar até", '__os_num'): uma faixa de valores vira duas
+# buscas binárias (searchsorted) e uma fatia das posições, sem comparar a coluna inteira.
+_RE_OS_FAIXA = re.compile(r"^\s*(\d{4})/(\d{1,2})(?:/(\d+))?\s*$")
+
+
+def _indice_ordenado(chaves: np.ndarray, validos: np.ndarray) -> dict:
+    """Posições das linhas válidas ordenadas pela chave (empates na ordem original) + chaves ordenadas."""
+    pos = np.flatnonzero(validos)
+    pos = pos[np.argsort(chaves[pos], kind="stable")]
+    return {"pos": pos, "chaves": chaves[pos]}
+
+
+def _faixa_indice(indice: dict, ini, fim) -> np.ndarray:
+    """Posições (em ordem de chave) com ini <= chave < fim, por busca binária."""
+    lo, hi = np.searchsorted(indice["chaves"], [ini, fim], side="left")
+    return indice["pos"][lo:max(lo, hi)]
+
+
+def limites_os(faixa: tuple[str, str]) -> tuple[int, int]:
+    """
+    ('YYYY/MM[/NNNN]', 'YYYY/MM[/NNNN]') -> [início, fim) em '__os_num' (ver empacotar_os).
+    Só ano/mês pega o mês inteiro; limites inválidos levantam ValueError.
+    """
+    limites = []
+    for k, texto in enumerate(faixa):
+        m = _RE_OS_FAIXA.match(str(texto))
+        if not m:
+            raise ValueError(f"OS inválida: {texto!r} (use AAAA/MM ou AAAA/MM/NNNN)")
+        base = int(m[1]) * 10**7 + int(m[2]) * 10**5
+        if m[3] is not None:
+            limites.append(base + int(m[3]) + k)  # fim inclusivo -> exclusivo
+        else:
+            limites.append(base + k * 10**5)  # mês inteiro
+    return limites[0], limites[1]
+
+
+def meses_os(motor: dict) -> list[str]:
+    """Meses ('YYYY/MM') presentes nas OS válidas do dataset, em ordem."""
+    indice = motor["intervalos"].get("__os_num")
+    if indice is None or not len(indice["chaves"]):
+        return []
+    meses = np.unique(indice["chaves"] // 10**5)
+    return [f"{m // 100:04d}/{m % 100:02d}" for m in meses]
+
+
+def _ranking(motor: dict, ordem: str, crescente: bool) -> np.ndarray | None:
+    """
+    Posto de cada linha na ordem de ordenar(df, ordem, crescente), calculado uma vez por
+    dataset para 'Retornar até' e 'Orç/OS'; None para as demais colunas.
+    """
+    if ordem not in motor["ordenacoes"]:
+        return None
+    chave = (ordem, crescente)
+    with motor["lock"]:
+        if chave in motor["rankings"]:
+            return motor["rankings"][chave]
+    df = motor["df"]
+    n = motor["n"]
+    retorno = motor["retorno"]
+    niveis = [np.arange(n)]  # lexsort: última chave é a principal; empates na ordem original
+    if retorno is not None:
+        niveis += [retorno.view(np.int64), np.isnat(retorno)]  # crescente, NaT por último
+    if ordem == "Orç/OS":
+        os_num = df["__os_num"].to_numpy(np.int64)
+        niveis.append(os_num if crescente else -os_num)
+    elif not crescente:
+        niveis[1] = -niveis[1]
+    ordenadas = np.lexsort(niveis)
+    ranking = np.empty(n, dtype=np.int64)
+    ranking[ordenadas] = np.arange(n)
+    ranking.flags.writeable = False
+    with motor["lock"]:
+        motor["rankings"][chave] = ranking
+    return ranking
+
+
+# ======================== FILTROS (BITMASKS) ========================
+FILTRO_MEMO_MAX = 64
+VISTAS = {"Atrasados": "Em atraso", "Próx. 7 dias": "Vence em 7 dias", "Sem data": "Sem data"}
+
+
+def _bits(mask: np.ndarray) -> np.ndarray:
+    return np.packbits(np.asarray(mask, dtype=bool))
+
+
+def _bits_por_valor(serie: pd.Series) -> dict[str, np.ndarray]:
+    """Um bitmask por valor distinto, comparando como texto (igual às opções do selectbox)."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # category: os códigos já são o factorize; só as categorias presentes viram opção
+        todos = serie.cat.codes.to_numpy()
+        presentes = np.flatnonzero(todos >= 0)
+        usados = np.unique(todos[presentes])
+        codigos = np.searchsorted(usados, todos[presentes])
+        unicos = serie.cat.categories[usados].astype(str)
+    else:
+        presentes = np.flatnonzero(serie.notna().to_numpy())
+        codigos, unicos = pd.factorize(serie.iloc[presentes].astype(str))
+    bits = {}
+    for k, valor in enumerate(unicos):
+        mask = np.zeros(len(serie), dtype=bool)
+        mask[presentes[codigos == k]] = True
+        bits[valor] = _bits(mask)
+    return bits
+
+
+def construir_motor_filtros(df: pd.DataFrame) -> dict:
+    """
+    Pré-calcula os bitmasks (np.packbits) dos filtros categóricos e das vistas rápidas,
+    e os índices ordenados das faixas de data e de OS.
+    Combinações viram AND bit a bit; o resultado são posições em `df`, não cópias.
+    """
+    n = len(df)
+    motor = {
+        "n": n,
+        "todos": _bits(np.ones(n, dtype=bool)),
+        "nenhum": _bits(np.zeros(n, dtype=bool)),
+        "vistas": {v: _bits(df[c].to_numpy(bool)) for v, c in VISTAS.items() if c in df.columns},
+        "status": _bits_por_valor(df["Status"]) if "Status" in df.columns else None,
+        "sit": _bits_por_valor(df["Sit"]) if "Sit" in df.columns else None,
+        "prefixo": None,
+        "retorno": None,
+        "intervalos": {},  # coluna -> índice ordenado (faixas por searchsorted)
+        "ordenacoes": set(),  # colunas de "Ordenar por" servidas por _ranking
+        "rankings": {},  # (ordem, crescente) -> posto de cada linha, calculado sob demanda
+        "df": df,  # referência (sem cópia), para ordenar as posições
+        "memo": OrderedDict(),  # tupla de filtros (+ ordem) -> posições, LRU
+        "lock": threading.Lock(),
+    }
+    if "Prefixo" in df.columns:
+        codigos, unicos = pd.factorize(df["Prefixo"], use_na_sentinel=True)
+        motor["prefixo"] = (codigos, pd.Series(unicos, dtype=object).astype(str))
+    if "Retornar até" in df.columns:
+        retorno = df["Retornar até"].to_numpy("datetime64[ns]")
+        motor["retorno"] = retorno
+        motor["com_data"] = _bits(~np.isnat(retorno))
+        motor["intervalos"]["Retornar até"] = _indice_ordenado(retorno, ~np.isnat(retorno))
+        motor["ordenacoes"].add("Retornar até")
+    if "__os_num" in df.columns:
+        os_num = df["__os_num"].to_numpy(np.int64)
+        motor["intervalos"]["__os_num"] = _indice_ordenado(os_num, os_num >= 0)
+        if "Orç/OS" in df.columns:
+            motor["ordenacoes"].add("Orç/OS")
+    return motor
+
+
+def _bits_posicoes(n: int, pos: np.ndarray) -> np.ndarray:
+    mask = np.zeros(n, dtype=bool)
+    mask[pos] = True
+    return _bits(mask)
+
+
+def regex_valida(texto: str) -> bool:
+    """True se `texto` compila no `re` do Python: quem decide regex × literal nos dois motores."""
+    try:
+        re.compile(texto)
+    except re.error:
+        return False
+    return True
+
+
+def _contem(unicos: pd.Series, texto: str) -> np.ndarray:
+    """'contém' (regex do `re`, ou literal se a regex for inválida) sobre valores distintos."""
+    literal = not regex_valida(texto)
+    try:
+        return unicos.str.contains(texto, case=False, na=False, regex=not literal).to_numpy(bool)
+    except ValueError:  # RE2 do Arrow recusa algo que o re aceita: avalia com o re
+        return unicos.astype(object).str.contains(texto, case=False, na=False).to_numpy(bool)
+
+
+def _bits_prefixo(motor: dict, texto: str) -> np.ndarray:
+    """'Prefixo (contém)' avaliado só nos valores distintos."""
+    codigos, unicos = motor["prefixo"]
+    hit = np.append(_contem(unicos, texto), False)  # código -1 (nulo) nunca casa
+    return _bits(hit[codigos])
+
+
+def filtrar_posicoes(
+    motor: dict,
+    vista: str = "Todos os itens",
+    status: str = "(Todos)",
+    sit: str = "(Todos)",
+    prefixo: str = "",
+    busca: str = "",
+    colunas_busca: list[str] | None = None,
+    indice: dict | None = None,
+    janela: tuple[date, date] | None = None,
+    inclui_sem_data: bool = True,
+    faixa_os: tuple[str, str] | None = None,
+    ordem: str | None = None,
+    crescente: bool = True,
+) -> np.ndarray:
+    """
+    Posições das linhas que passam em todos os filtros da sidebar: na ordem original ou,
+    com `ordem`, na de ordenar(). O array (somente leitura) é memorizado no motor e
+    compartilhado por todas as sessões que pedirem a mesma vista.
+    `faixa_os` = (de, até) em 'YYYY/MM[/NNNN]', inclusiva (ver limites_os).
+    """
+    filtros = (vista, status, sit, prefixo, busca, colunas_busca, indice, janela, inclui_sem_data, faixa_os)
+    chave = (vista, status, sit, prefixo, busca, tuple(colunas_busca or ()), janela, inclui_sem_data, faixa_os)
+    if ordem is not None:
+        chave += (ordem, crescente)
+    with motor["lock"]:
+        if chave in motor["memo"]:
+            motor["memo"].move_to_end(chave)
+            return motor["memo"][chave]
+
+    if ordem is None:
+        pos = _aplicar_filtros(motor, *filtros)
+    else:
+        pos = filtrar_posicoes(motor, *filtros)
+        ranking = _ranking(motor, ordem, crescente)
+        if ranking is None:
+            pos = ordenar_posicoes(motor["df"], pos, ordem, crescente)
+        else:
+            # postos pré-calculados: ordenar a vista é ordenar inteiros, sem reler as colunas
+            pos = pos[np.argsort(ranking[pos])]
+    pos.flags.writeable = False
+    with motor["lock"]:
+        motor["memo"][chave] = pos
+        while len(motor["memo"]) > FILTRO_MEMO_MAX:
+            motor["memo"].popitem(last=False)
+    return pos
+
+
+def _aplicar_filtros(
+    motor: dict,
+    vista: str,
+    status: str,
+    sit: str,
+    prefixo: str,
+    busca: str,
+    colunas_busca: list[str] | None,
+    indice: dict | None,
+    janela: tuple[date, date] | None,
+    inclui_sem_data: bool,
+    faixa_os: tuple[str, str] | None,
+) -> np.ndarray:
+    acc = motor["todos"].copy()
+    if vista in motor["vistas"]:
+        acc &= motor["vistas"][vista]
+    if status != "(Todos)" and motor["status"] is not None:
+        acc &= motor["status"].get(status, motor["nenhum"])
+    if sit != "(Todos)" and motor["sit"] is not None:
+        acc &= motor["sit"].get(sit, motor["nenhum"])
+    if prefixo and motor["prefixo"] is not None:
+        acc &= _bits_prefixo(motor, prefixo)
+    if busca and indice is not None:
+        pos_busca = buscar(indice, busca, colunas_busca)
+        if pos_busca is not None:
+            acc &= _bits_posicoes(motor["n"], pos_busca)
+    if motor["retorno"] is not None:
+        if janela is not None:
+            ini = np.datetime64(janela[0], "D").astype(motor["retorno"].dtype)
+            fim = (np.datetime64(janela[1], "D") + np.timedelta64(1, "D")).astype(motor["retorno"].dtype)
+            bits = _bits_posicoes(motor["n"], _faixa_indice(motor["intervalos"]["Retornar até"], ini, fim))
+            if inclui_sem_data:
+                bits |= ~motor["com_data"]
+            acc &= bits
+        elif not inclui_sem_data:
+            acc &= motor["com_data"]
+    if faixa_os is not None and "__os_num" in motor["intervalos"]:
+        ini, fim = limites_os(faixa_os)
+        acc &= _bits_posicoes(motor["n"], _faixa_indice(motor["intervalos"]["__os_num"], ini, fim))
+
+    return np.flatnonzero(np.unpackbits(acc, count=motor["n"]))
+
+
+def ordenar_posicoes(df: pd.DataFrame, pos: np.ndarray, ordem: str, crescente: bool = True) -> np.ndarray:
+    """
+    `pos` na ordem de ordenar(df.iloc[pos], ordem, crescente), lendo só as colunas da ordenação
+    (a vista ordenada continua sendo posições, sem copiar as linhas).
+    """
+    if ordem not in df.columns:
+        return np.array(pos)
+    secund = "Retornar até" if ("Retornar até" in df.columns and ordem != "Retornar até") else None
+    if ordem == "Orç/OS" and "__os_num" in df.columns:
+        ordem = "__os_num"
+    colunas = [ordem, secund] if secund else [ordem]
+    chaves = df[colunas].iloc[pos].reset_index(drop=True)
+    if secund:
+        ordenado = chaves.sort_values(by=colunas, ascending=[crescente, True])
+    else:
+        ordenado = chaves.sort_values(by=colunas, ascending=[crescente], kind="stable")  # empates na ordem original
+    return np.asarray(pos)[ordenado.index.to_numpy()]
+
+
+def ordenar(df: pd.DataFrame, ordem: str, crescente: bool = True) -> pd.DataFrame:
+    """
+    Ordena por `ordem` e, no empate, por 'Retornar até' (crescente).
+    'Orç/OS' ordena pelo inteiro empacotado '__os_num' (ano, mês, sequência numérica).
+    """
+    if ordem not in df.columns:
+        return df
+    return df.iloc[ordenar_posicoes(df, np.arange(len(df)), ordem, crescente)]
+
+
+def calcular_kpis(df: pd.DataFrame) -> dict[str, int]:
+    """Totais do cabeçalho do dashboard para a visão `df` (já com prazos)."""
+    total_itens = len(df)
+    return {
+        "itens": total_itens,
+        "em_atraso": int(df["Em atraso"].sum()) if "Em atraso" in df else 0,
+        "vence_7_dias": int(df["Vence em 7 dias"].sum()) if "Vence em 7 dias" in df else 0,
+        "sem_data": int(df["Sem data"].sum()) if "Sem data" in df else 0,
+        "qtd_total": int(df["Qtdade"].sum()) if "Qtdade" in df else total_itens,
+    }
+
+
+# ======================== CUBO DE AGREGAÇÃO ========================
+# Contagens e somas pré-agregadas por combinação de filtros categóricos: KPIs e gráficos
+# de qualquer combinação saem de fatias do cubo (poucas células), não das linhas.
+DIMENSOES_CUBO = ["Status", "Sit", "Prefixo"]
+FAIXAS_PRAZO = ["atrasado", "7 dias", "sem data", "ok"]
+_FAIXA_DA_COLUNA = {"Em atraso": "atrasado", "Vence em 7 dias": "7 dias", "Sem data": "sem data"}
+
+
+def _faixa_prazo(df: pd.DataFrame) -> pd.Categorical:
+    """Faixa de prazo de cada linha (as flags de calcular_prazos são mutuamente exclusivas)."""
+    codigos = np.full(len(df), FAIXAS_PRAZO.index("ok"), dtype=np.int8)
+    for col, faixa in _FAIXA_DA_COLUNA.items():
+        if col in df.columns:
+            codigos[df[col].to_numpy(bool)] = FAIXAS_PRAZO.index(faixa)
+    return pd.Categorical.from_codes(codigos, FAIXAS_PRAZO)
+
+
+def construir_cubo(df: pd.DataFrame, pos: np.ndarray | None = None) -> dict:
+    """
+    Itens ('n') e soma de Qtdade ('qtd') por Status × Sit × Prefixo × faixa de prazo × semana
+    de 'Retornar até' (segunda-feira), só nas combinações presentes. `df` já com prazos;
+    com `pos`, só essas linhas (copiando apenas as colunas que o cubo usa).
+    """
+    if pos is not None:
+        usadas = [*DIMENSOES_CUBO, *_FAIXA_DA_COLUNA, "Retornar até", "Qtdade"]
+        df = df[[c for c in df.columns if c in usadas]].iloc[pos]
+    chaves = [df[c].reset_index(drop=True) for c in DIMENSOES_CUBO if c in df.columns]
+    chaves.append(pd.Series(_faixa_prazo(df), name="faixa"))
+    if "Retornar até" in df.columns:
+        retorno = df["Retornar até"].reset_index(drop=True)
+        chaves.append((retorno.dt.normalize() - pd.to_timedelta(retorno.dt.weekday, unit="D")).rename("semana"))
+    qtd = df["Qtdade"].fillna(0).to_numpy(np.int64) if "Qtdade" in df.columns else 1
+    medidas = pd.DataFrame({"n": np.ones(len(df), dtype=np.int64), "qtd": qtd})
+    celulas = medidas.groupby(chaves, observed=True, dropna=False, sort=False).sum().reset_index()
+
+    codigos, valores = {}, {}
+    for dim in [c.name for c in chaves]:
+        cod, unicos = pd.factorize(celulas[dim], use_na_sentinel=True)
+        codigos[dim] = cod
+        valores[dim] = pd.Series(unicos, dtype=object).astype(str)
+    return {
+        "celulas": celulas,
+        "codigos": codigos,  # dimensão -> código (factorize) de cada célula; -1 = nulo
+        "valores": valores,  # dimensão -> valores distintos como texto (iguais às opções da sidebar)
+        "faixa": celulas["faixa"].cat.codes.to_numpy(),  # índice em FAIXAS_PRAZO
+        "n": celulas["n"].to_numpy(),
+        "qtd": celulas["qtd"].to_numpy(),
+        "tem_retorno": "Retornar até" in df.columns,
+        "tem_qtd": "Qtdade" in df.columns,
+    }
+
+
+def _celulas_com(cubo: dict, dim: str, hit: np.ndarray) -> np.ndarray:
+    """Células cujo valor de `dim` casa (`hit` por valor distinto; nulo nunca casa)."""
+    return np.append(hit, False)[cubo["codigos"][dim]]
+
+
+def fatiar_cubo(
+    cubo: dict,
+    vista: str = "Todos os itens",
+    status: str = "(Todos)",
+    sit: str = "(Todos)",
+    prefixo: str = "",
+    inclui_sem_data: bool = True,
+) -> np.ndarray:
+    """Máscara das células que passam nos filtros categóricos (mesma semântica de filtrar_posicoes)."""
+    faixa = cubo["faixa"]
+    fatia = np.ones(len(faixa), dtype=bool)
+    if vista in VISTAS:
+        fatia &= faixa == FAIXAS_PRAZO.index(_FAIXA_DA_COLUNA[VISTAS[vista]])
+    for dim, valor in (("Status", status), ("Sit", sit)):
+        if valor != "(Todos)" and dim in cubo["codigos"]:
+            fatia &= _celulas_com(cubo, dim, (cubo["valores"][dim] == valor).to_numpy())
+    if prefixo and "Prefixo" in cubo["codigos"]:
+        fatia &= _celulas_com(cubo, "Prefixo", _contem(cubo["valores"]["Prefixo"], prefixo))
+    if not inclui_sem_data and cubo["tem_retorno"]:
+        fatia &= faixa != FAIXAS_PRAZO.index("sem data")
+    return fatia
+
+
+def kpis_cubo(cubo: dict, fatia: np.ndarray) -> dict[str, int]:
+    """Os mesmos totais de calcular_kpis, somando só as células da fatia."""
+    n = cubo["n"][fatia]
+    por_faixa = np.bincount(cubo["faixa"][fatia], weights=n, minlength=len(FAIXAS_PRAZO)).astype(np.int64)
+    itens = int(n.sum())
+    return {
+        "itens": itens,
+        "em_atraso": int(por_faixa[FAIXAS_PRAZO.index("atrasado")]),
+        "vence_7_dias": int(por_faixa[FAIXAS_PRAZO.index("7 dias")]),
+        "sem_data": int(por_faixa[FAIXAS_PRAZO.index("sem data")]),
+        "qtd_total": int(cubo["qtd"][fatia].sum()) if cubo["tem_qtd"] else itens,
+    }
+
+
+def agregar_cubo(
+    cubo: dict,
+    fatia: np.ndarray,
+    por: str,
+    colunas: str | None = None,
+    medida: str = "n",
+) -> pd.Series | pd.DataFrame:
+    """
+    Soma de `medida` na fatia, por `por` (série) ou por `por` × `colunas` (tabela larga,
+    pronta para st.bar_chart empilhado). Valores nulos de `por` ficam de fora.
+    """
+    celulas = cubo["celulas"][fatia]
+    if colunas is None:
+        return celulas.groupby(por, observed=True)[medida].sum()
+    tabela = celulas.groupby([por, colunas], observed=True)[medida].sum().unstack(colunas, fill_value=0)
+    tabela.columns = tabela.columns.astype(str)
+    return tabela
+
+
+# ======================== CARDS (HTML) ========================
+def _texto_col(dfv: pd.DataFrame, col: str) -> pd.Series:
+    if col not in dfv.columns:
+        return pd.Series("", index=dfv.index, dtype=object)
+    # str() valor a valor (no C do NumPy), como o str(row.get(...)) de antes
+    return pd.Series(dfv[col].to_numpy(dtype=object).astype(str), index=dfv.index, dtype=object).str.strip()
+
+
+def _esc(s: pd.Series) -> pd.Series:
+    return (
+        s.str.replace("&", "&amp;", regex=False)
+        .str.replace("<", "&lt;", regex=False)
+        .str.replace(">", "&gt;", regex=False)
+        .str.replace('"', "&quot;", regex=False)
+    )
+
+
+def _badges(texto: pd.Series, tom: pd.Series | str, mostrar: pd.Series) -> pd.Series:
+    html = '<span class="badge badge-' + tom + '">' + texto + "</span>"
+    return html.where(mostrar, "")
+
+
+def html_cards(dfv: pd.DataFrame, cols_por_linha: int = 3) -> str:
+    """HTML de todos os cartões de `dfv` (uma página), montado coluna a coluna, num único bloco."""
+    titulo = _esc(_texto_col(dfv, "Item")).replace("", "—")
+    insumo = _esc(_texto_col(dfv, "Insumo")).replace("", "—")
+    sit = _esc(_texto_col(dfv, "Sit"))
+    status = _texto_col(dfv, "Status")
+    prefixo = _esc(_texto_col(dfv, "Prefixo"))
+
+    em_atraso = dfv["Em atraso"].fillna(False).to_numpy(bool) if "Em atraso" in dfv else np.zeros(len(dfv), bool)
+    vence7 = dfv["Vence em 7 dias"].fillna(False).to_numpy(bool) if "Vence em 7 dias" in dfv else np.zeros(len(dfv), bool)
+    card_cls = np.where(em_atraso, "card card-danger", np.where(vence7, "card card-warn", "card"))
+
+    tom_status = pd.Series(
+        np.where(status.str.contains("P.O", regex=False), "blue",
+                 np.where(status.str.lower().str.startswith("n"), "red", "gray")),
+        index=dfv.index,
+    )
+    b_sit = _badges("Situação: " + sit, "gray", sit != "")
+    b_status = _badges("Status: " + _esc(status), tom_status, status != "")
+    b_prefixo = _badges("Prefixo: " + prefixo, "gray", prefixo != "")
+
+    # prazo (se existir)
+    if "Dias para devolver" in dfv:
+        dias = pd.to_numeric(dfv["Dias para devolver"], errors="coerce").astype("float64")
+    else:
+        dias = pd.Series(np.nan, index=dfv.index)
+    if "Retornar até" in dfv:
+        retorno = dfv["Retornar até"]
+    else:
+        retorno = pd.Series(pd.NaT, index=dfv.index, dtype="datetime64[ns]")
+    tom_prazo = pd.Series(
+        np.where((dias >= 0) & (dias <= 7), "amber", np.where(dias < 0, "red", "gray")), index=dfv.index
+    )
+    prazo_badge = _badges("Retornar até: " + retorno.dt.strftime("%d/%m/%Y").fillna(""), tom_prazo, retorno.notna())
+    prazo_badge = prazo_badge.where(retorno.notna(), '<span class="badge badge-gray">Sem data</span>')
+
+    d = dias.fillna(0).astype(np.int64).astype(str)
+    d_abs = dias.abs().fillna(0).astype(np.int64).astype(str)
+    prazo_txt = pd.Series(
+        np.where(dias < 0, "<span class='muted'>Atrasado há " + d_abs + " dia(s)</span>",
+                 np.where(dias == 0, "<span class='muted'>Vence hoje</span>",
+                          "<span class='muted'>Faltam " + d + " dia(s)</span>")),
+        index=dfv.index,
+    ).where(dias.notna(), "")
+
+    cards = (
+        '<div class="' + card_cls + '"><div class="card-header"><div>'
+        + '<div class="card-title">' + titulo + "</div>"
+        + '<div class="card-sub">' + insumo + "</div>"
+        + '</div></div><div class="card-row">' + b_sit + b_status + b_prefixo + prazo_badge + "</div>"
+        + '<div class="card-row">' + prazo_txt + "</div></div>"
+    )
+    return f'<div class="cards-grid" style="--cols:{cols_por_linha}">' + "".join(cards) + "</div>"
+
+
+# ======================== SNAPSHOT + DIFF HELPERS ========================
+COLUNAS_CHAVE = ["Orç/OS", "Item", "P/N Removido", "S/N Removido", "Prefixo"]
+
+
+def _chave_itens(df: pd.DataFrame) -> pd.Series:
+    """
+    Gera uma chave estável para identificar itens entre execuções.
+    Ajuste a lista de colunas conforme a sua realidade.
+    """
+    candidatos = [c for c in COLUNAS_CHAVE if c in df.columns]
+    if not candidatos:
+        # Fallback: usa o índice atual (não ideal, mas evita quebrar)
+        return pd.Series(df.index.astype(str), index=df.index)
+    partes = [pd.Series(df[c].to_numpy(dtype=object).astype(str), index=df.index, dtype=object) for c in candidatos]
+    return partes[0].str.cat(partes[1:], sep=" | ") if len(partes) > 1 else partes[0]
+
+
+_snap_lock = threading.Lock()
+
+
+def _gravar_atomico(destino: str, escrever) -> None:
+    """Escreve via arquivo temporário no mesmo diretório + os.replace (nunca deixa arquivo parcial)."""
+    os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(destino), suffix=".tmp")
+    os.close(fd)
+    try:
+        escrever(tmp)
+        os.replace(tmp, destino)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _gravar_manifesto(entradas: list[dict]) -> None:
+    conteudo = json.dumps({"versao": 1, "snapshots": entradas}, ensure_ascii=False, indent=1)
+
+    def escrever(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(conteudo)
+
+    _gravar_atomico(SNAP_MANIFESTO, escrever)
+
+
+def _reconstruir_manifesto() -> list[dict]:
+    """Manifesto ausente/corrompido: remonta a lista a partir das partições em disco."""
+    entradas = []
+    if not os.path.isdir(SNAP_DIR):  # nada gravado ainda
+        return entradas
+    for particao in sorted(os.listdir(SNAP_DIR)):
+        pasta = os.path.join(SNAP_DIR, particao)
+        if not (particao.startswith("dia=") and os.path.isdir(pasta)):
+            continue
+        for nome in sorted(os.listdir(pasta)):
+            versao, ext = os.path.splitext(nome)
+            if ext not in (".parquet", ".csv"):
+                continue
+            try:
+                criado = datetime.strptime(versao, "%Y%m%dT%H%M%S%f")
+            except ValueError:
+                continue
+            entradas.append({
+                "versao": versao,
+                "arquivo": f"{particao}/{nome}",
+                "criado_em": criado.isoformat(timespec="seconds"),
+                "linhas": None,
+                "bytes": os.path.getsize(os.path.join(pasta, nome)),
+                "conteudo": None,
+            })
+    return entradas
+
+
+def _ler_manifesto() -> list[dict]:
+    try:
+        with open(SNAP_MANIFESTO, encoding="utf-8") as f:
+            return json.load(f)["snapshots"]
+    except FileNotFoundError:
+        return _reconstruir_manifesto()
+    except (OSError, ValueError, KeyError, TypeError):
+        entradas = _reconstruir_manifesto()
+        _gravar_manifesto(entradas)
+        return entradas
+
+
+def _hash_conteudo(df: pd.DataFrame) -> str:
+    linhas = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    cols = "\x1f".join(map(str, df.columns)).encode("utf-8")
+    return hashlib.sha1(cols + linhas.tobytes()).hexdigest()[:16]
+
+
+def _gravar_versao(df: pd.DataFrame, criado: datetime, entradas: list[dict]) -> dict:
+    """Grava uma versão na partição do dia e devolve sua entrada do manifesto."""
+    versao = criado.strftime("%Y%m%dT%H%M%S%f")
+    while any(e["versao"] == versao for e in entradas):  # dois saves no mesmo microssegundo
+        criado += timedelta(microseconds=1)
+        versao = criado.strftime("%Y%m%dT%H%M%S%f")
+    particao = f"dia={criado:%Y-%m-%d}"
+    os.makedirs(os.path.join(SNAP_DIR, particao), exist_ok=True)
+    try:
+        arquivo = f"{particao}/{versao}.parquet"
+        # zstd + dicionário: colunas repetitivas (Status, Sit, Prefixo...) encolhem bastante
+        _gravar_atomico(
+            os.path.join(SNAP_DIR, arquivo),
+            lambda tmp: df.to_parquet(tmp, index=False, compression="zstd", use_dictionary=True),
+        )
+    except Exception:
+        # caso seu ambiente não tenha parquet, salve como CSV
+        arquivo = f"{particao}/{versao}.csv"
+        _gravar_atomico(os.path.join(SNAP_DIR, arquivo), lambda tmp: df.to_csv(tmp, index=False))
+    return {
+        "versao": versao,
+        "arquivo": arquivo,
+        "criado_em": criado.isoformat(timespec="seconds"),
+        "linhas": int(len(df)),
+        "bytes": os.path.getsize(os.path.join(SNAP_DIR, arquivo)),
+        "conteudo": _hash_conteudo(df),
+    }
+
+
+def _aplicar_retencao(entradas: list[dict], agora: datetime) -> tuple[list[dict], list[dict]]:
+    """
+    Separa (mantidas, descartadas), em ordem cronológica:
+      - últimos SNAP_RETER_DIAS dias: todas as versões
+      - até SNAP_RETER_DIARIOS dias: só a última versão de cada dia (compactação diária)
+      - no máximo SNAP_MAX_VERSOES; a versão mais recente nunca é descartada
+    """
+    ordenadas = sorted(entradas, key=lambda e: e["versao"])
+    ultima_do_dia = {e["arquivo"].split("/", 1)[0]: e["versao"] for e in ordenadas}
+    limite_todas = (agora - timedelta(days=SNAP_RETER_DIAS)).strftime("%Y%m%d")
+    limite_diarias = (agora - timedelta(days=SNAP_RETER_DIARIOS)).strftime("%Y%m%d")
+    mantidas, descartadas = [], []
+    for i, e in enumerate(ordenadas):
+        dia = e["versao"][:8]
+        manter = (
+            i == len(ordenadas) - 1
+            or dia >= limite_todas
+            or (dia >= limite_diarias and ultima_do_dia[e["arquivo"].split("/", 1)[0]] == e["versao"])
+        )
+        (mantidas if manter else descartadas).append(e)
+    if len(mantidas) > SNAP_MAX_VERSOES:
+        descartadas += mantidas[:-SNAP_MAX_VERSOES]
+        mantidas = mantidas[-SNAP_MAX_VERSOES:]
+    return mantidas, descartadas
+
+
+def _remover_versoes(entradas: list[dict]) -> None:
+    for e in entradas:
+        arquivo = os.path.join(SNAP_DIR, e["arquivo"])
+        try:
+            os.remove(arquivo)
+        except OSError:
+            pass
+        try:
+            os.rmdir(os.path.dirname(arquivo))  # só some se a partição ficou vazia
+        except OSError:
+            pass
+
+
+def _migrar_legado(entradas: list[dict]) -> list[dict]:
+    """Importa o antigo _ultimo_snapshot.(parquet|csv) como a primeira versão do histórico."""
+    for legado in (SNAP_LEGADO, SNAP_LEGADO.replace(".parquet", ".csv")):
+        if not os.path.exists(legado):
+            continue
+        try:
+            antigo = pd.read_parquet(legado) if legado.endswith(".parquet") else pd.read_csv(legado)
+        except Exception:
+            continue
+        criado = datetime.fromtimestamp(os.path.getmtime(legado))
+        entradas = entradas + [_gravar_versao(antigo, criado, entradas)]
+        _gravar_manifesto(entradas)
+        os.remove(legado)
+    return entradas
+
+
+def listar_snapshots() -> list[dict]:
+    """Versões disponíveis (entradas do manifesto), da mais recente para a mais antiga."""
+    with _snap_lock:
+        entradas = _migrar_legado(_ler_manifesto())
+    return sorted(entradas, key=lambda e: e["versao"], reverse=True)
+
+
+def salvar_snapshot(df: pd.DataFrame) -> dict:
+    """
+    Acrescenta uma versão ao histórico e aplica a retenção. Se o conteúdo for idêntico
+    ao da última versão, não grava nada e devolve a entrada existente.
+    """
+    cols = [c for c in df.columns if not c.startswith("__")]  # evita colunas técnicas
+    dados = df[cols].reset_index(drop=True)
+    agora = datetime.now()
+    with _snap_lock:
+        entradas = _migrar_legado(_ler_manifesto())
+        if entradas:
+            ultima = max(entradas, key=lambda e: e["versao"])
+            if ultima.get("conteudo") == _hash_conteudo(dados):
+                return ultima
+        entrada = _gravar_versao(dados, agora, entradas)
+        mantidas, descartadas = _aplicar_retencao(entradas + [entrada], agora)
+        _gravar_manifesto(mantidas)  # manifesto primeiro: leitores nunca apontam para arquivo removido
+        _remover_versoes(descartadas)
+    return entrada
+
+
+def carregar_snapshot(versao: str | None = None) -> pd.DataFrame | None:
+    """Lê uma versão do histórico (None = a mais recente)."""
+    entradas = listar_snapshots()
+    if versao is not None:
+        entradas = [e for e in entradas if e["versao"] == versao]
+    if not entradas:
+        return None
+    arquivo = os.path.join(SNAP_DIR, entradas[0]["arquivo"])
+    try:
+        if arquivo.endswith(".parquet"):
+            return pd.read_parquet(arquivo)
+        return pd.read_csv(arquivo)
+    except Exception:
+        return None
+
+
+def rotulo_snapshot(entrada: dict) -> str:
+    criado = datetime.fromisoformat(entrada["criado_em"])
+    linhas = f" · {entrada['linhas']:,} linhas".replace(",", ".") if entrada.get("linhas") is not None else ""
+    return f"{criado:%d/%m/%Y %H:%M:%S}{linhas}"
+
+
+def _texto(serie: pd.Series) -> pd.Series:
+    return serie.astype(str).fillna("")
+
+
+def _tipo_textual(serie: pd.Series) -> bool:
+    dtype = serie.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    return pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype)
+
+
+def _tipo_numerico(serie: pd.Series) -> bool:
+    """Inteiros/floats de qualquer largura (int16 x int64, Int16 x float64 de versões antigas)."""
+    return pd.api.types.is_numeric_dtype(serie.dtype) and not pd.api.types.is_bool_dtype(serie.dtype)
+
+
+def _codigos_comuns(a: pd.Series, b: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Hash perfeito de duas colunas equivalentes: factorize conjunto, então valores iguais
+    (inclusive nulos) recebem o mesmo código nos dois lados. Tipos iguais (ou ambos texto, ou
+    ambos numéricos) usam os valores nativos; tipos diferentes comparam como texto.
+    """
+    nativo = (
+        a.dtype == b.dtype
+        or (_tipo_textual(a) and _tipo_textual(b))
+        or (_tipo_numerico(a) and _tipo_numerico(b))
+    )
+    if not nativo:
+        a, b = _texto(a), _texto(b)
+    codigos, _ = pd.factorize(pd.concat([a, b], ignore_index=True), use_na_sentinel=False)
+    return codigos[:len(a)], codigos[len(a):]
+
+
+def _ocorrencia(h: np.ndarray) -> np.ndarray:
+    """Número da ocorrência de cada hash (0, 1, 2...) para desambiguar chaves repetidas."""
+    return pd.Series(h).groupby(h, sort=False).cumcount().to_numpy()
+
+
+def calcular_diferencas(
+    df_atual: pd.DataFrame,
+    df_antigo: pd.DataFrame
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Retorna (adicionados, removidos, alterados_por_campo)
+      - 'adicionados' e 'removidos' são linhas inteiras
+      - 'alterados_por_campo' é um DF com col/old/new por chave
+    Itens casam por hash da chave + nº da ocorrência (chaves repetidas não multiplicam linhas);
+    só as linhas em que algum campo mudou entram em 'alterados'.
+    """
+    # colunas técnicas ('__os_num'...) não entram na comparação nem nas tabelas
+    a, b = (d[[c for c in d.columns if not c.startswith("__")]] for d in (df_atual, df_antigo))
+    comparar_cols = sorted(set(a.columns).intersection(b.columns))
+    codigos = {col: _codigos_comuns(a[col], b[col]) for col in comparar_cols}
+
+    chave_a = [c for c in COLUNAS_CHAVE if c in a.columns]
+    chave_b = [c for c in COLUNAS_CHAVE if c in b.columns]
+    h = pd.util.hash_pandas_object
+    if chave_a and chave_a == chave_b:
+        ha = h(pd.DataFrame({c: codigos[c][0] for c in chave_a}), index=False).to_numpy()
+        hb = h(pd.DataFrame({c: codigos[c][1] for c in chave_a}), index=False).to_numpy()
+    else:
+        ha = h(_chave_itens(a), index=False).to_numpy()
+        hb = h(_chave_itens(b), index=False).to_numpy()
+
+    ka = pd.DataFrame({"h": ha, "o": _ocorrencia(ha), "ia": np.arange(len(a))})
+    kb = pd.DataFrame({"h": hb, "o": _ocorrencia(hb), "ib": np.arange(len(b))})
+    m = ka.merge(kb, on=["h", "o"], how="outer", sort=False)
+    comum = m.dropna(subset=["ia", "ib"])
+    ia = comum["ia"].to_numpy(np.int64)
+    ib = comum["ib"].to_numpy(np.int64)
+    ordem = np.argsort(ia, kind="stable")  # mantém a ordem do df atual
+    ia, ib = ia[ordem], ib[ordem]
+
+    # adicionados / removidos
+    adicionados = a.iloc[np.sort(m.loc[m["ib"].isna(), "ia"].to_numpy(np.int64))]
+    removidos = b.iloc[np.sort(m.loc[m["ia"].isna(), "ib"].to_numpy(np.int64))]
+
+    # alterados: hash da linha = códigos das colunas; só linhas com algum código diferente
+    difs = {}
+    mudou = np.zeros(len(ia), dtype=bool)
+    for col in comparar_cols:
+        ca, cb = codigos[col]
+        difs[col] = ca[ia] != cb[ib]
+        mudou |= difs[col]
+
+    sel = np.flatnonzero(mudou)
+    diffs = []
+    if len(sel):
+        ia_m, ib_m = ia[sel], ib[sel]
+        chave = _chave_itens(a.iloc[ia_m]).to_numpy(dtype=object, copy=True)
+        occ = ka["o"].to_numpy()[ia_m]
+        repetida = occ > 0
+        if repetida.any():
+            chave[repetida] = [f"{k} #{o + 1}" for k, o in zip(chave[repetida], occ[repetida])]
+        for col in comparar_cols:
+            mask = difs[col][sel]
+            if mask.any():
+                diffs.append(pd.DataFrame({
+                    "Chave": chave[mask],
+                    "Coluna": col,
+                    "Valor antigo": b[col].to_numpy()[ib_m[mask]],
+                    "Valor novo": a[col].to_numpy()[ia_m[mask]],
+                }))
+
+    alterados = pd.concat(diffs, ignore_index=True) if diffs else pd.DataFrame(
+        columns=["Chave","Coluna","Valor antigo","Valor novo"]
+    )
+    return adicionados, removidos, alterados
+
+
+# ======================== EXPORTAÇÃO ========================
+# Arquivos gerados bloco a bloco num temporário (em disco acima de EXPORT_MEMORIA_MAX):
+# o pico é um bloco, não uma segunda cópia inteira da tabela em texto.
+EXPORT_LINHAS_POR_BLOCO = 50_000
+XLSX_LINHAS_POR_BLOCO = 5_000  # no xlsx o bloco vira XML em objetos Python: ~2 KB por linha
+EXPORT_MEMORIA_MAX = 16 * 1024**2
+XLSX_MAX_LINHAS = 1_048_575  # limite do Excel por aba (fora o cabeçalho)
+FORMATOS_EXPORTACAO = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def _blocos(df: pd.DataFrame, tamanho: int):
+    for ini in range(0, len(df), tamanho):
+        yield df.iloc[ini:ini + tamanho]
+
+
+def _exportar_csv(df: pd.DataFrame, f, tamanho: int) -> None:
+    df.head(0).to_csv(f, index=False, mode="wb", encoding="utf-8")
+    for bloco in _blocos(df, tamanho):
+        bloco.to_csv(f, index=False, header=False, mode="wb", encoding="utf-8")
+
+
+def _exportar_parquet(df: pd.DataFrame, f, tamanho: int) -> None:
+    """Um row group por bloco; colunas object (tipos misturados, ex.: 'Valor antigo') viram texto."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    mistas = list(df.select_dtypes(include=["object"]).columns)
+
+    def tabela(bloco, schema=None):
+        if mistas:
+            bloco = bloco.assign(**{c: bloco[c].map(lambda v: None if pd.isna(v) else str(v)) for c in mistas})
+        return pa.Table.from_pandas(bloco, schema=schema, preserve_index=False)
+
+    schema = tabela(df.head(0)).schema
+    for c in mistas:
+        schema = schema.set(schema.get_field_index(c), pa.field(c, pa.string()))
+    with pq.ParquetWriter(f, schema) as escritor:
+        for bloco in _blocos(df, tamanho):
+            escritor.write_table(tabela(bloco, schema))
+        if not len(df):
+            escritor.write_table(schema.empty_table())
+
+
+_XLSX_PARTES = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Dados" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+        "</Relationships>"
+    ),
+    # estilo 1 = data (dd/mm/aaaa), estilo 2 = data e hora
+    "xl/styles.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<numFmts count="2"><numFmt numFmtId="164" formatCode="dd/mm/yyyy"/>'
+        '<numFmt numFmtId="165" formatCode="dd/mm/yyyy hh:mm"/></numFmts>'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="1"><fill><patternFill patternType="none"/></fill></fills><borders count="1"><border/></borders>'
+        '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+        '<cellXfs count="3"><xf/><xf numFmtId="164" applyNumberFormat="1"/><xf numFmtId="165" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles></styleSheet>'
+    ),
+}
+_XML_INVALIDO = r"[\x00-\x08\x0b\x0c\x0e-\x1f]"
+
+
+def _letra_coluna(i: int) -> str:
+    letras = ""
+    i += 1
+    while i:
+        i, r = divmod(i - 1, 26)
+        letras = chr(65 + r) + letras
+    return letras
+
+
+def _celulas_xlsx(serie: pd.Series, refs: np.ndarray) -> np.ndarray:
+    """XML das células de uma coluna, vetorizado; nulos viram célula omitida ('')."""
+    if pd.api.types.is_bool_dtype(serie.dtype):
+        valor, tipo = np.where(serie.fillna(False).to_numpy(bool), "1", "0").astype(object), ' t="b"'
+        nulo = serie.isna().to_numpy()
+    elif pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        dias = (serie - pd.Timestamp("1899-12-30")) / pd.Timedelta(days=1)
+        nulo = dias.isna().to_numpy()
+        inteiro = bool((dias.dropna() % 1 == 0).all())
+        valor = (dias.round() if inteiro else dias).fillna(0).astype(np.int64 if inteiro else float)
+        valor, tipo = valor.astype(str).to_numpy(dtype=object), ' s="1"' if inteiro else ' s="2"'
+    elif pd.api.types.is_numeric_dtype(serie.dtype):
+        nulo = ~np.isfinite(serie.to_numpy(dtype=float, na_value=np.nan))
+        valor, tipo = serie.astype(object).where(~nulo, 0).astype(str).to_numpy(dtype=object), ""
+    else:
+        nulo = serie.isna().to_numpy()
+        texto = (
+            serie.astype(object).where(~nulo, "").astype(str)
+            .str.replace(_XML_INVALIDO, "", regex=True)
+            .str.replace("&", "&amp;", regex=False)
+            .str.replace("<", "&lt;", regex=False)
+            .str.replace(">", "&gt;", regex=False)
+        )
+        cels = '<c r="' + refs + '" t="inlineStr"><is><t xml:space="preserve">' + texto.to_numpy(dtype=object) + "</t></is></c>"
+        return np.where(nulo, "", cels)
+    cels = '<c r="' + refs + '"' + tipo + "><v>" + valor + "</v></c>"
+    return np.where(nulo, "", cels)
+
+
+def _exportar_xlsx(df: pd.DataFrame, f, tamanho: int) -> None:
+    """
+    xlsx gravado em streaming (uma aba 'Dados', strings inline): cada bloco vira XML por
+    coluna, vetorizado. O write-only do openpyxl serializa célula a célula (~0,3 ms por linha).
+    """
+    if len(df) > XLSX_MAX_LINHAS:
+        raise ValueError(f"xlsx comporta até {XLSX_MAX_LINHAS:,} linhas; use csv ou parquet")
+    letras = [_letra_coluna(i) for i in range(len(df.columns))]
+    cabecalho = pd.DataFrame([[str(c) for c in df.columns]], columns=df.columns, dtype=object)
+    with zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for nome, conteudo in _XLSX_PARTES.items():
+            zf.writestr(nome, conteudo)
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as xml:
+            xml.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                f'<dimension ref="A1:{letras[-1] if letras else "A"}{len(df) + 1}"/><sheetData>'
+            ).encode("utf-8"))
+            inicio = 1
+            for bloco in [cabecalho, *_blocos(df, min(tamanho, XLSX_LINHAS_POR_BLOCO))]:
+                numeros = np.arange(inicio, inicio + len(bloco)).astype(str).astype(object)
+                linhas = '<row r="' + numeros + '">'
+                for letra, col in zip(letras, range(len(bloco.columns))):
+                    linhas = linhas + _celulas_xlsx(bloco.iloc[:, col], letra + numeros)
+                xml.write(("".join(linhas + "</row>")).encode("utf-8"))
+                inicio += len(bloco)
+            xml.write(b"</sheetData></worksheet>")
+
+
+def exportar(df: pd.DataFrame, formato: str, destino=None, linhas_por_bloco: int = EXPORT_LINHAS_POR_BLOCO):
+    """
+    Grava `df` (sem colunas técnicas '__') em csv/parquet/xlsx, bloco a bloco, no arquivo
+    binário `destino` ou num temporário. Devolve o arquivo posicionado no início.
+    """
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError(f"formato de exportação desconhecido: {formato}")
+    df = df[[c for c in df.columns if not str(c).startswith("__")]]
+    f = destino if destino is not None else tempfile.SpooledTemporaryFile(EXPORT_MEMORIA_MAX)
+    {"csv": _exportar_csv, "parquet": _exportar_parquet, "xlsx": _exportar_xlsx}[formato](df, f, linhas_por_bloco)
+    f.seek(0)
+    return f
@@ -0,0 +1,299 @@
+"""
+Motor de consultas opcional em DuckDB (pip install duckdb), para datasets grandes e
+consultas sobre o histórico de snapshots.
+
+O dataset normalizado (com prazos) é registrado como tabela Arrow num banco em processo
+e os filtros da sidebar, a ordenação, os KPIs e os agrupamentos viram SQL (projeção e
+predicados empurrados para o scan, execução multi-thread). Os resultados são os mesmos
+do caminho pandas de reparo_core: mesmas posições, na mesma ordem, e os mesmos totais.
+"""
+# ======================== IMPORTS ========================
+import os
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import reparo_core as core
+
+# ======================== CONFIG ========================
+TABELA = "itens"
+HISTORICO = "historico"
+
+
+def disponivel() -> bool:
+    """True se o pacote duckdb estiver instalado."""
+    try:
+        import duckdb  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# ======================== HELPERS ========================
+def _q(coluna: str) -> str:
+    """Identificador SQL (colunas com acento, espaço e '/')."""
+    return '"' + coluna.replace('"', '""') + '"'
+
+
+def _literal(texto: str) -> str:
+    return "'" + texto.replace("'", "''") + "'"
+
+
+def _consultar(banco: dict, sql: str, params: list | None = None, ler=lambda c: c.fetchall()):
+    """
+    Executa num cursor próprio (a conexão é compartilhada entre sessões/threads) e devolve
+    ler(cursor); o cursor é fechado sempre, com ou sem erro.
+    """
+    with banco["lock"]:
+        cursor = banco["con"].cursor()
+    try:
+        return ler(cursor.execute(sql, params or []))
+    finally:
+        cursor.close()
+
+
+def _onde(
+    banco: dict,
+    vista: str = "Todos os itens",
+    status: str = "(Todos)",
+    sit: str = "(Todos)",
+    prefixo: str = "",
+    busca: str = "",
+    colunas_busca: list[str] | None = None,
+    indice: dict | None = None,
+    janela: tuple[date, date] | None = None,
+    inclui_sem_data: bool = True,
+    faixa_os: tuple[str, str] | None = None,
+    prefixos: list[str] | None = None,
+) -> tuple[str, list]:
+    """
+    WHERE equivalente a core.filtrar_posicoes. A busca livre continua no índice de
+    trigramas (mesma normalização de acentos) e entra como lista de posições.
+
+    O prefixo é regex se compilar no `re` do Python (core.regex_valida) e literal se não,
+    como no pandas; `prefixos` (valores já casados em Python) substitui o regexp_matches
+    quando o RE2 do DuckDB recusa a regex (lookaround, backreference).
+    """
+    colunas = banco["colunas"]
+    condicoes, params = [], []
+    if vista in core.VISTAS and core.VISTAS[vista] in colunas:
+        condicoes.append(_q(core.VISTAS[vista]))
+    for col, valor in (("Status", status), ("Sit", sit)):
+        if valor != "(Todos)" and col in colunas:
+            condicoes.append(f"CAST({_q(col)} AS VARCHAR) = ?")
+            params.append(valor)
+    if prefixo and "Prefixo" in colunas:
+        if prefixos is not None:
+            condicoes.append(f"list_contains(?, CAST({_q('Prefixo')} AS VARCHAR))")
+            params.append(prefixos)
+        elif not core.regex_valida(prefixo):
+            condicoes.append(f"contains(lower(CAST({_q('Prefixo')} AS VARCHAR)), lower(?))")
+            params.append(prefixo)
+        else:
+            condicoes.append(f"regexp_matches(CAST({_q('Prefixo')} AS VARCHAR), ?, 'i')")
+            params.append(prefixo)
+    if busca and indice is not None:
+        pos_busca = core.buscar(indice, busca, colunas_busca)
+        if pos_busca is not None:
+            condicoes.append("list_contains(?, __pos)" if len(pos_busca) < 1_000 else
+                             "__pos IN (SELECT UNNEST(?))")
+            params.append(pos_busca.tolist())
+    if "Retornar até" in colunas:
+        retorno = _q("Retornar até")
+        if janela is not None:
+            faixa = f"({retorno} >= ? AND {retorno} < ? + INTERVAL 1 DAY)"
+            condicoes.append(f"({faixa} OR {retorno} IS NULL)" if inclui_sem_data else faixa)
+            params += [pd.Timestamp(janela[0]), pd.Timestamp(janela[1])]
+        elif not inclui_sem_data:
+            condicoes.append(f"{retorno} IS NOT NULL")
+    if faixa_os is not None and "__os_num" in colunas:
+        condicoes.append("(__os_num >= ? AND __os_num < ?)")  # -1 (OS inválida) nunca entra
+        params += list(core.limites_os(faixa_os))
+    return (" AND ".join(condicoes) or "TRUE"), params
+
+
+def _com_fallback(funcao, banco: dict, filtros: dict, *args):
+    """
+    Prefixo pelo regexp_matches (RE2) e, se o RE2 recusar uma regex que o `re` aceita,
+    casado em Python (core._contem) sobre os prefixos distintos, que entram como lista.
+    """
+    import duckdb
+
+    try:
+        return funcao(banco, filtros, *args)
+    except duckdb.InvalidInputException:
+        if not filtros.get("prefixo") or "Prefixo" not in banco["colunas"]:
+            raise
+        sql = f"SELECT DISTINCT CAST({_q('Prefixo')} AS VARCHAR) AS p FROM {TABELA} WHERE {_q('Prefixo')} IS NOT NULL"
+        unicos = pd.Series(_consultar(banco, sql, ler=lambda c: c.fetchnumpy()["p"]), dtype=object)
+        prefixos = unicos[core._contem(unicos, filtros["prefixo"])].tolist()
+        return funcao(banco, {**filtros, "prefixos": prefixos}, *args)
+
+
+# ======================== BANCO ========================
+def construir_banco(df: pd.DataFrame, threads: int | None = None) -> dict:
+    """
+    Copia `df` (já com prazos) para uma tabela do DuckDB em memória (colunar, comprimida,
+    com zonemaps para os predicados), com a coluna '__pos' (posição da linha em `df`), que
+    volta como resultado dos filtros.
+    """
+    import duckdb
+    import pyarrow as pa
+
+    con = duckdb.connect(":memory:")
+    if threads:
+        con.execute(f"SET threads = {int(threads)}")
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    tabela = tabela.append_column("__pos", pa.array(np.arange(len(df), dtype=np.int64)))
+    con.register("__arrow", tabela)
+    con.execute(f"CREATE TABLE {TABELA} AS SELECT * FROM __arrow")
+    con.unregister("__arrow")
+    return {
+        "con": con,
+        "colunas": set(df.columns),
+        "n": len(df),
+        "lock": threading.Lock(),
+    }
+
+
+def registrar_historico(banco: dict, entradas: list[dict] | None = None) -> int:
+    """
+    Cria a view 'historico' sobre os parquet do histórico de snapshots (colunas unidas por
+    nome + 'versao'), lida sob demanda pelo DuckDB. Retorna quantas versões entraram.
+    """
+    entradas = core.listar_snapshots() if entradas is None else entradas
+    arquivos = {
+        os.path.abspath(os.path.join(core.SNAP_DIR, e["arquivo"])): e["versao"]
+        for e in entradas if e["arquivo"].endswith(".parquet")
+    }
+    with banco["lock"]:
+        if not arquivos:
+            banco["con"].execute(f"DROP VIEW IF EXISTS {HISTORICO}")
+            return 0
+        # views não aceitam parâmetros: caminhos entram como literais escapados
+        lista = ", ".join(_literal(a) for a in arquivos)
+        versoes = " ".join(f"WHEN {_literal(a)} THEN {_literal(v)}" for a, v in arquivos.items())
+        banco["con"].execute(
+            f"CREATE OR REPLACE VIEW {HISTORICO} AS "
+            f"SELECT CASE filename {versoes} END AS versao, * EXCLUDE (filename) "
+            f"FROM read_parquet([{lista}], union_by_name = true, filename = true)"
+        )
+    return len(arquivos)
+
+
+# ======================== CONSULTAS ========================
+def _posicoes(banco: dict, filtros: dict, ordem: str | None, crescente: bool) -> np.ndarray:
+    where, params = _onde(banco, **filtros)
+    order = "__pos"
+    if ordem and ordem in banco["colunas"]:
+        # mesma ordem de core.ordenar (sort estável: empates na ordem original)
+        chave = "__os_num" if ordem == "Orç/OS" and "__os_num" in banco["colunas"] else ordem
+        direcao = "ASC" if crescente else "DESC"
+        partes = [f"{_q(chave)} {direcao} NULLS LAST"]
+        if "Retornar até" in banco["colunas"] and ordem != "Retornar até":
+            partes.append(f"{_q('Retornar até')} ASC NULLS LAST")
+        order = ", ".join(partes + ["__pos"])
+    sql = f"SELECT __pos FROM {TABELA} WHERE {where} ORDER BY {order}"
+    return _consultar(banco, sql, params, lambda c: c.fetchnumpy()["__pos"]).astype(np.int64)
+
+
+def consultar_posicoes(
+    banco: dict,
+    ordem: str | None = None,
+    crescente: bool = True,
+    **filtros,
+) -> np.ndarray:
+    """
+    Posições das linhas que passam nos filtros (mesmos argumentos de core.filtrar_posicoes),
+    já na ordem de core.ordenar(df.iloc[pos], ordem, crescente) quando `ordem` é dada.
+    """
+    pos = _com_fallback(_posicoes, banco, filtros, ordem, crescente)
+    pos.flags.writeable = False
+    return pos
+
+
+def _kpis(banco: dict, filtros: dict) -> dict[str, int]:
+    where, params = _onde(banco, **filtros)
+    colunas = banco["colunas"]
+
+    def soma(col):
+        return f"COALESCE(SUM(CAST({_q(col)} AS BIGINT)), 0)" if col in colunas else "0"
+
+    sql = (
+        f"SELECT COUNT(*), {soma('Em atraso')}, {soma('Vence em 7 dias')}, {soma('Sem data')}, "
+        f"{soma('Qtdade') if 'Qtdade' in colunas else 'COUNT(*)'} FROM {TABELA} WHERE {where}"
+    )
+    valores = _consultar(banco, sql, params, lambda c: c.fetchone())
+    return dict(zip(["itens", "em_atraso", "vence_7_dias", "sem_data", "qtd_total"], map(int, valores)))
+
+
+def calcular_kpis(banco: dict, **filtros) -> dict[str, int]:
+    """Os mesmos totais de core.calcular_kpis para as linhas filtradas."""
+    return _com_fallback(_kpis, banco, filtros)
+
+
+def _expressao(banco: dict, dim: str) -> str:
+    """Dimensões do cubo (core.construir_cubo) em SQL: colunas, 'faixa' e 'semana'."""
+    if dim == "semana":
+        return f"date_trunc('week', {_q('Retornar até')})"
+    if dim == "faixa":
+        casos = " ".join(
+            f"WHEN {_q(col)} THEN '{faixa}'"
+            for col, faixa in core._FAIXA_DA_COLUNA.items() if col in banco["colunas"]
+        )
+        return f"CASE {casos} ELSE 'ok' END" if casos else "'ok'"
+    return f"CAST({_q(dim)} AS VARCHAR)"
+
+
+def _agregar(banco: dict, filtros: dict, por: str, colunas: str | None, medida: str):
+    where, params = _onde(banco, **filtros)
+    if medida == "n" or "Qtdade" not in banco["colunas"]:
+        valor = "COUNT(*)"
+    else:
+        valor = f"COALESCE(SUM(CAST({_q('Qtdade')} AS BIGINT)), 0)"
+    dims = [por] if colunas is None else [por, colunas]
+    selecao = ", ".join(f"{_expressao(banco, d)} AS {_q(d)}" for d in dims)
+    nao_nulos = " AND ".join(f"{_expressao(banco, d)} IS NOT NULL" for d in dims)
+    sql = (
+        f"SELECT {selecao}, {valor} AS valor FROM {TABELA} "
+        f"WHERE ({where}) AND {nao_nulos} GROUP BY ALL ORDER BY ALL"
+    )
+    return _consultar(banco, sql, params, lambda c: c.df())
+
+
+def agregar(
+    banco: dict,
+    por: str,
+    colunas: str | None = None,
+    medida: str = "n",
+    **filtros,
+) -> pd.Series | pd.DataFrame:
+    """Mesmo formato de core.agregar_cubo (série por `por`, ou tabela `por` × `colunas`)."""
+    res = _com_fallback(_agregar, banco, filtros, por, colunas, medida)
+    if por == "semana":
+        res["semana"] = pd.to_datetime(res["semana"]).astype("datetime64[ns]")
+    if colunas is None:
+        serie = res.set_index(por)["valor"].astype(np.int64)
+        serie.name = medida
+        return serie
+    tabela = res.pivot(index=por, columns=colunas, values="valor").fillna(0).astype(np.int64)
+    if colunas == "faixa":
+        tabela = tabela[[f for f in core.FAIXAS_PRAZO if f in tabela.columns]]
+    tabela.columns = tabela.columns.astype(str)
+    tabela.columns.name = colunas
+    return tabela
+
+
+def contagens_historico(banco: dict, coluna: str = "Status") -> pd.DataFrame:
+    """
+    Itens por versão do histórico × valor de `coluna` (só essa coluna é lida dos parquet).
+    Nulos, e versões sem a coluna, contam como '(vazio)'.
+    """
+    sql = (
+        f"SELECT versao, COALESCE(CAST({_q(coluna)} AS VARCHAR), '(vazio)') AS valor, COUNT(*) AS n "
+        f"FROM {HISTORICO} GROUP BY ALL ORDER BY ALL"
+    )
+    res = _consultar(banco, sql, ler=lambda c: c.df())
+    return res.pivot(index="versao", columns="valor", values="n").fillna(0).astype(np.int64)
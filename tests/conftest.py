@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import reparo_core as core  # noqa: E402
+
+
+@pytest.fixture
+def memos_limpos():
+    """Memos globais da normalização vazios antes e depois do teste."""
+    with core._memo_lock:
+        core._MEMO_STATUS.clear()
+        core._MEMO_OS.clear()
+    yield
+    with core._memo_lock:
+        core._MEMO_STATUS.clear()
+        core._MEMO_OS.clear()
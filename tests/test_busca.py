@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import reparo_core as core
+
+
+@pytest.fixture
+def base():
+    return pd.DataFrame({
+        "Item": ["Gerador", "Válvula", "GENERATOR", None, "bomba"],
+        "Prefixo": pd.Series(["PR-ABC", "PR-XYZ", "PR-ABC", "PS-GEN", None], dtype="category"),
+        "Fonte": ["frota_a.xlsx:Plan1", "frota_b.xlsx:Plan1", "frota_b.xlsx:Plan2", "frota_a.xlsx:Plan1", None],
+    })
+
+
+def _esperado(base, texto, colunas):
+    q = core._norm(texto).lower()
+    mask = np.zeros(len(base), dtype=bool)
+    for col in colunas:
+        textos = base[col].astype(object).map(lambda v: core._norm(str(v)).lower() if pd.notna(v) else "")
+        mask |= textos.map(lambda t: q in t).to_numpy(bool)
+    return np.flatnonzero(mask)
+
+
+@pytest.mark.parametrize("texto, colunas", [
+    ("frota_b", ["Fonte"]),
+    ("plan1", ["Fonte"]),
+    ("gen", None),
+    ("valv", ["Item"]),
+    ("abc", ["Prefixo", "Fonte"]),
+    ("zz", None),
+])
+def test_buscar_igual_a_substring(base, texto, colunas):
+    indice = core.construir_indice_busca(base)
+    obtido = core.buscar(indice, texto, colunas)
+    assert obtido.tolist() == _esperado(base, texto, colunas or list(base.columns)).tolist()
+
+
+def test_fonte_entra_no_indice(base):
+    assert "Fonte" in core.construir_indice_busca(base)["colunas"]
+
+
+def test_coluna_fora_do_indice_levanta(base):
+    indice = core.construir_indice_busca(base.drop(columns="Fonte"))
+    with pytest.raises(ValueError, match="Fonte"):
+        core.buscar(indice, "frota", ["Fonte"])
@@ -0,0 +1,74 @@
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import reparo_core as core
+
+NAT = pd.NaT
+
+
+def _parse(valor):
+    return core.parse_mixed_dates(pd.Series([valor], dtype=object)).iloc[0]
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    # células de data do Excel: valem como estão (o parser antigo trocava dia e mês aqui)
+    (datetime(2025, 11, 12), pd.Timestamp("2025-11-12")),
+    (date(2025, 11, 12), pd.Timestamp("2025-11-12")),
+    (pd.Timestamp("2025-11-12 10:30"), pd.Timestamp("2025-11-12 10:30")),
+    (np.datetime64("2025-11-12"), pd.Timestamp("2025-11-12")),
+    # seriais do Excel: número ou texto de 5 dígitos
+    (45973, pd.Timestamp("2025-11-12")),
+    (45973.5, pd.Timestamp("2025-11-12 12:00")),
+    ("45973", pd.Timestamp("2025-11-12")),
+    ("45973.0", pd.Timestamp("2025-11-12")),
+    # ISO
+    ("2025-11-12", pd.Timestamp("2025-11-12")),
+    ("2025-11-12 10:30", pd.Timestamp("2025-11-12 10:30")),
+    ("2025-11-12T10:30:15", pd.Timestamp("2025-11-12 10:30:15")),
+    # dia primeiro
+    ("12/11/2025", pd.Timestamp("2025-11-12")),
+    (" 12/11/2025 ", pd.Timestamp("2025-11-12")),
+    ("12/11/25", pd.Timestamp("2025-11-12")),
+    ("12/11/2025 10:30", pd.Timestamp("2025-11-12 10:30")),
+    ("12/11/2025 10:30:15", pd.Timestamp("2025-11-12 10:30:15")),
+    # vazios e lixo
+    (None, NAT),
+    (np.nan, NAT),
+    ("", NAT),
+    ("   ", NAT),
+    ("a combinar", NAT),
+])
+def test_uma_classe_por_formato(valor, esperado):
+    obtido = _parse(valor)
+    assert (obtido is NAT and esperado is NAT) or obtido == esperado
+
+
+@pytest.mark.parametrize("valor", [
+    1, 0, -5, 12345, 19_999, 80_001, 132_000, 1e9,  # números fora da janela de seriais
+    "1", "12345", "99999",                         # textos numéricos idem
+])
+def test_serial_fora_da_janela_vira_nat(valor):
+    assert _parse(valor) is NAT
+
+
+def test_limites_da_janela_de_seriais():
+    s = pd.Series([core._EXCEL_SERIAL_MIN, core._EXCEL_SERIAL_MAX], dtype=object)
+    assert core.parse_mixed_dates(s).tolist() == [pd.Timestamp("1954-10-03"), pd.Timestamp("2119-01-11")]
+
+
+def test_valores_repetidos_convertem_igual():
+    valores = [datetime(2025, 3, 4), 45973, "45973", "2025-11-12", "04/03/2025", "04/03/25", None, "a combinar"]
+    unicos = core.parse_mixed_dates(pd.Series(valores, dtype=object))
+    rng = np.random.default_rng(0)
+    ordem = rng.integers(0, len(valores), 500)
+    repetidos = core.parse_mixed_dates(pd.Series([valores[i] for i in ordem], dtype=object, index=ordem * 10))
+    assert repetidos.index.tolist() == (ordem * 10).tolist()
+    assert pd.Series(repetidos.to_numpy()).equals(pd.Series(unicos.to_numpy()[ordem]))
+
+
+def test_coluna_ja_datetime_passa_direto():
+    s = pd.Series(pd.to_datetime(["2025-11-12", None]))
+    assert core.parse_mixed_dates(s).equals(s.astype("datetime64[ns]"))
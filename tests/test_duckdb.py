@@ -0,0 +1,79 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("duckdb")
+
+import reparo_core as core  # noqa: E402
+import reparo_duckdb  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench"))
+
+from bench_reparo import HOJE, conferir_duckdb, gerar_planilha  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def base(tmp_path_factory):
+    """Planilha sintética de 1k linhas (a do benchmark), com cache em diretório temporário."""
+    tmp = tmp_path_factory.mktemp("duckdb")
+    anteriores = core.SNAP_DIR, core.CACHE_DIR
+    core.configurar_diretorios(str(tmp / "snapshots"), str(tmp / "cache"))
+    try:
+        gerar_planilha(1_000, str(tmp / "reparo_1k.xlsx"))
+        df = core.calcular_prazos(core.carregar_base(str(tmp / "reparo_1k.xlsx")), HOJE)
+    finally:
+        core.configurar_diretorios(*anteriores)
+    return df, core.construir_motor_filtros(df), reparo_duckdb.construir_banco(df)
+
+
+def test_paridade_com_pandas(base):
+    df, _, _ = base
+    assert conferir_duckdb(df) > 0
+
+
+@pytest.mark.parametrize("prefixo", [
+    "pr-a",        # regex válida nos dois motores
+    "^P[RS]-",
+    "[",           # inválida no re: literal nos dois
+    "PR-(",
+    "a{2,",        # o re e o RE2 leem como literal
+    "(?<=P)R-",    # lookbehind: o RE2 recusa, o re aceita
+    r"(P)\1",      # backreference: idem
+])
+def test_prefixo_igual_ao_pandas(base, prefixo):
+    df, motor, banco = base
+    esperado = core.filtrar_posicoes(motor, prefixo=prefixo)
+    obtido = reparo_duckdb.consultar_posicoes(banco, prefixo=prefixo)
+    assert obtido.tolist() == esperado.tolist()
+    assert reparo_duckdb.calcular_kpis(banco, prefixo=prefixo) == core.calcular_kpis(df.iloc[esperado])
+
+
+def test_prefixo_invalido_no_re_vira_literal():
+    df = pd.DataFrame({"Prefixo": ["PR-(A", "PR-A", None, "pr-(b"], "Status": ["x"] * 4})
+    banco = reparo_duckdb.construir_banco(df)
+    assert reparo_duckdb.consultar_posicoes(banco, prefixo="PR-(").tolist() == [0, 3]
+    assert np.array_equal(core._contem(df["Prefixo"], "PR-("), [True, False, False, True])
+
+
+def test_cursores_fechados(base, monkeypatch):
+    _, _, banco = base
+    cursores = []
+    con = banco["con"]
+
+    class Conexao:
+        def cursor(self):
+            cursores.append(con.cursor())
+            return cursores[-1]
+
+    monkeypatch.setitem(banco, "con", Conexao())
+    reparo_duckdb.consultar_posicoes(banco, ordem="Status")
+    reparo_duckdb.calcular_kpis(banco, prefixo="(?<=P)R-")
+    with pytest.raises(Exception):
+        reparo_duckdb._consultar(banco, "SELECT * FROM tabela_que_nao_existe")
+    assert len(cursores) == 5
+    for cursor in cursores:
+        with pytest.raises(Exception):
+            cursor.execute("SELECT 1")
@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+import reparo_core as core
+
+STATUS = [
+    "PO 012345", "P.O 012999 Fechada", "p . o fechado", "Não comprado", "nao comprada",
+    "N?o comprado", "  Em cotação ", "Aguardando", "", None, float("nan"),
+]
+OS = [
+    "2025/08/0053", "2025-8-53", " 2025 / 08 / 53 ", "2025/13/0001", "2024/1/12345",
+    "abc", "", "2025/08/12", None, float("nan"), 20250853,
+]
+
+
+def _serie(valores, repeticoes=3):
+    return pd.Series(valores * repeticoes, dtype=object)
+
+
+def test_limpar_status_serie_igual_a_apply(memos_limpos):
+    serie = _serie(STATUS)
+    esperado = serie.apply(core.limpar_status)
+    for _ in range(2):  # segunda vez: tudo vem do memo
+        obtido = core.limpar_status_serie(serie)
+        assert obtido.isna().equals(esperado.isna())
+        assert obtido[esperado.notna()].tolist() == esperado[esperado.notna()].tolist()
+
+
+def test_normalizar_os_serie_igual_a_map(memos_limpos):
+    serie = _serie(OS)
+    esperado = serie.map(core.normalizar_os)
+    for _ in range(2):
+        assert core.normalizar_os_serie(serie).tolist() == esperado.tolist()
+
+
+def test_memo_descarta_sem_perder_acertos(memos_limpos):
+    """Acertos do memo descartados no meio da chamada (valores novos > MEMO_MAX) não quebram a carga."""
+    antigos = [f"2025/01/{i:05d}" for i in range(40_000)]
+    novos = [f"2024/02/{i:05d}" for i in range(20_000)]
+    core.normalizar_os_serie(pd.Series(antigos, dtype=object))
+    serie = pd.Series(antigos + novos, dtype=object)
+    obtido = core.normalizar_os_serie(serie)
+    assert obtido.tolist() == serie.map(core.normalizar_os).tolist()
+    assert len(core._MEMO_OS) <= core.MEMO_MAX
+
+
+@pytest.mark.parametrize("n", [5, 25])
+def test_memo_limitado(memos_limpos, monkeypatch, n):
+    monkeypatch.setattr(core, "MEMO_MAX", 10)
+    serie = pd.Series([f"Status {i}" for i in range(n)], dtype=object)
+    assert core.limpar_status_serie(serie).tolist() == serie.apply(core.limpar_status).tolist()
+    assert len(core._MEMO_STATUS) <= 10
@@ -0,0 +1,72 @@
+import os
+import shutil
+import time
+
+import openpyxl
+import pytest
+
+import reparo_core as core
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def planilha(tmp_path):
+    """Cópia da reparo_atual.xlsx, com snapshots e cache em diretórios temporários."""
+    anteriores = core.SNAP_DIR, core.CACHE_DIR
+    core.configurar_diretorios(str(tmp_path / "snapshots"), str(tmp_path / "cache"))
+    destino = tmp_path / "reparo.xlsx"
+    shutil.copyfile(os.path.join(RAIZ, "reparo_atual.xlsx"), destino)
+    yield str(destino)
+    core.configurar_diretorios(*anteriores)
+
+
+def _esperar(condicao, limite=20.0):
+    fim = time.monotonic() + limite
+    while not condicao():
+        assert time.monotonic() < fim, "tempo esgotado"
+        time.sleep(0.02)
+
+
+def _alterar_status(path):
+    wb = openpyxl.load_workbook(path)
+    wb.active["A7"] = "P.O 999999 Fechada"  # linha que passa pela normalização
+    wb.save(path)
+
+
+def test_carga_refeita_apos_cache_e_releitura_com_diferencas(planilha):
+    core.parar_vigia(core.iniciar_vigia(planilha, intervalo=0.05, estavel=0.05))  # grava o cache
+    vigia = core.iniciar_vigia(planilha, intervalo=0.05, estavel=0.05)  # "reinício": vem do cache
+    try:
+        assert vigia["mudancas"] is None
+        _esperar(lambda: vigia["carga"] is not None)
+        _alterar_status(planilha)
+        _esperar(lambda: vigia["recargas"] == 1)
+        assert vigia["carga"]["delta"] is not None  # releitura incremental, não completa
+        adicionados, removidos, alterados = vigia["mudancas"]
+        assert len(alterados) >= 1 and "Status" in set(alterados["Coluna"])
+    finally:
+        core.parar_vigia(vigia)
+
+
+def test_releitura_vinda_do_cache_limpa_mudancas(planilha):
+    original = open(planilha, "rb").read()
+    info = os.stat(planilha)
+    core.parar_vigia(core.iniciar_vigia(planilha, intervalo=0.05, estavel=0.05))
+    vigia = core.iniciar_vigia(planilha, intervalo=0.05, estavel=1.0)
+    try:
+        _esperar(lambda: vigia["carga"] is not None)
+        _alterar_status(planilha)
+        _esperar(lambda: vigia["recargas"] == 1)
+        assert vigia["mudancas"] is not None
+        with open(planilha, "wb") as f:  # volta à versão original: mesma chave, já em cache
+            f.write(original)
+        os.utime(planilha, ns=(info.st_atime_ns, info.st_mtime_ns))
+        # o cache só guarda a versão mais recente de cada arquivo: regrava a original, como
+        # faria outro processo, antes de o vigia (estavel=1s) reler
+        core._gravar_cache(core.chave_fonte(planilha), core.carregar_incremental(planilha)["base"])
+        _esperar(lambda: vigia["recargas"] == 2)
+        assert vigia["mudancas"] is None
+        _esperar(lambda: vigia["carga"] is not None)  # e a carga é refeita em segundo plano
+    finally:
+        core.parar_vigia(vigia)